@@ -6,3 +6,6 @@ compiler_base_dir = os.path.join(root_base_dir, "compiler")
 graph_base_dir = os.path.join(compiler_base_dir, "graph")
 
 property_base_dir = os.path.join(root_base_dir, "examples/property")
+
+# Persistent compilation caches live under the graph compiler's generated dir.
+cache_base_dir = os.path.join(graph_base_dir, "generated", ".cache")
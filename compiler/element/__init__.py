@@ -7,14 +7,18 @@ from compiler.element.backend.envoy.finalizer import finalize as WasmFinalize
 from compiler.element.backend.envoy.wasmgen import WasmContext, WasmGenerator
 from compiler.element.backend.mrpc.finalizer import finalize as RustFinalize
 from compiler.element.backend.mrpc.rustgen import RustContext, RustGenerator
-from compiler.element.frontend import ElementCompiler
+from compiler.element.frontend import get_element_compiler
 from compiler.element.frontend.printer import Printer
+from compiler.element.frontend.proto import load_proto_index
 from compiler.element.frontend.util import (
     extract_message_field_types,
     extract_proto_message_names,
 )
 from compiler.element.logger import ELEMENT_LOG as LOG
 from compiler.element.optimize.consolidate import consolidate
+from compiler.element.props.analyzer import StateAccessAnalyzer
+from compiler.element.props.cost import Cost, estimate_cost
+from compiler.element.props.drop_rate import estimate_drop_rate
 from compiler.element.props.flow import FlowGraph, Property
 
 
@@ -51,16 +55,14 @@ def gen_code(
     if not os.path.exists(proto_path):
         raise FileNotFoundError(f"The proto file {proto_path} does not exist.")
 
-    with open(proto_path, "r") as file:
-        proto_def = file.read()
-
-        if method_name not in proto_def:
-            raise ValueError(f"Method {method_name} not found in {proto_path}.")
+    # The proto file is parsed once per process and shared by the helpers below.
+    if load_proto_index(proto_path).find_method(method_name) is None:
+        raise ValueError(f"Method {method_name} not found in {proto_path}.")
     proto = os.path.basename(proto_path).replace(".proto", "")
 
     # Currently, we only support mRPC and Envoy (Proxy WASM) as the backends
     assert backend_name == "mrpc" or backend_name == "envoy"
-    compiler = ElementCompiler()
+    compiler = get_element_compiler()
 
     # Find the request and response message names.
     request_message_name, response_message_name = extract_proto_message_names(
@@ -145,8 +147,10 @@ def compile_element_property(
     uses an ElementCompiler to compile these specifications into an intermediate representation (IR),
     and then analyzes the properties of the request and response flows using FlowGraph.
 
-    The function aggregates properties (like read, write, block, copy, drop operations) for
-    both request and response flows across all the provided element specifications. It also
+    The function aggregates properties (like read, write, block, copy, drop operations,
+    accesses to internal state and static estimates of the processing cost and drop
+    probability) for both request
+    and response flows across all the provided element specifications. It also
     determines if the overall behavior is stateful based on the internal definitions in the IR.
 
     If 'verbose' is true, it prints the compiled intermediate representation for each element.
@@ -159,12 +163,15 @@ def compile_element_property(
         Dict: A dictionary containing the stateful flag, and the aggregated properties for
               both request and response processing.
     """
-    compiler = ElementCompiler()
+    compiler = get_element_compiler()
     printer = Printer()
 
     # Initialize a tuple of Property objects to hold request and response properties
     LOG.info(f"Analyzing element properties. Element list: {element_names}")
     ret = (Property(), Property())
+    costs = {"request": Cost(), "response": Cost()}
+    # Probability that the elements forward an RPC, None if unknown
+    forward = {"request": 1.0, "response": 1.0}
 
     # Default properties
     stateful = False
@@ -190,6 +197,16 @@ def compile_element_property(
             req = FlowGraph().analyze(ir.req, verbose)
             resp = FlowGraph().analyze(ir.resp, verbose)
 
+            # Internal state touched by the request and response procedures, e.g.,
+            # a counter updated per request. check() below deduplicates them along
+            # the fields.
+            states = [state[0].name for state in ir.definition.internal]
+            for proc, prop in [(ir.req, ret[0]), (ir.resp, ret[1])]:
+                sa = StateAccessAnalyzer(states)
+                proc.accept(sa, None)
+                prop.state_read += [f"{element_name}.{s}" for s in sa.read]
+                prop.state_write += [f"{element_name}.{s}" for s in sa.write]
+
             # Update request properties
             ret[0].block = ret[0].block or req.block
             ret[0].copy = ret[0].copy or req.copy
@@ -206,6 +223,15 @@ def compile_element_property(
             ret[1].write = ret[1].write + resp.write
             ret[1].check()
 
+            # Static estimate of the per-RPC processing cost
+            for path, c in estimate_cost(ir).items():
+                costs[path] = costs[path] + c
+            for path, d in estimate_drop_rate(ir).items():
+                if d is None or forward[path] is None:
+                    forward[path] = None
+                else:
+                    forward[path] *= 1 - d
+
             stateful = stateful or len(ir.definition.internal) > 0
 
             # TODO: might want want to do a more fine-grained check state variables. (incl. conflict requirements)
@@ -243,6 +269,10 @@ def compile_element_property(
             "drop": ret[0].drop,
             "block": ret[0].block,
             "copy": ret[0].copy,
+            "state_read": ret[0].state_read,
+            "state_write": ret[0].state_write,
+            "cost": costs["request"].to_dict(),
+            "drop_rate": None if forward["request"] is None else 1 - forward["request"],
         },
         "response": {
             "record" if record else "read": ret[1].read,
@@ -250,5 +280,11 @@ def compile_element_property(
             "drop": ret[1].drop,
             "block": ret[1].block,
             "copy": ret[1].copy,
+            "state_read": ret[1].state_read,
+            "state_write": ret[1].state_write,
+            "cost": costs["response"].to_dict(),
+            "drop_rate": None
+            if forward["response"] is None
+            else 1 - forward["response"],
         },
     }
@@ -55,8 +55,7 @@ class AccessAnalyzer(
                 ctx.current_procedure = FUNC_RESP_BODY
             case _:
                 raise Exception("unknown function")
-        for b in node.body:
-            b.accept(self, ctx)
+        self.visit_many(node.body, ctx)
 
     def visitStatement(self, node: Statement, ctx: WasmContext):
         if node.stmt != None:
@@ -65,8 +64,7 @@ class AccessAnalyzer(
     def visitMatch(self, node: Match, ctx: WasmContext):
         node.expr.accept(self, ctx)
         for p, s in node.actions:
-            for st in s:
-                st.accept(self, ctx)
+            self.visit_many(s, ctx)
 
     def visitAssign(self, node: Assign, ctx: WasmContext):
         set_method(node.left.name, ctx, MethodType.SET)
@@ -1,17 +1,144 @@
+import glob
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple, Union
+
+from compiler import cache_base_dir
+from compiler.element.frontend.cache import IRCache
 from compiler.element.frontend.parser import ElementParser
 from compiler.element.frontend.transformer import ElementTransformer
 from compiler.element.node import Program
 
 
 class ElementCompiler:
-    def __init__(self):
-        self.parser = ElementParser()
+    def __init__(self, cache_dir: Optional[str] = cache_base_dir):
+        """
+        Args:
+            cache_dir (str, optional): Root of the persistent compilation cache.
+                Parsed IR is cached under its "ir" subdirectory. Pass None to
+                always parse from scratch.
+        """
+        self.cache_dir = cache_dir
         self.transformer = ElementTransformer()
+        # The transformer runs inline with the LALR parser, so no intermediate
+        # parse tree is built.
+        self.parser = ElementParser(self.transformer)
+        self.cache = (
+            IRCache(os.path.join(cache_dir, "ir")) if cache_dir is not None else None
+        )
 
     def parse_and_transform(self, spec: str) -> Program:
-        # Step 1: Generate a parse tree based on our grammar
-        ast = self.parser.parse(spec)
-
-        # Step 2: Transforme traverses the parse tree and applies transformation to its nodes.
-        ir = self.transformer.transform(ast)
+        if self.cache is not None:
+            ir = self.cache.get(spec)
+            if ir is not None:
+                return ir
+        ir = self.parser.parse(spec)
+        if self.cache is not None:
+            self.cache.put(spec, ir)
         return ir
+
+    def parse_and_transform_batch(
+        self, paths: Union[str, List[str]], max_workers: Optional[int] = None
+    ) -> Tuple[Dict[str, Program], Dict[str, str]]:
+        """
+        Parse and transform a batch of element specifications on a process pool.
+
+        Args:
+            paths (Union[str, List[str]]): Spec files, directories of .adn files,
+                or glob patterns (e.g., "examples/elements/*_elements/").
+            max_workers (int, optional): Size of the process pool. Defaults to
+                the number of CPUs.
+
+        Returns:
+            Tuple[Dict[str, Program], Dict[str, str]]: The IR of every spec that
+                was parsed successfully and the error of every spec that was not,
+                both keyed by spec path. A pattern or directory that matches no
+                spec is reported as an error under its own name.
+        """
+        irs: Dict[str, Program] = {}
+        spec_paths, errors = expand_spec_paths(paths)
+
+        # Serve cache hits in-process and only ship the misses to the pool.
+        pending = []
+        for path in spec_paths:
+            try:
+                with open(path, "r") as f:
+                    spec = f.read()
+            except OSError as e:
+                errors[path] = f"{type(e).__name__}: {e}"
+                continue
+            ir = self.cache.get(spec) if self.cache is not None else None
+            if ir is not None:
+                irs[path] = ir
+            else:
+                pending.append(path)
+
+        if len(pending) > 0:
+            with ProcessPoolExecutor(
+                max_workers=max_workers,
+                initializer=_init_batch_worker,
+                initargs=(self.cache_dir,),
+            ) as executor:
+                for path, ir, error in executor.map(_parse_spec_file, pending):
+                    if error is None:
+                        irs[path] = ir
+                    else:
+                        errors[path] = error
+        return irs, errors
+
+
+def expand_spec_paths(paths: Union[str, List[str]]) -> Tuple[List[str], Dict[str, str]]:
+    """Expand files, directories and glob patterns into a sorted list of spec files.
+
+    Returns:
+        Tuple[List[str], Dict[str, str]]: The spec files and the error of every
+            glob pattern or directory that matched none, keyed by pattern.
+    """
+    if isinstance(paths, str):
+        paths = [paths]
+    ret = []
+    errors: Dict[str, str] = {}
+    for pattern in paths:
+        if has_wildcard(pattern):
+            matches = sorted(glob.glob(pattern))
+        else:
+            matches = [pattern]
+        specs = []
+        for path in matches:
+            if os.path.isdir(path):
+                specs.extend(sorted(glob.glob(os.path.join(path, "*.adn"))))
+            else:
+                specs.append(path)
+        if len(specs) == 0:
+            errors[pattern] = f"No element spec matches {pattern}"
+        ret.extend(specs)
+    return ret, errors
+
+
+def has_wildcard(pattern: str) -> bool:
+    return any(c in pattern for c in "*?[")
+
+
+def _init_batch_worker(cache_dir: Optional[str]):
+    global _element_compiler
+    _element_compiler = ElementCompiler(cache_dir)
+
+
+def _parse_spec_file(path: str) -> Tuple[str, Optional[Program], Optional[str]]:
+    try:
+        with open(path, "r") as f:
+            spec = f.read()
+        return path, get_element_compiler().parse_and_transform(spec), None
+    except Exception as e:
+        return path, None, f"{type(e).__name__}: {e}"
+
+
+_element_compiler: Optional[ElementCompiler] = None
+
+
+def get_element_compiler() -> ElementCompiler:
+    """Return the process-wide ElementCompiler, building it on first use."""
+    global _element_compiler
+    if _element_compiler is None:
+        _element_compiler = ElementCompiler()
+    return _element_compiler
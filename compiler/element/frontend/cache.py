@@ -0,0 +1,102 @@
+"""
+Content-addressed on-disk cache of parsed element IR.
+
+Each entry maps sha256(grammar version + spec text) to a pickled Program. The
+grammar version covers the grammar, the transformer and the IR node definitions,
+so any change to how a spec is lowered invalidates old entries.
+"""
+import hashlib
+import os
+import pathlib
+import pickle
+from typing import Optional
+
+from compiler.element.logger import ELEMENT_LOG as LOG
+from compiler.element.node import Program
+
+# Files whose content determines the shape of the cached IR.
+_VERSIONED_FILES = [
+    pathlib.Path(__file__).parent / "element.lark",
+    pathlib.Path(__file__).parent / "transformer.py",
+    pathlib.Path(__file__).parent.parent / "node.py",
+]
+
+
+def grammar_version() -> str:
+    h = hashlib.sha256()
+    for path in _VERSIONED_FILES:
+        with open(path, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+class IRCache:
+    def __init__(self, cache_dir: str, max_bytes: int = 64 * 1024 * 1024):
+        """
+        Args:
+            cache_dir (str): Directory holding the cache entries.
+            max_bytes (int): Upper bound on the total size of the entries. The
+                least recently used entries are evicted once it is exceeded.
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.version = grammar_version()
+
+    def key(self, spec: str) -> str:
+        return hashlib.sha256((self.version + spec).encode()).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def get(self, spec: str) -> Optional[Program]:
+        path = self._path(self.key(spec))
+        try:
+            with open(path, "rb") as f:
+                ir = pickle.load(f)
+            # Refresh the timestamp so that eviction is least-recently-used.
+            os.utime(path)
+            return ir
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            LOG.warning(f"Dropping unreadable IR cache entry {path}: {e}")
+            self._remove(path)
+            return None
+
+    def put(self, spec: str, ir: Program):
+        path = self._path(self.key(spec))
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(tmp_path, "wb") as f:
+                pickle.dump(ir, f, protocol=pickle.HIGHEST_PROTOCOL)
+            # Atomic rename, so that concurrent readers never see a partial entry.
+            os.replace(tmp_path, path)
+        except Exception as e:
+            LOG.warning(f"Failed to write IR cache entry {path}: {e}")
+            self._remove(tmp_path)
+            return
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits in max_bytes."""
+        stats = {}
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".pkl"):
+                try:
+                    stats[entry.path] = entry.stat()
+                except FileNotFoundError:
+                    # Removed by a concurrent compiler process.
+                    pass
+        total = sum(s.st_size for s in stats.values())
+        for path in sorted(stats, key=lambda p: stats[p].st_mtime):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= stats[path].st_size
+
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
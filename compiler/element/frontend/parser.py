@@ -1,15 +1,33 @@
 import os
 import pathlib
+from typing import Optional
 
-from lark import Lark
+from lark import Lark, Transformer
 
 
 class ElementParser:
-    def __init__(self):
+    def __init__(self, transformer: Optional[Transformer] = None):
+        """
+        Build the LALR parser for element specifications.
+
+        The analyzed grammar is serialized to Lark's on-disk cache (keyed by the
+        grammar content and parser options), so only the first process pays for
+        building the parse tables.
+
+        Args:
+            transformer (Transformer, optional): If given, it is applied inline
+                while parsing and `parse` returns its result instead of a parse tree.
+        """
         cwd = pathlib.Path(__file__).parent
         grammar = open(os.path.join(cwd, "element.lark"), "r").read()
         # grammar = open(os.path.join(cwd, "new.lark"), "r").read()
-        self.lark_parser = Lark(grammar, start="start")
+        self.lark_parser = Lark(
+            grammar,
+            start="start",
+            parser="lalr",
+            cache=True,
+            transformer=transformer,
+        )
 
     def parse(self, spec):
         return self.lark_parser.parse(spec)
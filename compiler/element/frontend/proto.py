@@ -0,0 +1,297 @@
+"""
+An indexed model of protobuf (proto3) schemas.
+
+Each .proto file is parsed once per process into a ProtoIndex that exposes its
+services, methods and messages (with field types, numbers, `repeated` flags and
+nested messages). Indexes are memoized by file path and modification time.
+"""
+from __future__ import annotations
+
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+
+class ProtoField:
+    def __init__(self, name: str, type: str, number: int, repeated: bool = False):
+        self.name = name
+        self.type = type  # For map fields, e.g., "map<string, int32>"
+        self.number = number
+        self.repeated = repeated
+
+    def __repr__(self):
+        prefix = "repeated " if self.repeated else ""
+        return f"{prefix}{self.type} {self.name} = {self.number}"
+
+
+class ProtoMessage:
+    def __init__(self, name: str, full_name: str):
+        self.name = name
+        self.full_name = full_name  # Dotted name, e.g., "Outer.Inner"
+        self.fields: Dict[str, ProtoField] = {}
+        self.nested: Dict[str, ProtoMessage] = {}
+
+    def field_by_number(self, number: int) -> Optional[ProtoField]:
+        for field in self.fields.values():
+            if field.number == number:
+                return field
+        return None
+
+
+class ProtoMethod:
+    def __init__(
+        self,
+        name: str,
+        service: str,
+        request: str,
+        response: str,
+        client_streaming: bool = False,
+        server_streaming: bool = False,
+    ):
+        self.name = name
+        self.service = service
+        self.request = request
+        self.response = response
+        self.client_streaming = client_streaming
+        self.server_streaming = server_streaming
+
+
+class ProtoService:
+    def __init__(self, name: str):
+        self.name = name
+        self.methods: Dict[str, ProtoMethod] = {}
+
+
+class ProtoSyntaxError(Exception):
+    pass
+
+
+_TOKEN_PATTERN = re.compile(
+    r"""
+    (?P<comment>//[^\n]*|/\*[\s\S]*?\*/)
+    | (?P<string>"(?:[^"\\]|\\.)*"|'(?:[^'\\]|\\.)*')
+    | (?P<word>[A-Za-z_.][\w.]*)
+    | (?P<number>-?\d[\w.+-]*)
+    | (?P<symbol>[{}()\[\]<>;=,:])
+    | (?P<space>\s+)
+    """,
+    re.VERBOSE,
+)
+
+
+def _tokenize(content: str) -> List[str]:
+    tokens = []
+    pos = 0
+    while pos < len(content):
+        m = _TOKEN_PATTERN.match(content, pos)
+        if m is None:
+            raise ProtoSyntaxError(f"unexpected character {content[pos]!r}")
+        if m.lastgroup not in ("comment", "space"):
+            tokens.append(m.group())
+        pos = m.end()
+    return tokens
+
+
+class ProtoIndex:
+    def __init__(self, content: str, path: str = ""):
+        self.path = path
+        self.package: Optional[str] = None
+        self.services: Dict[str, ProtoService] = {}
+        # Top-level and nested messages, keyed by their dotted full names.
+        self.messages: Dict[str, ProtoMessage] = {}
+
+        self.tokens = _tokenize(content)
+        self.pos = 0
+        self._parse_file()
+        del self.tokens
+
+    @property
+    def methods(self) -> Dict[str, ProtoMethod]:
+        """All methods of all services, keyed by method name."""
+        ret = {}
+        for service in self.services.values():
+            ret.update(service.methods)
+        return ret
+
+    def find_method(
+        self, method_name: str, service_name: Optional[str] = None
+    ) -> Optional[ProtoMethod]:
+        for service in self.services.values():
+            if service_name is not None and service.name != service_name:
+                continue
+            if method_name in service.methods:
+                return service.methods[method_name]
+        return None
+
+    def find_message(self, name: str, scope: str = "") -> Optional[ProtoMessage]:
+        """Resolve a (possibly relative) message type name following protobuf scoping rules."""
+        if self.package is not None and name.startswith(f".{self.package}."):
+            name = name[len(self.package) + 2 :]
+        name = name.lstrip(".")
+        parts = scope.split(".") if scope else []
+        while True:
+            candidate = ".".join(parts + [name])
+            if candidate in self.messages:
+                return self.messages[candidate]
+            if len(parts) == 0:
+                return None
+            parts.pop()
+
+    # Recursive-descent parser over the token stream.
+
+    def _peek(self) -> Optional[str]:
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def _next(self) -> str:
+        if self.pos >= len(self.tokens):
+            raise ProtoSyntaxError(f"unexpected end of file in {self.path}")
+        self.pos += 1
+        return self.tokens[self.pos - 1]
+
+    def _expect(self, token: str):
+        actual = self._next()
+        if actual != token:
+            raise ProtoSyntaxError(
+                f"expected {token!r} but found {actual!r} in {self.path}"
+            )
+
+    def _skip_statement(self):
+        """Skip a statement up to its terminating ';' or a balanced '{...}' block."""
+        depth = 0
+        while True:
+            token = self._next()
+            if token == "{":
+                depth += 1
+            elif token == "}":
+                depth -= 1
+                if depth == 0:
+                    return
+            elif token == ";" and depth == 0:
+                return
+
+    def _parse_file(self):
+        while self._peek() is not None:
+            token = self._peek()
+            if token == "package":
+                self._next()
+                self.package = self._next()
+                self._expect(";")
+            elif token == "message":
+                self._parse_message("")
+            elif token == "service":
+                self._parse_service()
+            elif token == ";":
+                self._next()
+            else:
+                # syntax, import, option, enum, extend
+                self._skip_statement()
+
+    def _parse_message(self, scope: str) -> ProtoMessage:
+        self._expect("message")
+        name = self._next()
+        full_name = f"{scope}.{name}" if scope else name
+        message = ProtoMessage(name, full_name)
+        self.messages[full_name] = message
+        self._expect("{")
+        self._parse_message_body(message)
+        return message
+
+    def _parse_message_body(self, message: ProtoMessage):
+        while self._peek() != "}":
+            token = self._peek()
+            if token == "message":
+                nested = self._parse_message(message.full_name)
+                message.nested[nested.name] = nested
+            elif token == "oneof":
+                # Fields in a oneof are ordinary fields of the enclosing message.
+                self._next()
+                self._next()
+                self._expect("{")
+                self._parse_message_body(message)
+            elif token in ("enum", "option", "reserved", "extensions", "extend"):
+                self._skip_statement()
+            elif token == ";":
+                self._next()
+            else:
+                self._parse_field(message)
+        self._expect("}")
+
+    def _parse_field(self, message: ProtoMessage):
+        repeated = False
+        if self._peek() in ("repeated", "optional", "required"):
+            repeated = self._next() == "repeated"
+        field_type = self._next()
+        if field_type == "map":
+            self._expect("<")
+            key_type = self._next()
+            self._expect(",")
+            value_type = self._next()
+            self._expect(">")
+            field_type = f"map<{key_type}, {value_type}>"
+        name = self._next()
+        self._expect("=")
+        token = self._next()
+        if not token.isdigit():
+            raise ProtoSyntaxError(
+                f"expected a field number but found {token!r} in {self.path}"
+            )
+        # Field numbers are decimal, even with a leading zero.
+        number = int(token)
+        if self._peek() == "[":
+            while self._next() != "]":
+                pass
+        self._expect(";")
+        message.fields[name] = ProtoField(name, field_type, number, repeated)
+
+    def _parse_service(self):
+        self._expect("service")
+        service = ProtoService(self._next())
+        self.services[service.name] = service
+        self._expect("{")
+        while self._peek() != "}":
+            if self._peek() == "rpc":
+                method = self._parse_rpc(service.name)
+                service.methods[method.name] = method
+            else:
+                self._skip_statement()
+        self._expect("}")
+
+    def _parse_rpc(self, service: str) -> ProtoMethod:
+        self._expect("rpc")
+        name = self._next()
+        client_streaming, request = self._parse_rpc_type()
+        self._expect("returns")
+        server_streaming, response = self._parse_rpc_type()
+        if self._peek() == "{":
+            self._skip_statement()
+        else:
+            self._expect(";")
+        return ProtoMethod(
+            name, service, request, response, client_streaming, server_streaming
+        )
+
+    def _parse_rpc_type(self) -> Tuple[bool, str]:
+        self._expect("(")
+        streaming = self._peek() == "stream"
+        if streaming:
+            self._next()
+        message = self._next()
+        self._expect(")")
+        return streaming, message
+
+
+_proto_indexes: Dict[Tuple[str, int], ProtoIndex] = {}
+
+
+def load_proto_index(proto_path: str) -> ProtoIndex:
+    """Return the index of a .proto file, parsing it only if it changed since the last call."""
+    path = os.path.abspath(proto_path)
+    key = (path, os.stat(path).st_mtime_ns)
+    if key not in _proto_indexes:
+        with open(path, "r") as f:
+            index = ProtoIndex(f.read(), path)
+        # Drop indexes of older versions of the same file.
+        for stale in [k for k in _proto_indexes if k[0] == path]:
+            del _proto_indexes[stale]
+        _proto_indexes[key] = index
+    return _proto_indexes[key]
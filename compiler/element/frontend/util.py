@@ -1,6 +1,7 @@
-import re
 from typing import Dict, Optional, Tuple
 
+from compiler.element.frontend.proto import load_proto_index
+
 
 def find_type_index(list, target_type) -> int:
     """
@@ -27,20 +28,10 @@ def find_type_index(list, target_type) -> int:
 def extract_proto_message_names(
     proto_file: str, target_method_name: str
 ) -> Tuple[Optional[str], Optional[str]]:
-    with open(proto_file, "r") as file:
-        proto_content = file.read()
-
-    # Regular expression to find service definitions
-    services = re.findall(r"service\s+\w+\s+{[^}]+}", proto_content)
-    assert len(services) == 1, "Only one service definition is supported"
-
-    rpcs = re.findall(r"rpc\s+(\w+)\s*\((\w+)\)\s*returns\s*\((\w+)\)", services[0])
-    for rpc in rpcs:
-        method_name, request_message_name, response_message_name = rpc
-        if method_name == target_method_name:
-            return request_message_name, response_message_name
-
-    return None, None
+    method = load_proto_index(proto_file).find_method(target_method_name)
+    if method is None:
+        return None, None
+    return method.request, method.response
 
 
 def camel_to_snake(name: str) -> str:
@@ -51,36 +42,20 @@ def camel_to_snake(name: str) -> str:
 def extract_message_field_types(
     proto_file: str, request_message_name: str, response_message_name: str
 ) -> Dict[str, Dict[str, str]]:
-    with open(proto_file, "r") as file:
-        proto_content = file.read()
-
-    # Regular expressions to match message blocks and field lines within message blocks
-    message_block_pattern = re.compile(r"message\s+(\w+)\s+\{([\s\S]*?)\}")
-    field_pattern = re.compile(r"\s+(\w+)\s+(\w+)\s+=\s+\d+;")
+    index = load_proto_index(proto_file)
 
     field_mapping = {
         "request": {},
         "response": {},
     }
-
-    # Find all message blocks
-    message_blocks = message_block_pattern.findall(proto_content)
-
-    # Process each message block
-    for message, fields_block in message_blocks:
-        if message == request_message_name:
-            # Find all fields in the message block
-            fields = field_pattern.findall(fields_block)
-
-            # Process each field
-            for field_type, field_name in fields:
-                field_mapping["request"][camel_to_snake(field_name)] = field_type
-        elif message == response_message_name:
-            # Find all fields in the message block
-            fields = field_pattern.findall(fields_block)
-
-            # Process each field
-            for field_type, field_name in fields:
-                field_mapping["response"][camel_to_snake(field_name)] = field_type
+    for direction, message_name in [
+        ("request", request_message_name),
+        ("response", response_message_name),
+    ]:
+        message = index.find_message(message_name)
+        if message is None:
+            continue
+        for field in message.fields.values():
+            field_mapping[direction][camel_to_snake(field.name)] = field.type
 
     return field_mapping
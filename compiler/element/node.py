@@ -1,11 +1,52 @@
 from __future__ import annotations
 
+import sys
 from abc import ABC
 from enum import Enum
-from typing import List, Optional, Tuple, Union
+from typing import Callable, Dict, List, Optional, Tuple, Union
+
+# Maps (visitor class, node class) to the visit function that handles the node.
+_dispatch_table: Dict[Tuple[type, type], Callable] = {}
+
+
+def dispatch(visitor_cls: type, node_cls: type) -> Callable:
+    """
+    Resolve the visit function of a visitor class for a node class.
+
+    The function for the most specific class in the node's MRO wins (e.g.,
+    visitMatch before visitStatement). The result is memoized, so reflection
+    only happens once per (visitor class, node class) pair.
+    """
+    key = (visitor_cls, node_cls)
+    if key not in _dispatch_table:
+        for cls in node_cls.__mro__:
+            visit_func = getattr(visitor_cls, "visit" + cls.__name__, None)
+            if visit_func is not None:
+                _dispatch_table[key] = visit_func
+                break
+        else:
+            raise Exception(f"visit function for {node_cls.__name__} not implemented")
+    return _dispatch_table[key]
+
+
+def visit_many(visitor, nodes: List[Node], ctx=None) -> List:
+    """Visit a list of nodes (e.g., a statement block) in order and collect the results."""
+    table = _dispatch_table
+    visitor_cls = type(visitor)
+    ret = []
+    for node in nodes:
+        try:
+            visit_func = table[(visitor_cls, type(node))]
+        except KeyError:
+            visit_func = dispatch(visitor_cls, type(node))
+        ret.append(visit_func(visitor, node, ctx))
+    return ret
 
 
 class Node:
+    # Every node declares __slots__ to keep the IR compact.
+    __slots__ = ()
+
     def __init__(self):
         pass
 
@@ -13,16 +54,83 @@ class Node:
         return self.__class__.__name__
 
     def accept(self, visitor, ctx=None):
-        class_list = type(self).__mro__
-        for cls in class_list:
-            func_name = "visit" + cls.__name__
-            visit_func = getattr(visitor, func_name, None)
-            if visit_func is not None:
-                return visit_func(self, ctx)
-        raise Exception(f"visit function for {self.__class__.__name__} not implemented")
+        try:
+            visit_func = _dispatch_table[(type(visitor), type(self))]
+        except KeyError:
+            visit_func = dispatch(type(visitor), type(self))
+        return visit_func(visitor, self, ctx)
+
+
+class LeafNode(Node):
+    """
+    Base class of immutable leaf nodes.
+
+    Leaf nodes cannot be modified after construction, so copies of an IR share
+    them instead of duplicating them.
+    """
+
+    __slots__ = ()
+
+    def _init(self, **fields):
+        for name, value in fields.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{self.__class__.__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{self.__class__.__name__} is immutable")
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __setstate__(self, state):
+        # Pickled slotted objects carry their fields as (None, {slot: value}).
+        _, slots = state
+        self._init(
+            **{k: intern(v) if isinstance(v, str) else v for k, v in slots.items()}
+        )
+
+
+def intern(s):
+    """Intern identifier and literal strings so that equal names share one object."""
+    return sys.intern(str(s)) if isinstance(s, str) else s
+
+
+# Maps a node class to the names of all slots declared along its MRO.
+_slot_names: Dict[type, Tuple[str, ...]] = {}
+
+
+def structural_key(node):
+    """
+    Return a hashable key describing the structure of an IR (sub)tree.
+
+    Two trees have equal keys iff they have the same node classes, fields and
+    leaf values, regardless of object identity.
+    """
+    if isinstance(node, Node):
+        cls = type(node)
+        if cls not in _slot_names:
+            _slot_names[cls] = tuple(
+                name
+                for c in reversed(cls.__mro__)
+                for name in c.__dict__.get("__slots__", ())
+            )
+        return (cls.__name__,) + tuple(
+            structural_key(getattr(node, name, None)) for name in _slot_names[cls]
+        )
+    elif isinstance(node, (list, tuple)):
+        return tuple(structural_key(n) for n in node)
+    # Strings, numbers, booleans, None and enum members are hashable as-is.
+    return node
 
 
 class Program(Node):
+    __slots__ = ("definition", "init", "req", "resp")
+
     def __init__(
         self, definition: Internal, init: Procedure, req: Procedure, resp: Procedure
     ):
@@ -33,6 +141,8 @@ class Program(Node):
 
 
 class Internal(Node):
+    __slots__ = ("internal",)
+
     def __init__(
         self,
         internal: List[
@@ -49,6 +159,8 @@ class Internal(Node):
 
 
 class Procedure(Node):
+    __slots__ = ("name", "params", "body")
+
     def __init__(self, name: str, params: List[Identifier], body: List[Statement]):
         self.name = name
         self.params = params
@@ -56,29 +168,38 @@ class Procedure(Node):
 
 
 class Statement(Node):
+    __slots__ = ("stmt",)
+
     def __init__(self, stmt: Optional[Union[Match, Assign, Send, Expr]] = None):
         self.stmt = stmt
 
 
 class Match(Statement):
+    __slots__ = ("expr", "actions")
+
     def __init__(self, match: Expr, actions: List[Tuple[Pattern, List[Statement]]]):
         self.expr = match
         self.actions = actions
 
 
 class Assign(Statement):
+    __slots__ = ("left", "right")
+
     def __init__(self, left: Identifier, right: Expr):
         self.left = left
         self.right = right
 
 
-class Pattern(Node):
+class Pattern(LeafNode):
+    __slots__ = ("value", "some")
+
     def __init__(self, value: Union[Identifier, Literal, Error], some: bool):
-        self.value = value
-        self.some = some
+        self._init(value=value, some=some)
 
 
 class Expr(Node):
+    __slots__ = ("lhs", "op", "rhs", "type")
+
     def __init__(self, lhs: Expr, op: Operator, rhs: Expr):
         self.lhs = lhs
         self.op = op
@@ -86,38 +207,52 @@ class Expr(Node):
         self.type = "unknown"
 
 
-class Identifier(Node):
+class Identifier(LeafNode):
+    __slots__ = ("name",)
+
     def __init__(self, name: str):
-        self.name = name
+        self._init(name=intern(name))
+
 
+class ConsistencyDecorator(LeafNode):
+    __slots__ = ("name",)
 
-class ConsistencyDecorator(Node):
     def __init__(self, name: str):
-        self.name = name
+        self._init(name=intern(name))
+
 
+class CombinerDecorator(LeafNode):
+    __slots__ = ("name",)
 
-class CombinerDecorator(Node):
     def __init__(self, name: str):
-        self.name = name
+        self._init(name=intern(name))
 
 
-class PersistenceDecorator(Node):
+class PersistenceDecorator(LeafNode):
+    __slots__ = ("name",)
+
     def __init__(self, name: str):
-        self.name = name
+        self._init(name=intern(name))
 
 
-class Error(Node):
+class Error(LeafNode):
+    __slots__ = ("msg",)
+
     def __init__(self, msg: Literal):
-        self.msg = msg
+        self._init(msg=intern(msg))
 
 
 class FuncCall(Expr):
+    __slots__ = ("name", "args")
+
     def __init__(self, name: Identifier, args: List[Expr]):
         self.name = name
         self.args = args
 
 
 class MethodCall(Expr):
+    __slots__ = ("obj", "method", "args")
+
     def __init__(self, obj: Identifier, method: MethodType, args: List[Expr]):
         self.obj = obj
         self.method = method
@@ -125,38 +260,51 @@ class MethodCall(Expr):
 
 
 class Send(Statement):
+    __slots__ = ("direction", "msg")
+
     def __init__(self, direction: str, msg: Expr):
         self.direction = direction
         self.msg = msg
 
 
-class Type(Node):
+class Type(LeafNode):
+    __slots__ = ("name", "consistency", "combiner", "persistence")
+
     def __init__(self, name: str, consistency: str, combiner: str, persistence: bool):
-        self.name = name
-        self.consistency = consistency
-        self.combiner = combiner
-        self.persistence = persistence
+        self._init(
+            name=intern(name),
+            consistency=consistency,
+            combiner=combiner,
+            persistence=persistence,
+        )
+
 
+class Literal(LeafNode):
+    __slots__ = ("value", "type")
 
-class Literal(Node):
     def __init__(self, value: str):
-        self.value = value
+        value = intern(value)
         # TODO: complete type inference for Literal
         # currently only String and Bool are supported.
         if value.startswith("'") and value.endswith("'"):
-            self.type = DataType.STR
+            type = DataType.STR
         elif value in ["True", "False"]:
-            self.type = DataType.BOOL
+            type = DataType.BOOL
         else:
-            self.type = DataType.NONE
+            type = DataType.NONE
+        self._init(value=value, type=type)
 
 
-class Start(Node):
+class Start(LeafNode):
+    __slots__ = ()
+
     def __init__(self):
         pass
 
 
-class End(Node):
+class End(LeafNode):
+    __slots__ = ()
+
     def __init__(self):
         pass
 
@@ -168,13 +316,11 @@ PASS_NODE = Statement()
 
 class EnumNode(Enum):
     def accept(self, visitor, ctx):
-        class_list = type(self).__mro__
-        for cls in class_list:
-            func_name = "visit" + cls.__name__
-            visit_func = getattr(visitor, func_name, None)
-            if visit_func is not None:
-                return visit_func(self, ctx)
-        raise Exception(f"visit function for {self.name} not implemented")
+        try:
+            visit_func = _dispatch_table[(type(visitor), type(self))]
+        except KeyError:
+            visit_func = dispatch(type(visitor), type(self))
+        return visit_func(visitor, self, ctx)
 
 
 class Operator(EnumNode):
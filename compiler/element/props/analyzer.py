@@ -6,6 +6,13 @@ from compiler.element.node import Expr, Identifier, Internal, MethodCall, Proced
 from compiler.element.visitor import Visitor
 
 
+def field_name(node: Expr) -> str:
+    """Name of the RPC field accessed with `node` as the key, or "*" if it is not a constant."""
+    if isinstance(node, Literal):
+        return node.value
+    return "*"
+
+
 class StateAnalyzer(Visitor):
     def __init__():
         pass
@@ -23,8 +30,7 @@ class CopyAnalyzer(Visitor):
         self.send_num = 0
 
     def visitBlock(self, node: List[Statement], ctx) -> int:
-        for s in node:
-            s.accept(self, ctx)
+        self.visit_many(node, ctx)
         return self.send_num
 
     def visitNode(self, node: Node, ctx):
@@ -50,8 +56,7 @@ class CopyAnalyzer(Visitor):
 
     def visitMatch(self, node: Match, ctx):
         for (p, s) in node.actions:
-            for st in s:
-                st.accept(self, ctx)
+            self.visit_many(s, ctx)
 
     def visitAssign(self, node: Assign, ctx):
         pass
@@ -97,10 +102,7 @@ class WriteAnalyzer(Visitor):
             self.target_fields[t] = []
 
     def visitBlock(self, node: List[Statement], ctx) -> bool:
-        ret = False
-        for s in node:
-            ret = s.accept(self, ctx) or ret
-        return ret
+        return any(self.visit_many(node, ctx))
 
     def visitNode(self, node: Node, ctx):
         if node == START_NODE or node == END_NODE or node == PASS_NODE:
@@ -157,8 +159,10 @@ class WriteAnalyzer(Visitor):
         if node.obj.name in self.targets and node.method.name == "SET":
             er = ExprResolver()
             assert len(node.args) == 2
-            fields = [i.accept(er, None) for i in node.args]
-            self.target_fields[node.obj.name] += [(fields[0], fields[1])]
+            key, value = node.args
+            self.target_fields[node.obj.name] += [
+                (field_name(key), value.accept(er, None))
+            ]
             return True
         ret = False
         for a in node.args:
@@ -184,10 +188,7 @@ class ReadAnalyzer(Visitor):
             self.target_fields[t] = []
 
     def visitBlock(self, node: List[Statement], ctx) -> bool:
-        ret = False
-        for s in node:
-            ret = s.accept(self, ctx) or ret
-        return ret
+        return any(self.visit_many(node, ctx))
 
     def visitNode(self, node: Node, ctx):
         if node == START_NODE or node == END_NODE or node == PASS_NODE:
@@ -242,8 +243,7 @@ class ReadAnalyzer(Visitor):
     def visitMethodCall(self, node: MethodCall, ctx) -> bool:
         if isinstance(node.obj, Identifier):
             if node.obj.name in self.targets and node.method.name == "GET":
-                er = ExprResolver()
-                fields = [i.accept(er, None) for i in node.args]
+                fields = [field_name(i) for i in node.args]
                 self.target_fields[node.obj.name] += fields
                 return True
         else:
@@ -274,10 +274,7 @@ class DropAnalyzer(Visitor):
             self.target_fields[t] = []
 
     def visitBlock(self, node: List[Statement], ctx) -> bool:
-        ret = False
-        for s in node:
-            ret = s.accept(self, ctx) or ret
-        return ret
+        return any(self.visit_many(node, ctx))
 
     def visitNode(self, node: Node, ctx):
         if node == START_NODE or node == END_NODE or node == PASS_NODE:
@@ -347,6 +344,97 @@ class DropAnalyzer(Visitor):
         return False
 
 
+class StateAccessAnalyzer(Visitor):
+    """Collect the internal state variables that a procedure reads and writes.
+
+    Each variable is listed once, in the order of its first access, however many
+    statements or branches of the procedure access it.
+    """
+
+    def __init__(self, states: List[str]):
+        self.states = states
+        self.read: List[str] = []
+        self.write: List[str] = []
+
+    def add_read(self, name: str):
+        if name in self.states and name not in self.read:
+            self.read.append(name)
+
+    def add_write(self, name: str):
+        if name in self.states and name not in self.write:
+            self.write.append(name)
+
+    def visitBlock(self, node: List[Statement], ctx):
+        self.visit_many(node, ctx)
+
+    def visitNode(self, node: Node, ctx):
+        if node == START_NODE or node == END_NODE or node == PASS_NODE:
+            return
+        LOG.error(
+            f"{node.__class__.__name__} should be visited in state access analyzer"
+        )
+        raise Exception("Unreachable!")
+
+    def visitProgram(self, node: Program, ctx):
+        raise Exception("Unreachable!")
+
+    def visitInternal(self, node: Internal, ctx):
+        raise Exception("Unreachable!")
+
+    def visitProcedure(self, node: Procedure, ctx):
+        self.visit_many(node.body, ctx)
+
+    def visitStatement(self, node: Statement, ctx):
+        if node.stmt != None:
+            node.stmt.accept(self, ctx)
+
+    def visitMatch(self, node: Match, ctx):
+        node.expr.accept(self, ctx)
+        for (p, s) in node.actions:
+            p.accept(self, ctx)
+            self.visit_many(s, ctx)
+
+    def visitAssign(self, node: Assign, ctx):
+        self.add_write(node.left.name)
+        node.right.accept(self, ctx)
+
+    def visitPattern(self, node: Pattern, ctx):
+        pass
+
+    def visitExpr(self, node: Expr, ctx):
+        node.lhs.accept(self, ctx)
+        node.rhs.accept(self, ctx)
+
+    def visitIdentifier(self, node: Identifier, ctx):
+        self.add_read(node.name)
+
+    def visitType(self, node: Type, ctx):
+        pass
+
+    def visitFuncCall(self, node: FuncCall, ctx):
+        for a in node.args:
+            a.accept(self, ctx)
+
+    def visitMethodCall(self, node: MethodCall, ctx):
+        assert isinstance(node.obj, Identifier)
+        if node.method.name in ["SET", "DELETE"]:
+            self.add_write(node.obj.name)
+        else:
+            self.add_read(node.obj.name)
+        for a in node.args:
+            if a != None:
+                a.accept(self, ctx)
+
+    def visitSend(self, node: Send, ctx):
+        node.msg.accept(self, ctx)
+
+    def visitLiteral(self, node: Literal, ctx):
+        pass
+
+    def visitError(self, node: Error, ctx):
+        pass
+
+
 class AliasAnalyzer(Visitor):
     def __init__(self, target: str):
         self.targets: List[str] = [target]
@@ -355,8 +443,7 @@ class AliasAnalyzer(Visitor):
             self.target_fields[t] = []
 
     def visitBlock(self, node: List[Statement], ctx) -> List[str]:
-        for s in node:
-            s.accept(self, ctx)
+        self.visit_many(node, ctx)
         return self.targets
 
     def visitNode(self, node: Node, ctx):
@@ -385,8 +472,7 @@ class AliasAnalyzer(Visitor):
     def visitMatch(self, node: Match, ctx):
         for (p, s) in node.actions:
             p.accept(self, ctx)
-            for st in s:
-                st.accept(self, ctx)
+            self.visit_many(s, ctx)
 
     def visitAssign(self, node: Assign, ctx):
         name = node.left.name
@@ -0,0 +1,200 @@
+"""
+Static estimate of the per-RPC processing cost of an element.
+
+For the req and resp procedures of a Program, CostEstimator counts the operations
+that dominate the cost of the generated code: state map operations, round-trips to
+the remote storage behind strong-consistency state, RPC decodes and encodes, string
+allocations, and calls to global functions (e.g., encrypt). Counts are taken along
+the most expensive branch of every match.
+"""
+from __future__ import annotations
+
+from typing import Dict, List, Set
+
+from compiler.element.logger import ELEMENT_LOG as LOG
+from compiler.element.node import *
+from compiler.element.node import Expr, Identifier, Internal, MethodCall, Procedure
+from compiler.element.visitor import Visitor
+
+# Global functions that return a newly allocated string.
+STRING_FUNCTIONS = ["encrypt", "decrypt"]
+
+
+class Cost:
+    def __init__(
+        self,
+        state_ops: int = 0,
+        remote_round_trips: int = 0,
+        rpc_decodes: int = 0,
+        rpc_encodes: int = 0,
+        string_allocs: int = 0,
+        calls: Dict[str, int] = None,
+    ) -> None:
+        self.state_ops = state_ops
+        self.remote_round_trips = remote_round_trips
+        self.rpc_decodes = rpc_decodes
+        self.rpc_encodes = rpc_encodes
+        self.string_allocs = string_allocs
+        # Calls to global functions, keyed by function name
+        self.calls: Dict[str, int] = calls if calls is not None else {}
+
+    def __add__(self, other: Cost) -> Cost:
+        calls = dict(self.calls)
+        for f, c in other.calls.items():
+            calls[f] = calls.get(f, 0) + c
+        return Cost(
+            self.state_ops + other.state_ops,
+            self.remote_round_trips + other.remote_round_trips,
+            self.rpc_decodes + other.rpc_decodes,
+            self.rpc_encodes + other.rpc_encodes,
+            self.string_allocs + other.string_allocs,
+            calls,
+        )
+
+    def max(self, other: Cost) -> Cost:
+        """Component-wise maximum, used to merge alternative branches."""
+        calls = dict(self.calls)
+        for f, c in other.calls.items():
+            calls[f] = max(calls.get(f, 0), c)
+        return Cost(
+            max(self.state_ops, other.state_ops),
+            max(self.remote_round_trips, other.remote_round_trips),
+            max(self.rpc_decodes, other.rpc_decodes),
+            max(self.rpc_encodes, other.rpc_encodes),
+            max(self.string_allocs, other.string_allocs),
+            calls,
+        )
+
+    def to_dict(self) -> Dict:
+        return {
+            "state_ops": self.state_ops,
+            "remote_round_trips": self.remote_round_trips,
+            "rpc_decodes": self.rpc_decodes,
+            "rpc_encodes": self.rpc_encodes,
+            "string_allocs": self.string_allocs,
+            "calls": dict(self.calls),
+        }
+
+
+class CostEstimator(Visitor):
+    def __init__(self, consistency: Dict[str, str]):
+        """
+        Args:
+            consistency: Consistency requirement of every internal state variable.
+        """
+        self.consistency = consistency
+        self.targets: List[str] = []
+        # Strong state read in the procedure. The generated code fetches each of
+        # them from the remote storage once per RPC.
+        self.fetched: Set[str] = set()
+        self.decoded = False
+        self.encoded = False
+
+    def visitBlock(self, node: List[Statement], ctx) -> Cost:
+        ret = Cost()
+        for c in self.visit_many(node, ctx):
+            ret = ret + c
+        return ret
+
+    def visitNode(self, node: Node, ctx) -> Cost:
+        if node == START_NODE or node == END_NODE or node == PASS_NODE:
+            return Cost()
+        LOG.error(f"{node.__class__.__name__} should be visited in cost estimator")
+        raise Exception("Unreachable!")
+
+    def visitProgram(self, node: Program, ctx):
+        raise Exception("Unreachable!")
+
+    def visitInternal(self, node: Internal, ctx):
+        raise Exception("Unreachable!")
+
+    def visitProcedure(self, node: Procedure, ctx) -> Cost:
+        self.targets = [f"rpc_{node.name}"]
+        self.fetched, self.decoded, self.encoded = set(), False, False
+        ret = self.visitBlock(node.body, ctx)
+        ret.remote_round_trips += len(self.fetched)
+        ret.rpc_decodes += int(self.decoded)
+        ret.rpc_encodes += int(self.encoded)
+        return ret
+
+    def visitStatement(self, node: Statement, ctx) -> Cost:
+        if node.stmt == None:
+            return Cost()
+        else:
+            return node.stmt.accept(self, ctx)
+
+    def visitMatch(self, node: Match, ctx) -> Cost:
+        ret = node.expr.accept(self, ctx)
+        branch = None
+        for (p, s) in node.actions:
+            c = self.visitBlock(s, ctx)
+            branch = c if branch is None else branch.max(c)
+        return ret + branch if branch is not None else ret
+
+    def visitAssign(self, node: Assign, ctx) -> Cost:
+        if isinstance(node.right, Identifier) and node.right.name in self.targets:
+            self.targets.append(node.left.name)
+        return node.right.accept(self, ctx)
+
+    def visitPattern(self, node: Pattern, ctx) -> Cost:
+        return Cost()
+
+    def visitExpr(self, node: Expr, ctx) -> Cost:
+        return node.lhs.accept(self, ctx) + node.rhs.accept(self, ctx)
+
+    def visitIdentifier(self, node: Identifier, ctx) -> Cost:
+        return Cost()
+
+    def visitType(self, node: Type, ctx) -> Cost:
+        return Cost()
+
+    def visitFuncCall(self, node: FuncCall, ctx) -> Cost:
+        ret = Cost(calls={node.name.name: 1})
+        if node.name.name in STRING_FUNCTIONS:
+            ret.string_allocs += 1
+        for a in node.args:
+            ret = ret + a.accept(self, ctx)
+        return ret
+
+    def visitMethodCall(self, node: MethodCall, ctx) -> Cost:
+        assert isinstance(node.obj, Identifier)
+        ret = Cost()
+        name = node.obj.name
+        if name in self.consistency:
+            ret.state_ops += 1
+            if self.consistency[name] == "strong":
+                if node.method == MethodType.GET:
+                    self.fetched.add(name)
+                else:
+                    ret.remote_round_trips += 1
+        elif name in self.targets:
+            # Accessing an RPC field requires decoding the message; modifying
+            # it also requires encoding it again.
+            self.decoded = True
+            if node.method == MethodType.GET:
+                ret.string_allocs += 1
+            elif node.method == MethodType.SET:
+                self.encoded = True
+        for a in node.args:
+            if a != None:
+                ret = ret + a.accept(self, ctx)
+        return ret
+
+    def visitSend(self, node: Send, ctx) -> Cost:
+        return node.msg.accept(self, ctx)
+
+    def visitLiteral(self, node: Literal, ctx) -> Cost:
+        return Cost(string_allocs=1 if node.type == DataType.STR else 0)
+
+    def visitError(self, node: Error, ctx) -> Cost:
+        # The error message is sent as a string.
+        return Cost(string_allocs=1)
+
+
+def estimate_cost(ir: Program) -> Dict[str, Cost]:
+    """Estimate the per-RPC cost of the request and response procedures of an element."""
+    consistency = {state[0].name: state[2].name for state in ir.definition.internal}
+    return {
+        "request": ir.req.accept(CostEstimator(consistency), None),
+        "response": ir.resp.accept(CostEstimator(consistency), None),
+    }
@@ -0,0 +1,189 @@
+"""
+Static estimate of the probability that an element drops an RPC.
+
+DropRateEstimator computes the probability that the req (resp) procedure of a
+Program forwards the RPC, i.e., sends a message other than an error to NET (APP).
+Elements that drop RPCs at random guard the drop with a comparison of randomf
+against a constant, e.g., `match(randomf(0,1) < prob)` where prob is set once in
+init, which gives the probability of each branch. The probability of other
+matches is unknown, so the estimate is unknown if their branches differ.
+"""
+from __future__ import annotations
+
+from typing import Dict, List, Optional
+
+from compiler.element.node import *
+from compiler.element.node import Expr, Identifier, Internal, Procedure
+from compiler.element.visitor import Visitor
+
+# Direction of the forwarded RPC, per procedure
+FORWARD = {"req": "NET", "resp": "APP"}
+
+# Comparisons of randomf(l, r) with a constant c, as the probability that they hold
+COMPARISONS = {
+    Operator.LT: lambda lo, hi, c: (c - lo) / (hi - lo),
+    Operator.LE: lambda lo, hi, c: (c - lo) / (hi - lo),
+    Operator.GT: lambda lo, hi, c: (hi - c) / (hi - lo),
+    Operator.GE: lambda lo, hi, c: (hi - c) / (hi - lo),
+}
+# The same comparison with the operands swapped, e.g., c > randomf(l, r)
+SWAPPED = {
+    Operator.LT: Operator.GT,
+    Operator.LE: Operator.GE,
+    Operator.GT: Operator.LT,
+    Operator.GE: Operator.LE,
+}
+
+
+class DropRateEstimator(Visitor):
+    def __init__(self, constants: Dict[str, float]):
+        """
+        Args:
+            constants: Internal state variables set to a number in init and
+                never assigned afterwards, with their value.
+        """
+        self.constants = constants
+        self.forward = ""
+
+    def constant(self, node: Expr) -> Optional[float]:
+        if isinstance(node, Identifier):
+            return self.constants.get(node.name)
+        if isinstance(node, Literal):
+            try:
+                return float(node.value)
+            except ValueError:
+                return None
+        return None
+
+    def probability(self, node: Expr) -> Optional[float]:
+        """Probability that a randomf comparison holds, if node is one."""
+        if getattr(node, "op", None) not in COMPARISONS:
+            return None
+        op, random, c = node.op, node.lhs, self.constant(node.rhs)
+        if not isinstance(random, FuncCall):
+            op, random, c = SWAPPED[op], node.rhs, self.constant(node.lhs)
+        if (
+            not isinstance(random, FuncCall)
+            or random.name.name != "randomf"
+            or c is None
+        ):
+            return None
+        bounds = [self.constant(a) for a in random.args]
+        if len(bounds) != 2 or None in bounds or bounds[0] >= bounds[1]:
+            return None
+        return min(1.0, max(0.0, COMPARISONS[op](*bounds, c)))
+
+    def visitBlock(self, node: List[Statement], ctx) -> Optional[float]:
+        # The RPC is forwarded if any statement forwards it.
+        rates = self.visit_many(node, ctx)
+        if 1.0 in rates:
+            return 1.0
+        if None in rates:
+            return None
+        ret = 0.0
+        for r in rates:
+            ret = ret + r - ret * r
+        return ret
+
+    def visitNode(self, node: Node, ctx) -> float:
+        if node == START_NODE or node == END_NODE or node == PASS_NODE:
+            return 0.0
+        raise Exception("Unreachable!")
+
+    def visitProgram(self, node: Program, ctx):
+        raise Exception("Unreachable!")
+
+    def visitInternal(self, node: Internal, ctx):
+        raise Exception("Unreachable!")
+
+    def visitProcedure(self, node: Procedure, ctx) -> Optional[float]:
+        self.forward = FORWARD[node.name]
+        return self.visitBlock(node.body, ctx)
+
+    def visitStatement(self, node: Statement, ctx) -> Optional[float]:
+        if node.stmt == None:
+            return 0.0
+        else:
+            return node.stmt.accept(self, ctx)
+
+    def visitMatch(self, node: Match, ctx) -> Optional[float]:
+        rates = [self.visitBlock(s, ctx) for (_, s) in node.actions]
+        if len(set(rates)) == 1:
+            # Every branch forwards the same way
+            return rates[0]
+        p = self.probability(node.expr)
+        if p is None or None in rates:
+            return None
+        ret = 0.0
+        for (pattern, _), r in zip(node.actions, rates):
+            value = pattern.value
+            if not isinstance(value, Literal) or value.value not in ["true", "false"]:
+                return None
+            ret += (p if value.value == "true" else 1 - p) * r
+        return ret
+
+    def visitAssign(self, node: Assign, ctx) -> float:
+        return 0.0
+
+    def visitExpr(self, node: Expr, ctx) -> float:
+        return 0.0
+
+    def visitFuncCall(self, node: FuncCall, ctx) -> float:
+        return 0.0
+
+    def visitMethodCall(self, node: MethodCall, ctx) -> float:
+        return 0.0
+
+    def visitSend(self, node: Send, ctx) -> float:
+        if node.direction == self.forward and not isinstance(node.msg, Error):
+            return 1.0
+        return 0.0
+
+
+def unwrap(s: Statement) -> Optional[Statement]:
+    # Matches are in the body as is, other statements may be wrapped.
+    return s.stmt if type(s) == Statement else s
+
+
+def constant_states(ir: Program) -> Dict[str, float]:
+    """Internal state variables set to a number in init and never assigned in req or resp."""
+    states = [state[0].name for state in ir.definition.internal]
+    constants: Dict[str, float] = {}
+    for s in ir.init.body:
+        stmt = unwrap(s)
+        if isinstance(stmt, Assign) and stmt.left.name in states:
+            try:
+                constants[stmt.left.name] = float(stmt.right.value)
+            except (AttributeError, ValueError):
+                constants.pop(stmt.left.name, None)
+    for proc in [ir.req, ir.resp]:
+        for name in assigned(proc.body):
+            constants.pop(name, None)
+    return constants
+
+
+def assigned(block: List[Statement]) -> List[str]:
+    """Names assigned anywhere in a block, including the branches of matches."""
+    ret = []
+    for s in block:
+        stmt = unwrap(s)
+        if isinstance(stmt, Assign):
+            ret.append(stmt.left.name)
+        elif isinstance(stmt, Match):
+            for (_, actions) in stmt.actions:
+                ret.extend(assigned(actions))
+    return ret
+
+
+def estimate_drop_rate(ir: Program) -> Dict[str, Optional[float]]:
+    """Estimate the probability that the request and response procedures of an element drop an RPC.
+
+    Returns:
+        The drop probability per path, None if it cannot be inferred.
+    """
+    constants = constant_states(ir)
+    ret = {}
+    for path, proc in [("request", ir.req), ("response", ir.resp)]:
+        forward = proc.accept(DropRateEstimator(constants), None)
+        ret[path] = None if forward is None else 1.0 - forward
+    return ret
@@ -1,4 +1,6 @@
-from typing import Dict, List, Optional, Tuple
+from __future__ import annotations
+
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
 
 from compiler.element.node import *
 from compiler.element.node import Expr, Identifier, MethodCall
@@ -20,12 +22,29 @@ class Property:
         self.read: List[str] = []
         self.write: List[str] = []
         self.copy: bool = False
+        # Internal state variables accessed, qualified by element name
+        self.state_read: List[str] = []
+        self.state_write: List[str] = []
+
+    def clone(self) -> Property:
+        ret = Property()
+        ret.drop, ret.block, ret.copy = self.drop, self.block, self.copy
+        ret.read, ret.write = list(self.read), list(self.write)
+        ret.state_read, ret.state_write = list(self.state_read), list(self.state_write)
+        return ret
 
     def check(self):
         self.read = list(set(self.read))
         self.write = list(set(self.write))
         self.read = [i.strip("'") for i in self.read]
         self.write = [i.strip("'") for i in self.write]
+        self.state_read = list(set(self.state_read))
+        self.state_write = list(set(self.state_write))
+
+
+# Maps the structural key of a procedure to its analysis result, so that
+# procedures repeated across elements (e.g., a trivial resp) are analyzed once.
+_property_memo: Dict[Tuple, Property] = {}
 
 
 class Edge:
@@ -45,14 +64,58 @@ class Vertex:
             self.annotation = "[" + annotation + "]" + self.node.__class__.__name__
 
 
+class PathSummary:
+    """
+    Summary of the statements executed so far along a set of paths that share
+    the same alias set, drop/random flags and (capped) number of sends.
+    """
+
+    def __init__(
+        self,
+        aliases: FrozenSet[str],
+        no_drop: bool = False,
+        random: bool = False,
+        sends: int = 0,
+    ) -> None:
+        self.aliases = aliases
+        self.no_drop = no_drop
+        self.random = random
+        self.sends = sends
+
+    def key(self) -> Tuple[FrozenSet[str], bool, bool, int]:
+        return (self.aliases, self.no_drop, self.random, self.sends)
+
+
+class StatementEffect:
+    """Per-statement analysis result, given the alias set of the enclosing path."""
+
+    def __init__(self, node: Node, targets: List[str], direction: str) -> None:
+        wa = WriteAnalyzer(targets)
+        wa.visitBlock([node], None)
+        self.write: List[str] = [vv[0] for v in wa.target_fields.values() for vv in v]
+
+        ra = ReadAnalyzer(targets)
+        ra.visitBlock([node], None)
+        self.read: List[str] = [vv for v in ra.target_fields.values() for vv in v]
+
+        da = DropAnalyzer(targets, direction)
+        self.no_drop: bool = da.visitBlock([node], None)
+        self.random: bool = da.random_included
+
+        ca = CopyAnalyzer(targets)
+        self.sends: int = ca.visitBlock([node], None)
+
+
 class FlowGraph:
     def __init__(self) -> None:
         self.vertices: List[Vertex] = []
         self.edges: List[Edge] = []
         self.in_deg: Dict[int, int] = {}
+        self.succ: Dict[int, List[int]] = {}
 
     def link(self, u: int, v: int, w: Tuple[Expr, Expr] = []) -> None:
         self.edges.append(Edge(u, v, w))
+        self.succ.setdefault(u, []).append(v)
         if v in self.in_deg:
             self.in_deg[v] += 1
         else:
@@ -118,30 +181,56 @@ class FlowGraph:
 
         self.link(prev, end_v.idx)
 
-    def extract_path(self) -> List[List[Vertex]]:
+    def topological_order(self) -> List[int]:
+        in_deg = dict(self.in_deg)
+        order = []
         q = [0]
-        ret: Dict[int, List[List[Vertex]]] = {}
-        ret[0] = [[self.vertices[0]]]
         while len(q) > 0:
             u = q.pop()
-            for e in self.edges:
-                if e.u == u:
-                    v = self.vertices[e.v]
-                    paths = ret[u].copy()
-                    paths = [p + [v] for p in paths]
-                    if e.v not in ret:
-                        ret[e.v] = paths
-                    else:
-                        ret[e.v] = ret[e.v] + paths
-                    self.in_deg[e.v] -= 1
-                    if self.in_deg[e.v] == 0:
-                        q.append(e.v)
+            order.append(u)
+            for v in self.succ.get(u, []):
+                in_deg[v] -= 1
+                if in_deg[v] == 0:
+                    q.append(v)
+        return order
+
+    def extract_path(self) -> List[List[Vertex]]:
+        """Enumerate all paths from start to end. Exponential; for debugging only."""
+        ret: Dict[int, List[List[Vertex]]] = {}
+        ret[0] = [[self.vertices[0]]]
+        for u in self.topological_order():
+            for v in self.succ.get(u, []):
+                paths = [p + [self.vertices[v]] for p in ret[u]]
+                ret[v] = ret.get(v, []) + paths
         return ret[1]
 
     def analyze(self, proc: Procedure, verbose: bool = False) -> Property:
-        # Paths represent all possible code path of this element
+        """
+        Compute the union of the element properties over all code paths.
+
+        Instead of enumerating paths (exponential in the number of sequential
+        matches), this runs forward/backward dataflow passes over the flow graph:
+
+        1. Forward: the alias sets of rpc_name that can reach each vertex.
+        2. Backward: for each (vertex, incoming alias set), the alias sets that
+           the paths through it can end with. Every per-path analyzer uses the
+           alias set at the end of the path, so this determines which alias
+           sets a statement is analyzed with.
+        3. Forward again, once per final alias set, propagating PathSummary
+           states to decide drop/block/copy at the end vertex.
+
+        The number of distinct states per vertex is bounded by the number of
+        distinct alias sets, so the cost is linear in the size of the graph.
+
+        Results are memoized by the structure of the procedure. Verbose runs
+        always analyze, so that the report is printed.
+        """
+        key = (proc.name, structural_key(proc.body))
+        if not verbose and key in _property_memo:
+            return _property_memo[key].clone()
+
         self.build_graph(proc)
-        paths = self.extract_path()
+        order = self.topological_order()
         rpc_name = f"rpc_{proc.name}"
 
         direction = ""
@@ -150,59 +239,91 @@ class FlowGraph:
         elif proc.name == "resp":
             direction = "Up"
 
-        report = "Total #Path = " + str(len(paths)) + "\n"
+        transfers: Dict[Tuple[int, FrozenSet[str]], FrozenSet[str]] = {}
+
+        def transfer(u: int, aliases: FrozenSet[str]) -> FrozenSet[str]:
+            key = (u, aliases)
+            if key not in transfers:
+                aa = AliasAnalyzer(rpc_name)
+                aa.targets = list(aliases)
+                transfers[key] = frozenset(aa.visitBlock([self.vertices[u].node], None))
+            return transfers[key]
+
+        effects: Dict[Tuple[int, FrozenSet[str]], StatementEffect] = {}
 
+        def effect(u: int, targets: FrozenSet[str]) -> StatementEffect:
+            key = (u, targets)
+            if key not in effects:
+                effects[key] = StatementEffect(
+                    self.vertices[u].node, list(targets), direction
+                )
+            return effects[key]
+
+        # Pass 1: alias sets reaching each vertex
+        alias_in: Dict[int, Set[FrozenSet[str]]] = {u: set() for u in order}
+        alias_in[0].add(frozenset([rpc_name]))
+        for u in order:
+            for aliases in alias_in[u]:
+                out = transfer(u, aliases)
+                for v in self.succ.get(u, []):
+                    alias_in[v].add(out)
+
+        # Pass 2: alias sets at the end of the paths through each vertex
+        finals: Dict[Tuple[int, FrozenSet[str]], Set[FrozenSet[str]]] = {}
+        for u in reversed(order):
+            for aliases in alias_in[u]:
+                out = transfer(u, aliases)
+                if u == 1:
+                    finals[(u, aliases)] = {out}
+                else:
+                    finals[(u, aliases)] = set().union(
+                        *[finals[(v, out)] for v in self.succ.get(u, [])]
+                    )
+
+        # Pass 3: per final alias set, accumulate fields and path summaries
         ret = Property()
+        summaries: List[PathSummary] = []
+        for final in finals.get((0, frozenset([rpc_name])), set()):
+            states: Dict[int, Dict[Tuple, PathSummary]] = {u: {} for u in order}
+            start = PathSummary(frozenset([rpc_name]))
+            states[0][start.key()] = start
+            for u in order:
+                for state in states[u].values():
+                    if final not in finals[(u, state.aliases)]:
+                        # No path through this state ends with this alias set
+                        continue
+                    e = effect(u, final)
+                    ret.write.extend(e.write)
+                    ret.read.extend(e.read)
+                    nxt = PathSummary(
+                        transfer(u, state.aliases),
+                        state.no_drop or e.no_drop,
+                        state.random or e.random,
+                        min(state.sends + e.sends, 2),
+                    )
+                    if u == 1:
+                        summaries.append(nxt)
+                    for v in self.succ.get(u, []):
+                        states[v][nxt.key()] = nxt
 
-        # Visit every possible code path and take a union of the operation
-        for path in paths:
-            report += "\nFor path: \n     "
-            report += "->".join([v.annotation for v in path if v != self.vertices[-1]])
-            report += "\n\n"
-            path_nodes = [v.node for v in path]
-            aa = AliasAnalyzer(rpc_name)
-            targets = aa.visitBlock(path_nodes, None)
-            wa = WriteAnalyzer(targets)
-            write = wa.visitBlock(path_nodes, None)
-            if write:
-                write_fields = wa.target_fields
-                report += "Write: "
-                for (k, v) in write_fields.items():
-                    for vv in v:
-                        report += f"{vv} "
-                        ret.write.append(vv[0])
-                report += "\n"
-
-            ra = ReadAnalyzer(targets)
-            read = ra.visitBlock(path_nodes, None)
-
-            if read:
-                read_fields = ra.target_fields
-                report += "Read: "
-                for (k, v) in read_fields.items():
-                    for vv in v:
-                        report += f"({vv}) "
-                        ret.read.append(vv)
-                report += "\n"
-
-            da = DropAnalyzer(targets, direction)
-            no_drop = da.visitBlock(path_nodes, None)
-            random_drop = da.random_included and not no_drop
-
-            if random_drop:
-                report += "Random Drop(Block)\n"
+        for summary in summaries:
+            if summary.random and not summary.no_drop:
                 ret.block = True
             else:
-                report += "No Drop" if no_drop else "Possible Drop"
-                ret.drop = ret.drop or (not no_drop)
-                report += "\n"
-
-            ca = CopyAnalyzer(targets)
-            copy = ca.visitBlock(path_nodes, None)
-            ret.copy = ret.copy or (copy > 1)
-            report += f"Copy #={copy}" if copy > 1 else "No Copy"
-            report += "\n"
+                ret.drop = ret.drop or (not summary.no_drop)
+            ret.copy = ret.copy or summary.sends > 1
 
         if verbose:
+            num_paths = {0: 1}
+            for u in order:
+                for v in self.succ.get(u, []):
+                    num_paths[v] = num_paths.get(v, 0) + num_paths[u]
+            report = f"Total #Path = {num_paths.get(1, 0)}\n"
+            report += f"Write: {sorted(set(ret.write))}\n"
+            report += f"Read: {sorted(set(ret.read))}\n"
+            report += (
+                f"Drop: {ret.drop}, Random Drop(Block): {ret.block}, Copy: {ret.copy}\n"
+            )
             print(report)
+        _property_memo[key] = ret.clone()
         return ret
@@ -3,9 +3,10 @@ Module that defines the base type of visitor.
 """
 from __future__ import annotations
 
-from typing import Callable
+from typing import Callable, List
 
 from compiler.element.node import *
+from compiler.element.node import visit_many
 
 
 def accept(visitor: Visitor, ctx) -> Callable:
@@ -13,6 +14,9 @@ def accept(visitor: Visitor, ctx) -> Callable:
 
 
 class Visitor(ABC):
+    def visit_many(self, nodes: List[Node], ctx) -> List:
+        return visit_many(self, nodes, ctx)
+
     def visitNode(self, node: Node, ctx):
         raise Exception(f"visit function for {node.__class__.__name__} not implemented")
 
@@ -217,10 +217,16 @@ def scriptgen_envoy(
     #     # no optimization: keep everything unchanged so that no sidecar will be bypassed
     #     pass
 
-    # Adjust replica count
+    # Adjust replica count: per service from the spec, else from --replica
+    replicas = {}
+    for gir in girs.values():
+        replicas[gir.client], replicas[gir.server] = gir.replicas
     replica = os.getenv("SERVICE_REPLICA")
-    if replica is not None:
-        for sname in services:
+    for sname in services:
+        if sname in replicas:
+            target_yml = find_target_yml(yml_list_istio, sname)
+            target_yml["spec"]["replicas"] = replicas[sname]
+        elif replica is not None:
             target_yml = find_target_yml(yml_list_istio, sname)
             target_yml["spec"]["replicas"] = int(replica)
 
@@ -14,6 +14,7 @@ class GraphParser:
     def __init__(self):
         self.services = set()
         self.app_edges = []
+        self.replicas: Dict[str, int] = {}
 
     def parse(self, spec_path: str) -> Tuple[Union[Dict[str, GraphIR], str, str]]:
         """Parse the user specification file and produce graphirs & service locations.
@@ -36,6 +37,13 @@ class GraphParser:
             self.services.add(server)
             self.app_edges.append((client, server))
 
+        # Replica count of each service: from the spec, else from --replica
+        default_replica = int(os.getenv("SERVICE_REPLICA", "1"))
+        for service in self.services:
+            self.replicas[service] = int(
+                spec_dict.get("replicas", {}).get(service, default_replica)
+            )
+
         # if "edge" in spec_dict:
         #     for edge in spec_dict["edge"].keys():
         #         client, server = edge.split("->")
@@ -61,7 +69,13 @@ class GraphParser:
             if "link" in spec_dict and f"{client}->{server}" in spec_dict["link"]:
                 pair.extend(spec_dict["link"][eid])
             if len(chain) + len(pair) > 0:
-                graphir[eid] = GraphIR(client, server, chain, pair)
+                graphir[eid] = GraphIR(
+                    client,
+                    server,
+                    chain,
+                    pair,
+                    (self.replicas[client], self.replicas[server]),
+                )
 
         # Get file path for application's manifest file
         app_name = spec_dict["app_name"]
@@ -1,13 +1,29 @@
 from __future__ import annotations
 
+import time
 from copy import deepcopy
-from typing import Dict, List, Union
+from typing import Dict, List, Optional, Tuple, Union
 
 from rich import box
 from rich.panel import Panel
 
+from compiler.graph.ir.cost_model import CostModel
 from compiler.graph.ir.element import AbsElement
-from compiler.graph.ir.optimization import chain_optimize, cost_chain_optimize
+from compiler.graph.ir.optimization import (
+    PARETO_TIMEOUT_MS,
+    SearchTimeout,
+    anytime_order,
+    chain_metrics,
+    cost_order,
+    fusion_groups,
+    heuristic_order,
+    init_dependency,
+    pareto_orders,
+    sides,
+    split_and_consolidate,
+)
+from compiler.graph.ir.optimization_cache import get_optimization_cache
+from compiler.graph.logger import GRAPH_LOG
 
 
 def make_service_rich(name: str) -> Panel:
@@ -28,8 +44,35 @@ def make_service_rich(name: str) -> Panel:
     )
 
 
+def chain_summary(
+    chain: List[AbsElement], groups: Optional[List[Tuple[int, int]]] = None
+) -> str:
+    """Describe a chain (before consolidation) in the format of str(GraphIR).
+
+    Args:
+        groups: Fusion groups of the chain (see optimization.fusion_groups).
+            Defaults to fusing each side into one element.
+    """
+    network_pos = [element.position == "N" for element in chain].index(True)
+    if groups is None:
+        groups = [(0, network_pos), (network_pos + 1, len(chain))]
+    client_groups, server_groups = [], []
+    for start, end in groups:
+        if start < end:
+            fused = "+".join(map(str, chain[start:end]))
+            (client_groups if start < network_pos else server_groups).append(fused)
+    return " -> ".join(client_groups) + " (network) " + " -> ".join(server_groups)
+
+
 class GraphIR:
-    def __init__(self, client: str, server: str, chain: List[Dict], pair: List[Dict]):
+    def __init__(
+        self,
+        client: str,
+        server: str,
+        chain: List[Dict],
+        pair: List[Dict],
+        replicas: Tuple[int, int] = (1, 1),
+    ):
         """Initiate an unoptimized graphir according to the specified elements.
 
         Args:
@@ -39,9 +82,13 @@ class GraphIR:
             pair: A list of dictionaries including user-specified paired-element configs.
                   Pair elements are deployed on the client and server sides which cancel
                   out each other.
+            replicas: Replica counts of the client and server services.
         """
         self.client = client
         self.server = server
+        self.replicas = replicas
+        # Other Pareto-optimal chains found by the "pareto" algorithm, with their metrics
+        self.alternatives: List[Dict] = []
         self.elements: Dict[str, List[AbsElement]] = {
             "req_client": [],
             "req_server": [],
@@ -145,17 +192,173 @@ class GraphIR:
         panel_list.append(make_service_rich(self.server))
         return panel_list
 
-    def optimize(self, opt_level: str, algorithm: str):
-        """Run optimization algorithm on the graphir."""
-        optimize_func = cost_chain_optimize if algorithm == "cost" else chain_optimize
-        self.elements["req_client"], self.elements["req_server"] = optimize_func(
-            self.elements["req_client"]
-            + [AbsElement("NETWORK")]
-            + self.elements["req_server"],
-            "request",
-            opt_level,
+    def search(
+        self,
+        chain: List[AbsElement],
+        response: List[AbsElement],
+        opt_level: str,
+        algorithm: str,
+        model: CostModel,
+        timeout_ms: Optional[float],
+    ) -> Tuple[List[List[AbsElement]], bool]:
+        """Run the optimizer on a chain (see optimize).
+
+        Returns:
+            The optimized chain (or the frontier of the "pareto" algorithm), and
+            whether the search completed within the budget.
+        """
+        if algorithm == "cost" and timeout_ms is not None:
+            optimized, stats = anytime_order(
+                chain, "request", opt_level, timeout_ms, model, response
+            )
+            gap = 0.0
+            if stats["cost"] > 0:
+                gap = max(0.0, 1 - stats["lower_bound"] / stats["cost"])
+            GRAPH_LOG.info(
+                f"{self.name}: explored {stats['explored']} candidates"
+                f"{' (out of time)' if stats['timed_out'] else ''}, "
+                f"cost {stats['cost']:.4f}, optimality gap {gap:.2%}"
+            )
+            return [optimized], not stats["timed_out"]
+        if algorithm == "cost":
+            return [cost_order(chain, "request", opt_level, model, response)], True
+        if algorithm == "pareto":
+            # The search is exhaustive, so it is always bounded.
+            budget = timeout_ms if timeout_ms is not None else PARETO_TIMEOUT_MS
+            deadline = time.monotonic() + budget / 1000
+            try:
+                return (
+                    pareto_orders(
+                        chain, "request", opt_level, model, response, deadline
+                    ),
+                    True,
+                )
+            except SearchTimeout:
+                GRAPH_LOG.warning(
+                    f"{self.name}: Pareto search out of time after {budget} ms, "
+                    "keeping the heuristic chain"
+                    + ("" if timeout_ms is not None else " (see --opt_timeout_ms)")
+                )
+                incumbent = heuristic_order(list(chain), "request", opt_level, response)
+                return [incumbent], False
+        return [heuristic_order(chain, "request", opt_level, response)], True
+
+    def optimize(
+        self,
+        opt_level: str,
+        algorithm: str,
+        cost_model: Optional[CostModel] = None,
+        objective: str = "cost",
+        timeout_ms: Optional[float] = None,
+    ):
+        """Run optimization algorithm on the graphir.
+
+        The request and response paths go through the same elements, in reverse
+        order for the responses, so both paths are optimized jointly: the chain is
+        reordered only if it stays equivalent on both, and the cost algorithm
+        counts the cost of both. Each response element is placed with its request
+        counterpart, i.e., the same element or, for a pair, the half on the same side.
+
+        The heuristic algorithm fuses the elements of each side into one. The
+        "cost" and "pareto" algorithms fuse them into the contiguous groups that
+        are cheapest to deploy (see optimization.fusion_groups), one element each.
+
+        The "pareto" algorithm finds the chains that are Pareto-optimal on latency,
+        CPU, remote state operations and number of sidecars, and picks the best one
+        on the objective. The others are kept in self.alternatives.
+
+        The optimized order of the chain is memoized, so that edges with an
+        identical chain are only optimized once.
+
+        Args:
+            opt_level: "ignore", "weak" or "strong".
+            algorithm: "cost" for the cost-driven optimizer, "pareto" for the
+                multi-objective one, otherwise the heuristic one.
+            cost_model: Parameters of the cost model. Defaults to the built-in ones.
+            objective: Metric minimized by the "pareto" algorithm, "cost" or one of
+                optimization.METRICS.
+            timeout_ms: Wall-clock budget of the "cost" and "pareto" algorithms.
+                They start from the chain of the heuristic optimizer and return
+                the best chain(s) found within the budget. The "pareto" algorithm
+                defaults to optimization.PARETO_TIMEOUT_MS.
+        """
+        network = AbsElement("NETWORK")
+        chain = self.elements["req_client"] + [network] + self.elements["req_server"]
+        # The response elements are built along the request ones, so the i-th
+        # element of the response chain sits where the i-th one of the chain does.
+        response = self.elements["res_client"] + [network] + self.elements["res_server"]
+        assert len(response) == len(chain), "response chain does not match request"
+        model = (cost_model or CostModel()).for_edge(self.name, self.replicas)
+        if algorithm in ("cost", "pareto"):
+            params = model.to_dict()
+            if algorithm == "cost" and timeout_ms is not None:
+                # The result may be the heuristic one.
+                params["incumbent"] = "heuristic"
+        else:
+            params = None
+        cache = get_optimization_cache()
+        signature = cache.signature(
+            chain, "request", opt_level, algorithm, params, response
         )
-        # Currently, we don't consider optimization for the response chain,
-        # so the response chain is copied from request chain.
-        self.elements["res_client"] = deepcopy(self.elements["req_client"])
-        self.elements["res_server"] = deepcopy(self.elements["res_server"])
+        if algorithm == "pareto":
+            frontier = cache.get_frontier(signature, len(chain))
+        else:
+            order = cache.get(signature, len(chain))
+            frontier = [order] if order is not None else None
+        if frontier is None:
+            optimized, complete = self.search(
+                chain, response, opt_level, algorithm, model, timeout_ms
+            )
+            positions = {id(element): i for i, element in enumerate(chain)}
+            frontier = [[positions[id(e)] for e in found] for found in optimized]
+            if complete:
+                # Results cut short by the budget may improve in a later run.
+                cache.put(signature, frontier if algorithm == "pareto" else frontier[0])
+        else:
+            # The optimizer adds the trace fields to the element properties.
+            init_dependency(chain, "request")
+            init_dependency(response, "response")
+        order = frontier[0]
+        self.alternatives = []
+        if algorithm == "pareto":
+            # Every point is scored as it would be deployed, i.e., in fusion groups.
+            scores, summaries = [], []
+            for point in frontier:
+                ordered = [chain[i] for i in point]
+                ordered_response = [response[i] for i in point]
+                point_groups = fusion_groups(
+                    ordered, "request", model, ordered_response
+                )
+                scores.append(
+                    chain_metrics(
+                        ordered, "request", model, ordered_response, point_groups
+                    )
+                )
+                summaries.append(chain_summary(ordered, point_groups))
+            best = min(
+                range(len(frontier)),
+                key=lambda k: (scores[k][objective], scores[k]["cost"]),
+            )
+            order = frontier[best]
+            for k, score in enumerate(scores):
+                self.alternatives.append(
+                    {
+                        "chain": summaries[k],
+                        "selected": k == best,
+                        **{metric: round(value, 4) for metric, value in score.items()},
+                    }
+                )
+        chain = [chain[i] for i in order]
+        response = [response[i] for i in order]
+        groups = None
+        if algorithm in ("cost", "pareto"):
+            # The request and response elements of a group are deployed as one.
+            groups = fusion_groups(chain, "request", model, response)
+        (
+            self.elements["req_client"],
+            self.elements["req_server"],
+        ) = split_and_consolidate(chain, groups)
+        (
+            self.elements["res_client"],
+            self.elements["res_server"],
+        ) = split_and_consolidate(response, groups)
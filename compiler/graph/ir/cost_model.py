@@ -0,0 +1,232 @@
+"""
+Parameters of the chain cost model.
+
+The defaults are unit costs relative to the processing of one element. A cost
+model file (YAML or JSON, see examples/graph/cost_model.yml) replaces them with
+values measured on a backend, e.g., the overhead of an Envoy sidecar versus an
+mRPC engine. A file can override:
+
+* the global parameters (see CostModel), including the weights of the operations
+  of the static cost estimate of an element, at the top level or per backend
+  under `backends`;
+* per-element processing latency (`latency`) and drop probability (`drop`) under
+  `elements`, keyed by element name (see CostModel.drop_rate for the other
+  sources of drop probabilities);
+* the cost of the network hop (`network`) under `edges`, keyed by edge
+  ("client->server").
+
+Parameters that are not in the file keep their defaults.
+
+State synchronization is charged per replica of the service that runs the
+element, since every replica synchronizes its own copy. The replica counts come
+from the graph spec (see GraphIR).
+"""
+from __future__ import annotations
+
+import json
+from copy import deepcopy
+from typing import Any, Dict, Optional, Tuple
+
+import yaml
+
+from compiler.graph.ir.element import AbsElement
+
+# Default parameters of the cost model
+E = 1.0  # base processing cost of an element
+N = 1.0  # cost of the network hop
+D = 0.1  # drop rate of an element that drops or blocks RPCs
+S = 5.0  # cost of synchronizing strongly consistent state, per replica
+W = 0.5  # cost of the periodic synchronization of weakly consistent state, per replica
+R = 5.0  # cost of running a sidecar on one side
+H = 0.5  # cost of passing an RPC through one more element (filter) on a side
+RTT = 1.0  # cost of a round trip to the remote storage of strongly consistent state
+
+# Default weights of the operations of the static cost estimate of an element
+# (see compiler/element/props/cost.py), relative to the base processing cost
+STATE_OP = 0.05  # access to element state
+CODEC = 0.3  # decoding or encoding of an RPC
+STRING_ALLOC = 0.02  # string allocation
+CRYPTO = 0.5  # call to encrypt or decrypt
+CALL = 0.01  # call to another global function
+
+# Global functions charged as CRYPTO
+CRYPTO_FUNCTIONS = ["encrypt", "decrypt"]
+
+# Parameters of the per-element and per-edge sections of a cost model file
+ELEMENT_PARAMETERS = ["latency", "drop"]
+EDGE_PARAMETERS = ["network"]
+
+# Kinds of state synchronization needed on a side, as bits
+STRONG_SYNC = 1
+WEAK_SYNC = 2
+
+
+class CostModel:
+    # Global parameters, under the same names in a cost model file
+    PARAMETERS = [
+        "element",
+        "network",
+        "drop",
+        "state_sync",
+        "weak_sync",
+        "sidecar",
+        "state_rtt",
+        "hop",
+        "state_op",
+        "codec",
+        "string_alloc",
+        "crypto",
+        "call",
+    ]
+
+    def __init__(
+        self,
+        element: float = E,
+        network: float = N,
+        drop: float = D,
+        state_sync: float = S,
+        weak_sync: float = W,
+        sidecar: float = R,
+        state_rtt: float = RTT,
+        hop: float = H,
+        state_op: float = STATE_OP,
+        codec: float = CODEC,
+        string_alloc: float = STRING_ALLOC,
+        crypto: float = CRYPTO,
+        call: float = CALL,
+        elements: Optional[Dict[str, Dict[str, float]]] = None,
+        edges: Optional[Dict[str, Dict[str, float]]] = None,
+        replicas: Tuple[int, int] = (1, 1),
+    ):
+        """
+        Args:
+            element: Base processing cost of an element.
+            network: Cost of the network hop.
+            drop: Drop probability of an element that drops or blocks RPCs.
+            state_sync: Cost of synchronizing strongly consistent state, per replica.
+            weak_sync: Cost of the periodic synchronization of weakly consistent
+                state, per replica (the traffic of a tick amortized over the RPCs).
+            sidecar: Overhead of running a sidecar (or mRPC engine) on one side.
+            state_rtt: Cost of a round trip to the remote storage of strongly
+                consistent state.
+            hop: Overhead of passing an RPC through one more element (e.g., an
+                Envoy filter) on a side, i.e., of not fusing it with the previous one.
+            state_op, codec, string_alloc, crypto, call: Weights of the
+                operations of the static cost estimate of an element (state
+                accesses, RPC decodes and encodes, string allocations, calls to
+                encrypt/decrypt and to other global functions).
+            elements: Per-element "latency" (replaces the base and estimated
+                processing cost) and "drop" probability, keyed by element name.
+            edges: Per-edge "network" cost, keyed by edge name.
+            replicas: Replica counts of the client and server services.
+        """
+        self.element = element
+        self.network = network
+        self.drop = drop
+        self.state_sync = state_sync
+        self.weak_sync = weak_sync
+        self.sidecar = sidecar
+        self.state_rtt = state_rtt
+        self.hop = hop
+        self.state_op = state_op
+        self.codec = codec
+        self.string_alloc = string_alloc
+        self.crypto = crypto
+        self.call = call
+        self.elements = elements if elements is not None else {}
+        self.edges = edges if edges is not None else {}
+        self.replicas = replicas
+
+    def for_edge(self, edge: str, replicas: Tuple[int, int] = (1, 1)) -> CostModel:
+        """The cost model of an edge, with its own network cost if it has one.
+
+        Args:
+            replicas: Replica counts of the client and server services.
+        """
+        model = deepcopy(self)
+        if "network" in self.edges.get(edge, {}):
+            model.network = self.edges[edge]["network"]
+        model.edges = {}
+        model.replicas = replicas
+        return model
+
+    def sync_cost(self, side: str, sync: int) -> float:
+        """Cost of the state synchronization (STRONG_SYNC/WEAK_SYNC bits) needed on a side."""
+        replicas = self.replicas[0] if side == "client" else self.replicas[1]
+        cost = 0.0
+        if sync & STRONG_SYNC:
+            cost += self.state_sync * replicas
+        if sync & WEAK_SYNC:
+            cost += self.weak_sync * replicas
+        return cost
+
+    def element_latency(self, element: AbsElement) -> Optional[float]:
+        """Measured processing latency of an element, if any."""
+        return self.elements.get("+".join(element.name), {}).get("latency")
+
+    def call_cost(self, function: str) -> float:
+        """Weight of a call to a global function in the static cost estimate."""
+        return self.crypto if function in CRYPTO_FUNCTIONS else self.call
+
+    def drop_rate(self, element: AbsElement, path: str) -> float:
+        """Probability that an element drops (or blocks) an RPC.
+
+        In order of precedence: the drop_rate of the element in the graph spec,
+        the measured one of the cost model file, the drop_rate of the element
+        properties (inferred by the analyzer or hand-written) and the default.
+        """
+        if not element.has_prop(path, "drop", "block"):
+            return 0.0
+        if path in element.drop_rates:
+            return element.drop_rates[path]
+        measured = self.elements.get("+".join(element.name), {}).get("drop")
+        if measured is not None:
+            return measured
+        inferred = element.prop[path].get("drop_rate")
+        if inferred is not None:
+            return inferred
+        return self.drop
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            **{name: getattr(self, name) for name in self.PARAMETERS},
+            "elements": self.elements,
+            "edges": self.edges,
+            "replicas": list(self.replicas),
+        }
+
+
+def load_cost_model(path: str, backend: str) -> CostModel:
+    """Load a cost model file, with the parameters of the backend overriding the global ones.
+
+    Args:
+        path: Path to a YAML or JSON file.
+        backend: Backend name, e.g., "envoy" or "mrpc".
+    """
+    with open(path, "r") as f:
+        if path.endswith(".json"):
+            spec = json.load(f)
+        else:
+            spec = yaml.safe_load(f)
+    spec = spec if spec is not None else {}
+    sections = [spec, spec.get("backends", {}).get(backend, {})]
+    allowed = {"elements": ELEMENT_PARAMETERS, "edges": EDGE_PARAMETERS}
+
+    model = CostModel()
+    for section in sections:
+        for name, value in section.items():
+            if name in CostModel.PARAMETERS:
+                setattr(model, name, float(value))
+            elif name in ("elements", "edges"):
+                for key, params in value.items():
+                    for k in params:
+                        if k not in allowed[name]:
+                            raise ValueError(
+                                f"Unknown parameter {k} of {key} under {name} in {path}"
+                            )
+                    getattr(model, name).setdefault(key, {}).update(
+                        {k: float(v) for k, v in params.items()}
+                    )
+            elif name != "backends":
+                raise ValueError(f"Unknown cost model parameter {name} in {path}")
+    return model
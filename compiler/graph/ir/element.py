@@ -1,14 +1,22 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List, Union
+from copy import deepcopy
+from types import MappingProxyType
+from typing import Any, Dict, List, Tuple, Union
 
 from rich.panel import Panel
 
 from compiler.element import compile_element_property
-from compiler.graph.pseudo_element_compiler import pseudo_gen_property
+from compiler.graph.property_store import get_property_store
+from compiler.graph.pseudo_element_compiler import property_file, pseudo_gen_property
 
 global_element_id = 0
 
+# Process-wide property memo shared by all AbsElement instances (and thus by all
+# GraphIRs), keyed by (property source, element names, content hash, server).
+# Entries are frozen; an element copies its entry only before mutating it.
+_property_memo: Dict[Tuple, MappingProxyType] = {}
+
 
 def fetch_global_id() -> str:
     """Assign a globally-unique id to the new element instance."""
@@ -17,6 +25,42 @@ def fetch_global_id() -> str:
     return global_element_id
 
 
+def freeze_prop(prop: Any) -> Any:
+    """Convert a property dictionary into a read-only view (dicts -> mappingproxy, lists -> tuple)."""
+    if isinstance(prop, dict):
+        return MappingProxyType({k: freeze_prop(v) for k, v in prop.items()})
+    elif isinstance(prop, list):
+        return tuple(prop)
+    return prop
+
+
+def thaw_prop(prop: Any) -> Any:
+    """Inverse of freeze_prop: build a private, mutable copy of a frozen property."""
+    if isinstance(prop, MappingProxyType):
+        return {k: thaw_prop(v) for k, v in prop.items()}
+    elif isinstance(prop, tuple):
+        return list(prop)
+    return prop
+
+
+def parse_drop_rate(drop_rate: Any) -> Dict[str, float]:
+    """Parse the drop_rate of a spec element entry into drop probabilities per path.
+
+    A number is the probability on the request path; a dict maps "request" and
+    "response" to probabilities.
+    """
+    if drop_rate is None:
+        return {}
+    if not isinstance(drop_rate, dict):
+        drop_rate = {"request": drop_rate}
+    rates = {}
+    for path, rate in drop_rate.items():
+        if path not in ["request", "response"] or not 0 <= float(rate) <= 1:
+            raise ValueError(f"Invalid drop_rate {path}: {rate}")
+        rates[path] = float(rate)
+    return rates
+
+
 class AbsElement:
     def __init__(
         self, info: Union[Dict[str, Any], str], partner: str = "", server: str = ""
@@ -29,6 +73,9 @@ class AbsElement:
         if info == "NETWORK":
             self.name = info
             self.position = "N"
+            self.server = ""
+            self.partner = ""
+            self.drop_rates = {}
         else:
             self.id = fetch_global_id()
             self.name: List[str] = [info["name"]]
@@ -41,6 +88,8 @@ class AbsElement:
             self.proto = info["proto"]
             self.method = info["method"]
             self.partner = partner
+            # Drop probability annotated in the spec, per path
+            self.drop_rates = parse_drop_rate(info.get("drop_rate"))
 
     @property
     def desc(self) -> str:
@@ -69,9 +118,34 @@ class AbsElement:
             expand=False,
         )
 
+    def __deepcopy__(self, memo):
+        # Frozen properties are shared with the copy instead of being duplicated.
+        copied = self.__class__.__new__(self.__class__)
+        memo[id(self)] = copied
+        for k, v in self.__dict__.items():
+            if k == "_prop" and isinstance(v, MappingProxyType):
+                copied._prop = v
+            else:
+                setattr(copied, k, deepcopy(v, memo))
+        return copied
+
+    def __getstate__(self):
+        # Frozen properties cannot be pickled, e.g., to ship the element to a worker process.
+        state = self.__dict__.copy()
+        if isinstance(state.get("_prop"), MappingProxyType):
+            state["_prop"] = thaw_prop(state["_prop"])
+        return state
+
     def set_property_source(self, pseudo_property: bool):
         self.pseudo_property = pseudo_property
 
+    @property
+    def prop_sources(self) -> List[str]:
+        """Files the element properties are derived from."""
+        if self.pseudo_property:
+            return [property_file(name) for name in self.name]
+        return self.path
+
     @property
     def prop(self):
         if not hasattr(self, "_prop"):
@@ -86,19 +160,53 @@ class AbsElement:
                 }
             else:
                 assert hasattr(self, "pseudo_property"), "property source not set"
-                if self.pseudo_property:
-                    self._prop = pseudo_gen_property(self)
-                else:
-                    self._prop = compile_element_property(
-                        self.name, self.path, server=self.server
+                store, sources = get_property_store(), self.prop_sources
+                content_hash = store.content_hash(self.pseudo_property, sources)
+                key = (
+                    self.pseudo_property,
+                    tuple(self.name),
+                    content_hash,
+                    self.server,
+                )
+                if key not in _property_memo:
+                    # Element analysis is skipped if the persistent store has
+                    # properties of the same element content.
+                    prop = store.get(
+                        self.pseudo_property,
+                        self.name,
+                        sources,
+                        self.server,
+                        content_hash,
                     )
-                # TODO: remove this after property compiler has deduplication
-                for path in ["request", "response"]:
-                    for p in self._prop[path].keys():
-                        if isinstance(self._prop[path][p], list):
-                            self._prop[path][p] = list(set(self._prop[path][p]))
+                    if prop is None:
+                        if self.pseudo_property:
+                            prop = pseudo_gen_property(self)
+                        else:
+                            prop = compile_element_property(
+                                self.name, self.path, server=self.server
+                            )
+                        store.put(
+                            self.pseudo_property,
+                            self.name,
+                            sources,
+                            self.server,
+                            content_hash,
+                            prop,
+                        )
+                    # TODO: remove this after property compiler has deduplication
+                    for path in ["request", "response"]:
+                        for p in prop[path].keys():
+                            if isinstance(prop[path][p], list):
+                                prop[path][p] = list(set(prop[path][p]))
+                    _property_memo[key] = freeze_prop(prop)
+                self._prop = _property_memo[key]
         return self._prop
 
+    def own_prop(self):
+        """Replace the shared (frozen) property with a private copy before mutating it."""
+        if isinstance(self.prop, MappingProxyType):
+            self._prop = thaw_prop(self._prop)
+
     def has_prop(self, path: str, *props) -> bool:
         """Check whether the element has at least one of the listed properties.
 
@@ -113,7 +221,7 @@ class AbsElement:
         assert path in ["request", "response"], f"path = {path} not exist"
         for p in props:
             if p in self.prop[path]:
-                if isinstance(self.prop[path][p], list):
+                if isinstance(self.prop[path][p], (list, tuple)):
                     return True
                 elif self.prop[path][p] is True:
                     return True
@@ -130,6 +238,8 @@ class AbsElement:
         """
         assert path in ["request", "response"], f"path = {path} not exist"
         if p in self.prop[path]:
+            if isinstance(self.prop[path][p], tuple):
+                return list(self.prop[path][p])
             return self.prop[path][p]
         else:
             return []
@@ -143,6 +253,7 @@ class AbsElement:
             contents: new contents to be added
         """
         assert path in ["request", "response"], f"path = {path} not exist"
+        self.own_prop()
         if p not in self.prop[path]:
             self.prop[path][p] = []
         if isinstance(contents, str):
@@ -168,6 +279,7 @@ class AbsElement:
         # Fuse properties
         # Consolidation is the last step of optimization. Therefore, only state
         # propertieds needs to be merged.
+        self.own_prop()
         self.prop["state"]["stateful"] |= other.prop["state"]["stateful"]
         if other.prop["state"]["consistency"] == "strong":
             self.prop["state"]["consistency"] = "strong"
@@ -1,59 +1,230 @@
-from copy import deepcopy
-from itertools import permutations
+import math
+import time
 from pprint import pprint
-from typing import List, Tuple
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
+from compiler.graph.ir.cost_model import STRONG_SYNC, WEAK_SYNC, CostModel
 from compiler.graph.ir.element import AbsElement
 
 
 def init_dependency(chain: List[AbsElement], path: str):
+    """Add the trace fields to the element properties (once, so it can be called again)."""
     for element in chain:
-        if element.has_prop(path, "record"):
+        if element.has_prop(path, "record") and "droptrace" not in element.get_prop(
+            path, "record"
+        ):
             element.add_prop(path, "record", ["droptrace", "blocktrace", "copytrace"])
-        if element.has_prop(path, "drop"):
+        written = element.get_prop(path, "write")
+        if element.has_prop(path, "drop") and "droptrace" not in written:
             element.add_prop(path, "write", "droptrace")
-        if element.has_prop(path, "block"):
+        if element.has_prop(path, "block") and "blocktrace" not in written:
             element.add_prop(path, "write", "blocktrace")
-        if element.has_prop(path, "copy"):
+        if element.has_prop(path, "copy") and "copytrace" not in written:
             element.add_prop(path, "write", "copytrace")
 
 
-def gen_dependency(chain: List[AbsElement], path: str):
-    fields = {"droptrace", "blocktrace", "copytrace"}
-    for element in chain:
-        for f in (
-            element.get_prop(path, "read")
-            + element.get_prop(path, "write")
-            + element.get_prop(path, "record")
-        ):
-            fields.add(f)
-    writer_table = {f: ["INPUT"] for f in fields}
-    dep = {"read": dict(), "record": dict()}
-    for element in chain:
-        rfields, wfields, rec_fields = (
-            element.get_prop(path, "read"),
-            element.get_prop(path, "write"),
-            element.get_prop(path, "record"),
-        )
-        assert len(set(rfields)) == len(rfields), "duplicate fields"
-        assert len(set(wfields)) == len(wfields), "duplicate fields"
-        assert len(set(rec_fields)) == len(rec_fields), "duplicate fields"
-        if rfields == "*":
-            rfields = list(fields)
-        if wfields == "*":
-            wfields = list(fields)
-        for f in rfields:
-            dep["read"][(element.lib_name, f)] = deepcopy(writer_table[f])
-        for f in rec_fields:
-            dep["record"][(element.lib_name, f)] = deepcopy(writer_table[f])
-        for f in wfields:
-            if element.partner in writer_table[f]:
-                writer_table[f].remove(element.partner)
+# Synthetic fields that record whether an element dropped, blocked or copied the RPC.
+# Writes to them commute, e.g., two ACLs may drop an RPC in either order.
+TRACE_FIELDS = ["droptrace", "blocktrace", "copytrace"]
+
+
+def overlap(f: str, g: str) -> bool:
+    """Whether two fields may refer to the same data ("*" is any field, "a.b" is nested in "a")."""
+    return f == g or "*" in (f, g) or f.startswith(g + ".") or g.startswith(f + ".")
+
+
+def bits(mask: int):
+    """Iterate over the positions of the set bits of a mask, from the lowest."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class FieldTable:
+    """The fields accessed by a chain, interned to bit positions.
+
+    A set of fields is a bitmask over the table. The read, write and record sets
+    of every element are kept expanded, i.e., including all the fields of the
+    table that overlap with them.
+    """
+
+    def __init__(self, chain: List[AbsElement], path: str):
+        fields = set(TRACE_FIELDS)
+        for element in chain:
+            for p in ("read", "write", "record"):
+                fs = element.get_prop(path, p)
+                assert len(set(fs)) == len(fs), "duplicate fields"
+                fields.update(fs)
+        fields.discard("*")
+        self.fields = sorted(fields)
+        self.ids = {f: i for i, f in enumerate(self.fields)}
+        self.trace = [self.ids[f] for f in TRACE_FIELDS]
+        self.trace_mask = sum(1 << i for i in self.trace)
+        self.overlaps: Dict[str, int] = {}
+        self.read, self.write, self.record = {}, {}, {}
+        for element in chain:
+            self.read[element] = self.expand(element.get_prop(path, "read"))
+            self.write[element] = self.expand(element.get_prop(path, "write"))
+            self.record[element] = self.expand(element.get_prop(path, "record"))
+
+    def expand(self, fields: List[str]) -> int:
+        mask = 0
+        for f in fields:
+            if f not in self.overlaps:
+                self.overlaps[f] = sum(
+                    1 << i for i, g in enumerate(self.fields) if overlap(f, g)
+                )
+            mask |= self.overlaps[f]
+        return mask
+
+
+class ChainDependency:
+    """The dependencies of a chain, kept per position.
+
+    states[k] holds the writers of every field before the k-th element, and
+    deps[k] what the k-th element depends on: the writers of the fields it reads,
+    of the fields it records, and of the trace fields if it writes state. A move
+    that reorders a window of the chain only changes the dependencies inside
+    the window and, if the writers at its end differ, up to the point where they
+    agree again.
+    """
+
+    def __init__(self, chain: List[AbsElement], path: str):
+        self.chain = chain
+        self.path = path
+        self.table = FieldTable(chain, path)
+        self.state_writers = {
+            element
+            for element in chain
+            if len(element.get_prop(path, "state_write")) > 0
+        }
+        self.unique = len({element.lib_name for element in chain}) == len(chain)
+        state = [("INPUT",)] * len(self.table.fields)
+        self.states = [tuple(state)]
+        self.deps = []
+        for element in chain:
+            self.deps.append(self.step(element, state))
+            self.states.append(tuple(state))
+
+    def step(self, element: AbsElement, state: List[Tuple[str, ...]]) -> Tuple:
+        """Return the dependencies of an element and apply its writes to the state."""
+        table = self.table
+        reads = tuple((f, state[f]) for f in bits(table.read[element]))
+        records = tuple((f, state[f]) for f in bits(table.record[element]))
+        if element in self.state_writers:
+            # Upstream drops, blocks and copies change which RPCs update the state.
+            traces = tuple(state[f] for f in table.trace)
+        else:
+            traces = ()
+        for f in bits(table.write[element]):
+            writers = state[f]
+            if element.partner in writers:
+                i = writers.index(element.partner)
+                state[f] = writers[:i] + writers[i + 1 :]
+            elif table.trace_mask >> f & 1:
+                # Only the set of writers of a trace field matters, not their order.
+                state[f] = tuple(sorted(writers + (element.lib_name,)))
             else:
-                writer_table[f].append(element.lib_name)
-    for f in fields:
-        dep["read"][("OUTPUT", f)] = deepcopy(writer_table[f])
-    return dep
+                state[f] = writers + (element.lib_name,)
+        return reads, records, traces
+
+    def to_dict(self) -> Dict:
+        fields = self.table.fields
+        dep = {"read": dict(), "record": dict(), "state": dict()}
+        for element, (reads, records, traces) in zip(self.chain, self.deps):
+            for f, writers in reads:
+                dep["read"][(element.lib_name, fields[f])] = list(writers)
+            for f, writers in records:
+                dep["record"][(element.lib_name, fields[f])] = list(writers)
+            for f, writers in zip(TRACE_FIELDS, traces):
+                dep["state"][(element.lib_name, f)] = list(writers)
+        for f, writers in enumerate(self.states[-1]):
+            dep["read"][("OUTPUT", fields[f])] = list(writers)
+        return dep
+
+    def check_move(
+        self, new_chain: List[AbsElement], start: int, end: int, opt_level: str
+    ) -> Tuple[bool, int]:
+        """Check whether new_chain, which reorders chain[start:end], has the same dependencies.
+
+        Returns:
+            Whether it does, and the last position of the chain that the answer
+            depends on.
+        """
+        if opt_level == "weak":
+            parts = 1
+        elif opt_level == "strong":
+            parts = 3
+        else:
+            raise ValueError(f"Unexpected optimization level {opt_level}")
+        if not self.unique:
+            # Dependencies are keyed by element names.
+            return (
+                same_dependency(self.chain, new_chain, self.path, opt_level),
+                len(new_chain) - 1,
+            )
+        state = list(self.states[start])
+        window = {e.lib_name: self.step(e, state)[:parts] for e in new_chain[start:end]}
+        for element, dep in zip(self.chain[start:end], self.deps[start:end]):
+            if window[element.lib_name] != dep[:parts]:
+                return False, end - 1
+        written = 0
+        for element in new_chain[start:end]:
+            written |= self.table.write[element]
+        k = end
+        changed = [f for f in bits(written) if state[f] != self.states[k][f]]
+        while len(changed) > 0:
+            if k == len(new_chain):
+                # The output depends on the writers of every field.
+                return False, k - 1
+            if self.step(new_chain[k], state)[:parts] != self.deps[k][:parts]:
+                return False, k
+            k += 1
+            changed = [f for f in changed if state[f] != self.states[k][f]]
+        return True, k - 1
+
+    def update(self, new_chain: List[AbsElement], start: int, end: int):
+        """Move to new_chain, which reorders chain[start:end]."""
+        state = list(self.states[start])
+        for k in range(start, len(new_chain)):
+            self.deps[k] = self.step(new_chain[k], state)
+            if k + 1 >= end and self.states[k + 1] == tuple(state):
+                break
+            self.states[k + 1] = tuple(state)
+        self.chain = new_chain
+
+
+def gen_dependency(chain: List[AbsElement], path: str):
+    return ChainDependency(chain, path).to_dict()
+
+
+def commutes(a: AbsElement, b: AbsElement, path: str, opt_level: str) -> bool:
+    """Prove that swapping two adjacent elements preserves the dependencies compared by `equivalent`.
+
+    This holds when neither element writes a field that the other reads or writes
+    (trace fields excepted) and, for strong equivalence, neither records a field
+    the other writes nor updates state that depends on the other's drops/copies.
+    A False result is not a proof of the opposite.
+    """
+    if opt_level == "ignore":
+        return True
+    if a.partner != "" or b.partner != "" or a.lib_name == b.lib_name:
+        # Paired elements cancel out each other's writes; leave them to `equivalent`.
+        return False
+    for x, y in [(a, b), (b, a)]:
+        read = x.get_prop(path, "read")
+        if opt_level == "strong":
+            read = read + x.get_prop(path, "record")
+            if len(x.get_prop(path, "state_write")) > 0:
+                read = read + TRACE_FIELDS
+        write = [f for f in x.get_prop(path, "write") if f not in TRACE_FIELDS]
+        for g in y.get_prop(path, "write"):
+            if any(overlap(f, g) for f in read):
+                return False
+            if g not in TRACE_FIELDS and any(overlap(f, g) for f in write):
+                return False
+    return True
 
 
 def position_valid(chain: List[AbsElement]) -> bool:
@@ -73,6 +244,13 @@ def equivalent(
 ) -> bool:
     if not position_valid(new_chain):
         return False
+    return same_dependency(chain, new_chain, path, opt_level)
+
+
+def same_dependency(
+    chain: List[AbsElement], new_chain: List[AbsElement], path: str, opt_level: str
+) -> bool:
+    """Compare the dependencies of two orders of a chain, regardless of positions."""
     if opt_level == "ignore":
         return True
     dep, new_dep = gen_dependency(chain, path), gen_dependency(new_chain, path)
@@ -85,66 +263,154 @@ def equivalent(
     # return dep == new_dep
 
 
-class OptimizedLabel(Exception):
-    pass
+def move_equivalent(
+    deps: ChainDependency,
+    new_chain: List[AbsElement],
+    moved: AbsElement,
+    start: int,
+    end: int,
+    opt_level: str,
+) -> Tuple[bool, int]:
+    """Check equivalence of moving one element across several others.
+
+    The move reorders new_chain[start:end] only. If the moved element commutes
+    with all the others there, the chains are equivalent without comparing
+    dependencies.
+
+    Returns:
+        Whether the chains are equivalent, and the last position of the chain
+        that the answer depends on.
+    """
+    if not position_valid(new_chain):
+        # Any order of the window is valid if the rest of the chain is.
+        return False, end - 1 if position_valid(deps.chain) else len(new_chain) - 1
+    crossed = [element for element in new_chain[start:end] if element is not moved]
+    if all(commutes(moved, other, deps.path, opt_level) for other in crossed):
+        return True, end - 1
+    return deps.check_move(new_chain, start, end, opt_level)
 
 
-def reorder(chain: List[AbsElement], path: str, opt_level: str) -> List[AbsElement]:
+def candidate_moves(chain: List[AbsElement], path: str):
+    """Moves tried by `reorder`, in order, as (position of the moved element, new position)."""
+    drop_list, non_drop_list, copy_list, non_copy_list = [], [], [], []
+    for i, element in enumerate(chain):
+        if element.has_prop(path, "drop", "block"):
+            drop_list.append(i)
+        else:
+            non_drop_list.append(i)
+        # Elements that drop RPCs are moved to the front even if they copy them,
+        # otherwise the two strategies would move them back and forth.
+        if element.has_prop(path, "copy") and not element.has_prop(
+            path, "drop", "block"
+        ):
+            copy_list.append(i)
+        else:
+            non_copy_list.append(i)
+    for i in non_drop_list:
+        for j in drop_list[::-1]:
+            if i > j:
+                break
+            # strategy 1: move drop element at the front of non-drop ones
+            yield j, i
+            # strategy 2: move non-drop element behind drop ones
+            yield i, j
+    for i in copy_list:
+        for j in non_copy_list[::-1]:
+            if i > j:
+                break
+            # strategy 1: move copy element behind non-copy ones
+            yield i, j
+            # strategy 2: move non-copy element at the front of copy ones
+            yield j, i
+
+
+def response_move_equivalent(
+    res_deps: ChainDependency,
+    new_response: List[AbsElement],
+    moved: AbsElement,
+    start: int,
+    end: int,
+    opt_level: str,
+) -> bool:
+    """Check that a move of the chain keeps its response path equivalent.
+
+    Responses go through the chain in reverse, so res_deps is kept on the reversed
+    response elements. Positions are already checked on the request path.
+    """
+    size = len(new_response)
+    reversed_chain = new_response[::-1]
+    crossed = [
+        element
+        for element in reversed_chain[size - end : size - start]
+        if element is not moved
+    ]
+    if all(commutes(moved, other, "response", opt_level) for other in crossed):
+        return True
+    return res_deps.check_move(reversed_chain, size - end, size - start, opt_level)[0]
+
+
+def reorder(
+    chain: List[AbsElement],
+    path: str,
+    opt_level: str,
+    response: Optional[List[AbsElement]] = None,
+) -> List[AbsElement]:
+    """Move drop and copy elements as long as the chain stays equivalent.
+
+    Args:
+        response: The response-path elements of the chain, in the same order. If
+            given, moves must keep the response path equivalent too.
+    """
     # preparation: add some properties for analysis
     init_dependency(chain, path)
-    # reorder
+    deps = ChainDependency(chain, path)
+    if response is not None:
+        init_dependency(response, "response")
+        res_deps = ChainDependency(response[::-1], "response")
+    # Moves that are not equivalent, with the last position their check depended
+    # on. A move that reorders the chain from position p on only invalidates the
+    # ones that depended on p or later; the others are not checked again.
+    failed: Dict[Tuple[int, int], int] = {}
+    # Orders taken so far. A move may not return to one, so that the loop ends
+    # even if the strategies of candidate_moves disagree.
+    visited = {tuple(id(element) for element in chain)}
+    # reorder: take the first equivalent move until there is none
     optimized = True
     while optimized:
         optimized = False
-        drop_list, non_drop_list, copy_list, non_copy_list = [], [], [], []
-        for i, element in enumerate(chain):
-            if element.has_prop(path, "drop", "block"):
-                drop_list.append(i)
-            else:
-                non_drop_list.append(i)
-            if element.has_prop(path, "copy"):
-                copy_list.append(i)
-            else:
-                non_copy_list.append(i)
-        try:
-            for i in non_drop_list:
-                for j in drop_list[::-1]:
-                    if i > j:
-                        break
-                    # strategy 1: move drop element at the front of non-drop ones
-                    new_chain = chain[:i] + [chain[j]] + chain[i:j] + chain[j + 1 :]
-                    if equivalent(chain, new_chain, path, opt_level):
-                        chain = new_chain
-                        optimized = True
-                        raise OptimizedLabel()
-                    # strategy 2: move non-drop element behind drop ones
-                    new_chain = (
-                        chain[:i] + chain[i + 1 : j + 1] + [chain[i]] + chain[j + 1 :]
-                    )
-                    if equivalent(chain, new_chain, path, opt_level):
-                        chain = new_chain
-                        optimized = True
-                        raise OptimizedLabel()
-            for i in copy_list:
-                for j in non_copy_list[::-1]:
-                    if i > j:
-                        break
-                    # strategy 1: move copy element behind non-copy ones
-                    new_chain = (
-                        chain[:i] + chain[i + 1 : j + 1] + [chain[i]] + chain[j + 1 :]
-                    )
-                    if equivalent(chain, new_chain, path, opt_level):
-                        chain = new_chain
-                        optimized = True
-                        raise OptimizedLabel()
-                    # strategy 2: move non-copy element at the front of copy ones
-                    new_chain = chain[:i] + [chain[j]] + chain[i:j] + chain[j + 1 :]
-                    if equivalent(chain, new_chain, path, opt_level):
-                        chain = new_chain
-                        optimized = True
-                        raise OptimizedLabel()
-        except OptimizedLabel:
-            pass
+        for src, dst in candidate_moves(chain, path):
+            if (src, dst) in failed:
+                continue
+            new_chain = chain[:src] + chain[src + 1 :]
+            new_chain.insert(dst, chain[src])
+            if tuple(id(element) for element in new_chain) in visited:
+                continue
+            start, end = min(src, dst), max(src, dst) + 1
+            valid, reach = move_equivalent(
+                deps, new_chain, chain[src], start, end, opt_level
+            )
+            if valid and response is not None:
+                new_response = response[:src] + response[src + 1 :]
+                new_response.insert(dst, response[src])
+                valid = response_move_equivalent(
+                    res_deps, new_response, response[src], start, end, opt_level
+                )
+                # The response check runs on the reversed chain, so any move may
+                # change its answer.
+                reach = len(chain) - 1
+            if not valid:
+                failed[(src, dst)] = reach
+                continue
+            deps.update(new_chain, start, end)
+            chain = new_chain
+            visited.add(tuple(id(element) for element in chain))
+            if response is not None:
+                size = len(chain)
+                res_deps.update(new_response[::-1], size - end, size - start)
+                response = new_response
+            failed = {move: r for move, r in failed.items() if r < start}
+            optimized = True
+            break
     return chain
 
 
@@ -193,21 +459,58 @@ def gather(chain: List[AbsElement]) -> List[AbsElement]:
 
 def split_and_consolidate(
     chain: List[AbsElement],
+    groups: Optional[List[Tuple[int, int]]] = None,
 ) -> Tuple[List[AbsElement], List[AbsElement]]:
+    """Split a chain into its client and server sides and fuse their elements.
+
+    Args:
+        groups: Position ranges [start, end) of the chain to fuse into one element
+            each (see fusion_groups). By default, each side is fused into one element.
+    """
     network_pos = 0
     while network_pos < len(chain) and chain[network_pos].position != "N":
         network_pos += 1
-    client_chain, server_chain = chain[:network_pos], chain[network_pos + 1 :]
+    if groups is None:
+        groups = [
+            (start, end)
+            for start, end in [(0, network_pos), (network_pos + 1, len(chain))]
+            if start < end
+        ]
 
-    for i in range(1, len(client_chain)):
-        client_chain[0].fuse(client_chain[i])
-    for i in range(1, len(server_chain)):
-        server_chain[0].fuse(server_chain[i])
-    client_chain, server_chain = client_chain[:1], server_chain[:1]
+    client_chain, server_chain = [], []
+    for start, end in groups:
+        for i in range(start + 1, end):
+            chain[start].fuse(chain[i])
+        if start < network_pos:
+            client_chain.append(chain[start])
+        else:
+            server_chain.append(chain[start])
 
     return client_chain, server_chain
 
 
+def heuristic_order(
+    chain: List[AbsElement],
+    path: str,
+    opt_level: str,
+    response: Optional[List[AbsElement]] = None,
+) -> List[AbsElement]:
+    """Reorder an element chain with the heuristic optimizer (before consolidation).
+
+    Args:
+        response: The response-path elements of the chain, in the same order, which
+            must stay equivalent as well.
+    """
+    # Step 1: Reorder + Migration
+    chain = reorder(chain, path, opt_level, response)
+
+    # Step 2: Further migration - more opportunities for state consolidation
+    # and turning off sidecars
+    chain = gather(chain)
+
+    return chain
+
+
 def chain_optimize(
     chain: List[AbsElement],
     path: str,
@@ -223,70 +526,983 @@ def chain_optimize(
     Returns:
         client chain and server chain
     """
-    # Step 1: Reorder + Migration
-    chain = reorder(chain, path, opt_level)
+    return split_and_consolidate(heuristic_order(chain, path, opt_level))
 
-    # Step 2: Further migration - more opportunities for state consolidation
-    # and turning off sidecars
-    chain = gather(chain)
 
-    return split_and_consolidate(chain)
+def processing_cost(element: AbsElement, path: str, model: CostModel) -> float:
+    """Per-RPC processing cost of an element beyond the base cost, from the static estimate of the element compiler."""
+    estimate = element.get_prop(path, "cost")
+    if len(estimate) == 0:
+        # No estimate, e.g., hand-coded properties
+        return 0.0
+    return (
+        model.state_op * estimate["state_ops"]
+        + model.state_rtt * estimate["remote_round_trips"]
+        + model.codec * (estimate["rpc_decodes"] + estimate["rpc_encodes"])
+        + model.string_alloc * estimate["string_allocs"]
+        + sum(model.call_cost(f) * c for f, c in estimate["calls"].items())
+    )
+
 
+def element_cost(element: AbsElement, path: str, model: CostModel) -> float:
+    """Per-RPC cost of an element (or the network) for the RPCs that reach it."""
+    if element.position == "N":
+        return model.network
+    latency = model.element_latency(element)
+    if latency is not None:
+        return latency
+    return model.element + processing_cost(element, path, model)
 
-def cost(chain: List[AbsElement], path: str) -> float:
-    # Parameters
-    # TODO: different parameters for different backends
-    e = 1.0
-    n = 1.0
-    d = 0.1
-    s = 5.0
-    r = 5.0
 
+def sync_state(element: AbsElement, side: str) -> int:
+    """The state synchronization (STRONG_SYNC/WEAK_SYNC bits) the element needs when placed on the side.
+
+    State that only depends on the replica of the side is not synchronized.
+    """
+    if element.position == "N":
+        return 0
+    state = element.prop["state"]
+    if state["state_dependence"] == f"{side}_replica":
+        return 0
+    if state["consistency"] == "strong":
+        return STRONG_SYNC
+    if state["consistency"] == "weak":
+        return WEAK_SYNC
+    return 0
+
+
+def cost(
+    chain: List[AbsElement],
+    path: str,
+    model: Optional[CostModel] = None,
+    response: Optional[List[AbsElement]] = None,
+    groups: Optional[List[Tuple[int, int]]] = None,
+) -> float:
+    """Per-RPC cost of a chain.
+
+    Args:
+        response: The response-path elements of the chain, in the same order. If
+            given, the cost of the responses going back through the chain is added.
+        groups: Fusion groups of the chain (see fusion_groups). If given, the cost
+            of deploying the chain as these groups is added (see fusion_cost).
+    """
+    model = model if model is not None else CostModel()
     cost = 0
 
     workload = 1.0
     for element in chain:
-        cost += workload * (n if element.position == "N" else e)
-        if element.has_prop(path, "drop", "block"):
-            workload *= 1 - d
+        cost += workload * element_cost(element, path, model)
+        workload *= 1 - model.drop_rate(element, path)
+    if response is not None:
+        # The RPCs that were not dropped get a response, in the reverse order.
+        for element in reversed(response):
+            cost += workload * element_cost(element, "response", model)
+            workload *= 1 - model.drop_rate(element, "response")
+
+    client_chain, server_chain = sides(chain, response)
+
+    client_sync, server_sync = 0, 0
+    for element in client_chain:
+        client_sync |= sync_state(element, "client")
+    for element in server_chain:
+        server_sync |= sync_state(element, "server")
+    cost += model.sync_cost("client", client_sync)
+    cost += model.sync_cost("server", server_sync)
+
+    if len(client_chain) > 0:
+        cost += model.sidecar
+    if len(server_chain) > 0:
+        cost += model.sidecar
 
+    if groups is not None:
+        cost += fusion_cost(chain, path, groups, model, response)
+
+    return cost
+
+
+def sides(
+    chain: List[AbsElement], response: Optional[List[AbsElement]] = None
+) -> Tuple[List[AbsElement], List[AbsElement]]:
+    """The elements on the client and server sides of a chain (and of its response path)."""
     network_pos = -1
     for i in range(len(chain)):
         if chain[i].position == "N":
             network_pos = i
     assert network_pos != -1, "network element not found"
     client_chain, server_chain = chain[:network_pos], chain[network_pos + 1 :]
+    if response is not None:
+        client_chain = client_chain + response[:network_pos]
+        server_chain = server_chain + response[network_pos + 1 :]
+    return client_chain, server_chain
+
+
+def group_costs(
+    chain: List[AbsElement],
+    path: str,
+    model: CostModel,
+    response: Optional[List[AbsElement]] = None,
+) -> Callable[[int, int], float]:
+    """The cost of fusing the positions [start, end) of a chain into one element.
+
+    A fused element is one more hop for the RPCs (and responses) that reach it.
+    It also fetches the strong state of all its members before running any of
+    them, for all the RPCs that reach the group: a stateful member makes its
+    round trips to the remote storage for the RPCs dropped by an earlier member
+    as well, and the stateless members ahead of the first stateful one wait on
+    the slowest of those fetches instead of running right away (once per RPC,
+    as they wait on the same fetch).
+    """
+    size = len(chain)
+    rtts = [remote_round_trips(element, path) for element in chain]
+    workloads = [1.0]
+    for element in chain:
+        workloads.append(workloads[-1] * (1 - model.drop_rate(element, path)))
+    if response is not None:
+        # Responses enter the elements from the end of the chain.
+        res_rtts = [remote_round_trips(element, "response") for element in response]
+        res_workloads = [0.0] * size + [workloads[-1]]
+        for i in reversed(range(size)):
+            res_workloads[i] = res_workloads[i + 1] * (
+                1 - model.drop_rate(response[i], "response")
+            )
+
+    def group_cost(start: int, end: int) -> float:
+        w = workloads[start]
+        ret = model.hop * w
+        stateful = [i for i in range(start, end) if rtts[i] > 0]
+        for i in stateful:
+            ret += model.state_rtt * rtts[i] * (w - workloads[i])
+        if len(stateful) > 0 and stateful[0] > start:
+            ret += model.state_rtt * max(rtts[start:end]) * w
+        if response is not None:
+            w = res_workloads[end]
+            ret += model.hop * w
+            stateful = [i for i in range(start, end) if res_rtts[i] > 0]
+            for i in stateful:
+                ret += model.state_rtt * res_rtts[i] * (w - res_workloads[i + 1])
+            # Responses reach the last member first.
+            if len(stateful) > 0 and stateful[-1] < end - 1:
+                ret += model.state_rtt * max(res_rtts[start:end]) * w
+        return ret
+
+    return group_cost
 
+
+def fusion_cost(
+    chain: List[AbsElement],
+    path: str,
+    groups: List[Tuple[int, int]],
+    model: Optional[CostModel] = None,
+    response: Optional[List[AbsElement]] = None,
+) -> float:
+    """Per-RPC cost of the hops and blocking state of a chain deployed as the fusion groups."""
+    model = model if model is not None else CostModel()
+    group_cost = group_costs(chain, path, model, response)
+    return sum(group_cost(start, end) for start, end in groups)
+
+
+def fusion_groups(
+    chain: List[AbsElement],
+    path: str,
+    model: Optional[CostModel] = None,
+    response: Optional[List[AbsElement]] = None,
+) -> List[Tuple[int, int]]:
+    """Split each side of a chain into the contiguous groups of elements to fuse that minimize fusion_cost.
+
+    Fusing saves the hops between the elements, but makes the members of a group
+    wait on the remote state of the others. Ties are broken toward larger groups,
+    so each side is fused into one element unless splitting it is cheaper, e.g.,
+    to keep a strong-state element behind the elements that drop RPCs, or to
+    keep the elements ahead of it from waiting on its remote state.
+
+    Returns:
+        Position ranges [start, end) of the chain, in order.
+    """
+    model = model if model is not None else CostModel()
+    eps = 1e-9
+    group_cost = group_costs(chain, path, model, response)
+    network_pos = [element.position == "N" for element in chain].index(True)
+    groups = []
+    for lo, hi in [(0, network_pos), (network_pos + 1, len(chain))]:
+        # Cheapest grouping of [lo, j) and the start of its last group
+        best: Dict[int, Tuple[float, int]] = {lo: (0.0, lo)}
+        for j in range(lo + 1, hi + 1):
+            for i in range(lo, j):
+                c = best[i][0] + group_cost(i, j)
+                if j not in best or c < best[j][0] - eps:
+                    best[j] = (c, i)
+        side = []
+        j = hi
+        while j > lo:
+            side.append((best[j][1], j))
+            j = best[j][1]
+        groups.extend(side[::-1])
+    return groups
+
+
+# Metrics of the multi-objective optimizer, all to be minimized
+METRICS = ["latency", "cpu", "state_ops", "sidecars"]
+# Objectives to pick a chain of the frontier by: one of the metrics or the cost of `cost`
+OBJECTIVES = ["cost"] + METRICS
+# Wall-clock budget of the multi-objective search per edge when none is given,
+# in ms. Its search space grows exponentially with the length of the chain.
+PARETO_TIMEOUT_MS = 10000.0
+
+
+def remote_round_trips(element: AbsElement, path: str) -> float:
+    """Estimated round trips of an element to the remote storage of strong state, per RPC."""
+    estimate = element.get_prop(path, "cost")
+    if len(estimate) == 0:
+        return 0.0
+    return estimate["remote_round_trips"]
+
+
+def chain_metrics(
+    chain: List[AbsElement],
+    path: str,
+    model: Optional[CostModel] = None,
+    response: Optional[List[AbsElement]] = None,
+    groups: Optional[List[Tuple[int, int]]] = None,
+) -> Dict[str, float]:
+    """Score a chain on METRICS, and on the cost of `cost`.
+
+    * latency: expected processing time of the elements and the network per RPC,
+      plus the hops and blocking state of the fusion groups if given;
+    * cpu: expected processing time of the elements per RPC, plus the overhead
+      of the sidecars and of state synchronization;
+    * state_ops: expected round trips to the remote storage of strong state per RPC;
+    * sidecars: number of sides that run a sidecar (or mRPC engine).
+
+    Args:
+        response: The response-path elements of the chain, in the same order. If
+            given, the responses going back through the chain are scored too.
+        groups: Fusion groups of the chain (see fusion_groups) that it is deployed as.
+    """
+    model = model if model is not None else CostModel()
+    paths = [(chain, path)]
+    if response is not None:
+        paths.append((response[::-1], "response"))
+    latency, cpu, state_ops = 0.0, 0.0, 0.0
+    workload = 1.0
+    for elements, p in paths:
+        for element in elements:
+            processing = workload * element_cost(element, p, model)
+            latency += processing
+            if element.position != "N":
+                cpu += processing
+            state_ops += workload * remote_round_trips(element, p)
+            workload *= 1 - model.drop_rate(element, p)
+    client_chain, server_chain = sides(chain, response)
+    sidecars = (len(client_chain) > 0) + (len(server_chain) > 0)
+    client_sync, server_sync = 0, 0
     for element in client_chain:
-        if (
-            element.prop["state"]["consistency"] == "strong"
-            and element.prop["state"]["state_dependence"] != "client_replica"
-        ):
-            cost += s
-            break
+        client_sync |= sync_state(element, "client")
     for element in server_chain:
-        if (
-            element.prop["state"]["consistency"] == "strong"
-            and element.prop["state"]["state_dependence"] != "server_replica"
-        ):
-            cost += s
-            break
+        server_sync |= sync_state(element, "server")
+    if groups is not None:
+        latency += fusion_cost(chain, path, groups, model, response)
+    return {
+        "latency": latency,
+        "cpu": cpu
+        + model.sidecar * sidecars
+        + model.sync_cost("client", client_sync)
+        + model.sync_cost("server", server_sync),
+        "state_ops": state_ops,
+        "sidecars": sidecars,
+        "cost": cost(chain, path, model, response, groups),
+    }
 
-    if len(client_chain) > 0:
-        cost += r
-    if len(server_chain) > 0:
-        cost += r
 
-    return cost
+def dominates(a: Tuple[float, ...], b: Tuple[float, ...], eps: float = 1e-9) -> bool:
+    """Whether a is at least as good as b on every metric."""
+    return all(x <= y + eps for x, y in zip(a, b))
+
+
+POSITION_RANK = {"C": 0, "N": 1, "S": 2}
+
+
+class SearchTimeout(Exception):
+    """The time budget of a search ran out."""
+
+
+def precedence(chain: List[AbsElement], path: str, opt_level: str) -> List[int]:
+    """Build the precedence DAG of a chain as a bitmask of required predecessors per element.
+
+    Element i must precede element j (i < j) if their position constraints order
+    them (client < network < server) or if they do not commute. Every linear
+    extension of the DAG is then a valid chain equivalent to the original one.
+    """
+    preds = [0] * len(chain)
+    for j in range(len(chain)):
+        for i in range(j):
+            ri = POSITION_RANK.get(chain[i].position)
+            rj = POSITION_RANK.get(chain[j].position)
+            if (ri is not None and rj is not None and ri < rj) or not commutes(
+                chain[i], chain[j], path, opt_level
+            ):
+                preds[j] |= 1 << i
+    return preds
+
+
+def drop_ratio(job: Tuple[float, float]) -> float:
+    """Cost per dropped RPC of a job, given as (cost, share of the RPCs it passes on).
+
+    Without precedence, the cheapest order of jobs sorts them by this ratio, since
+    each of them reduces the workload of all the following ones.
+    """
+    cost, passed = job
+    return cost / (1 - passed) if passed < 1 else float("inf")
+
+
+def series_jobs(
+    first: List[Tuple[float, float]], then: List[Tuple[float, float]]
+) -> List[Tuple[float, float]]:
+    """Cheapest order of two sets of jobs where every job of first precedes every job of then.
+
+    Both lists are sorted by drop_ratio. A job of then that has a lower ratio than
+    the jobs before it is merged with them into one composite job, which runs them
+    back to back (Monma and Sidney's rule for series-parallel precedence), so the
+    result is sorted by drop_ratio as well.
+    """
+    ret = list(first)
+    for job in then:
+        while len(ret) > 0 and drop_ratio(ret[-1]) > drop_ratio(job):
+            cost, passed = ret.pop()
+            job = (cost + passed * job[0], passed * job[1])
+        ret.append(job)
+    return ret
+
+
+def cost_order(
+    chain: List[AbsElement],
+    path: str,
+    opt_level: str,
+    model: Optional[CostModel] = None,
+    response: Optional[List[AbsElement]] = None,
+    incumbent: Optional[List[AbsElement]] = None,
+    deadline: Optional[float] = None,
+    stats: Optional[Dict[str, Any]] = None,
+) -> List[AbsElement]:
+    """Find the cheapest chain that is equivalent to the given one (before consolidation).
+
+    Instead of trying every permutation, this searches the linear extensions of
+    the precedence DAG with branch and bound, in two passes:
+
+    1. Best-first: find the minimum cost, visiting the most promising element
+       first so that good chains are found early and prune the rest.
+    2. Lexicographic: find the first chain (in itertools.permutations order) of
+       the minimum cost, so that ties are broken as a brute-force search would.
+
+    A partial chain is pruned if a lower bound on the cost of its completions
+    cannot reach the best (pass 1) or minimum (pass 2) cost. The bounds are
+    kept per (set of placed elements, sidecar/state flags) and are tightened
+    by pass 1 as it explores, which leaves pass 2 with little to search. The
+    bound orders the elements that drop RPCs by drop_ratio, and charges each
+    of the other elements its cheapest split of those around it.
+
+    If the response-path elements of the chain are given (in the same order),
+    the chain must stay equivalent on both paths, and its cost includes the
+    responses going back through it.
+
+    Args:
+        incumbent: An equivalent chain found by another optimizer, returned
+            unless the search finds a cheaper one.
+        deadline: time.monotonic() after which the search stops and returns the
+            cheapest chain found so far.
+        stats: Filled with the number of partial chains "explored", the "cost"
+            of the result, a "lower_bound" on the cost of the searched chains
+            and whether the search "timed_out".
+    """
+    model = model if model is not None else CostModel()
+    R = model.sidecar
+    eps = 1e-9
+    original_cost = cost(chain, path, model, response)
+    init_dependency(chain, path)
+    size = len(chain)
+    preds = precedence(chain, path, opt_level)
+    costs = [element_cost(element, path, model) for element in chain]
+    drops = [model.drop_rate(element, path) for element in chain]
+    syncs = [(sync_state(e, "client"), sync_state(e, "server")) for e in chain]
+    if response is not None:
+        init_dependency(response, "response")
+        # The response path keeps the (reversed) order of the chain, so elements
+        # that do not commute on it keep their relative order as well.
+        for i, p in enumerate(precedence(response, "response", opt_level)):
+            preds[i] |= p
+        res_costs = [element_cost(e, "response", model) for e in response]
+        res_drops = [model.drop_rate(e, "response") for e in response]
+        syncs = [
+            (a[0] | sync_state(e, "client"), a[1] | sync_state(e, "server"))
+            for a, e in zip(syncs, response)
+        ]
+    else:
+        res_costs, res_drops = [0.0] * size, [0.0] * size
+    # Share of the RPCs that get a response, whatever the order
+    survival = 1.0
+    for d in drops:
+        survival *= 1 - d
+    network = [element.position == "N" for element in chain].index(True)
+    # Interchangeable elements (same cost, constraints and conflicts) only need
+    # to be tried in their original order: swapping them gives a chain of the
+    # same cost that comes later in the permutation order.
+    conflicts = [preds[i] for i in range(size)]
+    for j in range(size):
+        for i in range(j):
+            if preds[j] >> i & 1:
+                conflicts[i] |= 1 << j
+    for j in range(size):
+        for i in range(j):
+            if (
+                chain[i].position == chain[j].position
+                and costs[i] == costs[j]
+                and drops[i] == drops[j]
+                and res_costs[i] == res_costs[j]
+                and res_drops[i] == res_drops[j]
+                and syncs[i] == syncs[j]
+                and conflicts[i] & ~(1 << j) == conflicts[j] & ~(1 << i)
+            ):
+                preds[j] |= 1 << i
+    # Ignoring the precedence, the cheapest order of a set of elements runs the
+    # elements that drop first, by increasing ratio of cost to drop rate (see
+    # drop_ratio).
+    jobs = [(costs[i], 1 - drops[i]) for i in range(size)]
+    res_jobs = [(res_costs[i], 1 - res_drops[i]) for i in range(size)]
+    by_rank = sorted(range(size), key=lambda i: drop_ratio(jobs[i]))
+    res_by_rank = sorted(range(size), key=lambda i: drop_ratio(res_jobs[i]))
+    positions = [element.position for element in chain]
+    # Elements by position, and by the state synchronization they need on each
+    # side, as bitmasks
+    client_only, server_only, free = 0, 0, 0
+    for i in range(size):
+        if i == network:
+            continue
+        if positions[i] == "C":
+            client_only |= 1 << i
+        elif positions[i] == "S":
+            server_only |= 1 << i
+        else:
+            free |= 1 << i
+    sync_masks: Dict[Tuple[int, int], int] = {}
+    for i in range(size):
+        if i != network:
+            sync_masks[syncs[i]] = sync_masks.get(syncs[i], 0) | 1 << i
+    sync_types = list(sync_masks)
+    kinds: Dict[int, int] = {}
+
+    def sync_kinds(elements: int) -> int:
+        """State synchronization a set of elements needs, as a bitmask of sync_types."""
+        if elements not in kinds:
+            ret = 0
+            for k, sync in enumerate(sync_types):
+                if elements & sync_masks[sync]:
+                    ret |= 1 << k
+            kinds[elements] = ret
+        return kinds[elements]
+
+    # Responses go back through the chain in reverse, so the response workload of
+    # an element only depends on the elements after it, i.e., the unplaced ones
+    # that drop responses.
+    response_workloads: Dict[int, float] = {}
+    res_droppers = 0
+    for i in range(size):
+        if res_drops[i] > 0:
+            res_droppers |= 1 << i
+
+    def response_workload(mask: int) -> float:
+        mask &= res_droppers
+        if mask not in response_workloads:
+            w = survival
+            for i in range(size):
+                if res_droppers >> i & 1 and not mask >> i & 1:
+                    w *= 1 - res_drops[i]
+            response_workloads[mask] = w
+        return response_workloads[mask]
+
+    # Elements that drop RPCs on either path. The others do not change the
+    # workload of any element, so their cost only depends on which of the
+    # dropping elements go before them.
+    droppers = 0
+    for i in range(size):
+        if drops[i] > 0 or res_drops[i] > 0:
+            droppers |= 1 << i
+    transparent = [i for i in range(size) if not droppers >> i & 1]
 
+    def unplaced_cost(
+        mask: int,
+        jobs: List[Tuple[float, float]],
+        rank: List[int],
+        workload: float,
+        first: str,
+        last: str,
+    ) -> float:
+        """Lower bound on the cost of the unplaced droppers, ignoring the precedence
+        other than the positions: if the network is not placed yet, the first
+        droppers ("C" or "S") go before it and the last ones after it.
+        """
+        unplaced = [i for i in rank if not (mask >> i & 1 or ~droppers >> i & 1)]
+        if mask >> network & 1:
+            ordered = [jobs[i] for i in unplaced]
+        else:
+            before = [jobs[i] for i in unplaced if positions[i] == first]
+            after = [jobs[i] for i in unplaced if positions[i] == last]
+            if droppers >> network & 1:
+                before = series_jobs(before, [jobs[network]])
+            ordered = series_jobs(before, after)
+            ordered += [jobs[i] for i in unplaced if positions[i] not in POSITION_RANK]
+            ordered.sort(key=drop_ratio)
+        ret, w = 0.0, workload
+        for c, passed in ordered:
+            ret += w * c
+            w *= passed
+        return ret
+
+    # Droppers by decreasing ratio of the log of the shares they pass on the
+    # request path to that on the response path, i.e., the order in which going
+    # before an element saves the most of its request cost for the least of its
+    # response cost (see frontier_cost).
+    logs = [
+        (math.log(1 - drops[i]), math.log(1 - res_drops[i]))
+        if 0 < drops[i] < 1 and 0 < res_drops[i] < 1
+        else None
+        for i in range(size)
+    ]
+
+    def split_ratio(i: int) -> float:
+        return logs[i][0] / logs[i][1] if logs[i] is not None else 0.0
+
+    split_rank = sorted(
+        [i for i in range(size) if droppers >> i & 1], key=split_ratio, reverse=True
+    )
+
+    def frontier_cost(mask: int, before: int, after: int) -> Callable:
+        """Lower bound on the cost of an element that does not drop, as a function of
+        its request and response workloads before any unplaced dropper.
+
+        The droppers before the element (that cut its request workload and leave
+        its response workload alone) must include before and exclude after.
+        Droppers on both paths are relaxed to fractions, so that the cheapest
+        split lies on the frontier of the shares they pass on both paths.
+        """
+        passed, res_passed, both = 1.0, 1.0, []
+        for i in split_rank:
+            if mask >> i & 1:
+                continue
+            p, q = 1 - drops[i], 1 - res_drops[i]
+            if before >> i & 1 or (q == 1 and not after >> i & 1):
+                passed *= p
+            elif after >> i & 1 or p == 1:
+                res_passed *= q
+            else:
+                both.append(i)
+        if any(logs[i] is None for i in both):
+            # Charge each path its cheapest split on its own.
+            for i in both:
+                passed *= 1 - drops[i]
+                res_passed *= 1 - res_drops[i]
+            return lambda a, b: a * passed + b * res_passed
+        vertices = []
+        for i in both:
+            res_passed *= 1 - res_drops[i]
+        for i in both:
+            vertices.append((passed, res_passed) + logs[i])
+            passed *= 1 - drops[i]
+            res_passed /= 1 - res_drops[i]
+
+        def bound(a: float, b: float) -> float:
+            ret = a * passed + b * res_passed
+            if not vertices:
+                return ret
+            if a == 0 or b == 0:
+                return min(ret, a * vertices[0][0] + b * vertices[0][1])
+            for x, y, u, v in vertices:
+                ret = min(ret, a * x + b * y)
+                # Cheapest fraction of the next dropper, where the derivative is 0
+                t = math.log(v * b * y / (u * a * x)) / (u + v)
+                if 0 < t < 1:
+                    ret = min(ret, a * x * math.exp(u * t) + b * y * math.exp(-v * t))
+            return ret
+
+        return bound
+
+    # Lower bounds on the cost of the droppers and of each other element, by the
+    # set of placed droppers and whether the network is placed
+    split_bounds: Dict[int, Tuple[float, List[float]]] = {}
+
+    def split_bound(key: int, workload: float) -> Tuple[float, List[float]]:
+        if key not in split_bounds:
+            ret = unplaced_cost(key, jobs, by_rank, workload, "C", "S")
+            if response is not None:
+                # The responses reach the unplaced elements first, in reverse.
+                ret += unplaced_cost(key, res_jobs, res_by_rank, survival, "S", "C")
+            unplaced = droppers & ~key
+            before, after = unplaced & client_only, unplaced & server_only
+            if key >> network & 1:
+                before, after = 0, 0
+            frontiers: Dict[Tuple[int, int], Callable] = {}
+            element_bounds = [0.0] * size
+            for i in transparent:
+                if key >> i & 1:
+                    continue
+                constraint = (
+                    before if positions[i] in ["S", "N"] else 0,
+                    after if positions[i] in ["C", "N"] else 0,
+                )
+                if constraint not in frontiers:
+                    frontiers[constraint] = frontier_cost(key, *constraint)
+                element_bounds[i] = frontiers[constraint](
+                    workload * costs[i], survival * res_costs[i]
+                )
+            split_bounds[key] = ret, element_bounds
+        return split_bounds[key]
+
+    # Lower bounds on the cost of the unplaced elements on both paths, by mask
+    sequence_bounds: Dict[int, float] = {}
+
+    def lower_bound(mask: int, workload: float, flags: Tuple) -> float:
+        """Lower bound on the cost of the elements that are not placed yet."""
+        if mask not in sequence_bounds:
+            ret, element_bounds = split_bound(
+                mask & (droppers | 1 << network), workload
+            )
+            for i in transparent:
+                if not mask >> i & 1:
+                    ret += element_bounds[i]
+            sequence_bounds[mask] = ret
+        ret = sequence_bounds[mask]
+        unplaced = ~mask & (client_only | server_only | free)
+        on_server = mask >> network & 1
+        if on_server:
+            server_side, client_side, remaining = unplaced, 0, 0
+        else:
+            server_side, client_side = unplaced & server_only, unplaced & client_only
+            remaining = unplaced & free
+        key = (
+            flags,
+            sync_kinds(server_side),
+            sync_kinds(client_side),
+            sync_kinds(remaining),
+        )
+        if key not in placement_bounds:
+            placement_bounds[key] = placement_bound(*key)
+        return ret + placement_bounds[key]
+
+    # Lower bounds on the cost of the sidecars and state synchronization, by the
+    # flags and the synchronization needed by the unplaced elements on each side
+    placement_bounds: Dict[Tuple, float] = {}
+
+    def placement_bound(
+        flags: Tuple, server_side: int, client_side: int, remaining: int
+    ) -> float:
+        """Lower bound on the cost of the sidecars and state synchronization."""
+        client, client_sync, server, server_sync = flags
+        for k, sync in enumerate(sync_types):
+            if server_side >> k & 1:
+                server, server_sync = True, server_sync | sync[1]
+            if client_side >> k & 1:
+                client, client_sync = True, client_sync | sync[0]
+        client_cost = model.sync_cost("client", client_sync)
+        server_cost = model.sync_cost("server", server_sync)
+        ret = R * (client + server) + client_cost + server_cost
+        if remaining:
+            # Elements that may go either side need at least one sidecar, and
+            # their state synchronized on the side they end up on.
+            if not client and not server:
+                ret += R
+            ret += max(
+                min(
+                    model.sync_cost("client", client_sync | sync[0]) - client_cost,
+                    model.sync_cost("server", server_sync | sync[1]) - server_cost,
+                )
+                for k, sync in enumerate(sync_types)
+                if remaining >> k & 1
+            )
+        return ret
+
+    def children(mask: int, workload: float, acc: float, flags: Tuple):
+        for i in range(size):
+            if mask >> i & 1 or preds[i] & ~mask:
+                continue
+            # flags: the client side has (elements, state to synchronize), and so does the server side
+            if i == network:
+                new_flags = flags
+            elif mask >> network & 1:
+                new_flags = flags[:2] + (True, flags[3] | syncs[i][1])
+            else:
+                new_flags = (True, flags[1] | syncs[i][0]) + flags[2:]
+            new_mask = mask | 1 << i
+            step = workload * costs[i]
+            if response is not None:
+                step += response_workload(new_mask) * res_costs[i]
+            yield (
+                i,
+                new_mask,
+                workload * (1 - drops[i]),
+                acc + step,
+                new_flags,
+            )
+
+    # Lower bounds on the cost of completing a partial chain. The workload only
+    # depends on the set of placed elements, so the cost of the remaining
+    # elements depends on (mask, flags) but not on the order of the placed ones.
+    bounds: Dict[Tuple, float] = {}
+
+    def remaining_bound(mask: int, workload: float, flags: Tuple) -> float:
+        key = (mask, flags)
+        if key not in bounds:
+            bounds[key] = lower_bound(mask, workload, flags)
+        return bounds[key]
+
+    order: List[int] = []
+    min_cost = original_cost
+    result = chain
+    if incumbent is not None:
+        if response is None:
+            incumbent_cost = cost(incumbent, path, model)
+        else:
+            moved = [response[chain.index(element)] for element in incumbent]
+            incumbent_cost = cost(incumbent, path, model, moved)
+        if incumbent_cost < min_cost:
+            min_cost, result = incumbent_cost, incumbent
+    # Order of the cheapest chain found by pass 1, if cheaper than the result
+    best: Optional[List[int]] = None
+    explored = 0
+
+    def order_cost() -> float:
+        if response is None:
+            return cost([chain[i] for i in order], path, model)
+        return cost(
+            [chain[i] for i in order], path, model, [response[i] for i in order]
+        )
+
+    def search_min(mask: int, workload: float, acc: float, flags: Tuple) -> float:
+        """Search for a cheaper chain and return a lower bound on the remaining cost."""
+        nonlocal min_cost, best, explored
+        explored += 1
+        if deadline is not None and time.monotonic() > deadline:
+            raise SearchTimeout
+        if mask == (1 << size) - 1:
+            total = order_cost()
+            if total < min_cost - eps:
+                best = list(order)
+            min_cost = min(min_cost, total)
+            return total - acc
+        candidates = sorted(
+            (child[3] + remaining_bound(*child[1:3], child[4]), child)
+            for child in children(mask, workload, acc, flags)
+        )
+        ret = float("inf")
+        for bound, (i, *child) in candidates:
+            if bound >= min_cost - eps:
+                ret = min(ret, bound - acc)
+                break
+            order.append(i)
+            ret = min(ret, child[2] - acc + search_min(*child))
+            order.pop()
+        key = (mask, flags)
+        bounds[key] = max(bounds[key], ret) if key in bounds else ret
+        return ret
+
+    failed: Dict[Tuple, float] = {}
+
+    def search_first(mask: int, workload: float, acc: float, flags: Tuple) -> bool:
+        nonlocal explored
+        explored += 1
+        if deadline is not None and time.monotonic() > deadline:
+            raise SearchTimeout
+        if mask == (1 << size) - 1:
+            return order_cost() <= min_cost + eps
+        key = (mask, flags)
+        if key in failed and failed[key] <= acc + eps:
+            return False
+        for i, *child in children(mask, workload, acc, flags):
+            if child[2] + remaining_bound(*child[:2], child[3]) > min_cost + eps:
+                continue
+            order.append(i)
+            if search_first(*child):
+                return True
+            order.pop()
+        failed[key] = acc
+        return False
+
+    flags = (False, 0, False, 0)
+    timed_out = False
+    try:
+        search_min(0, 1.0, 0.0, flags)
+        if best is not None:
+            order.clear()
+            search_first(0, 1.0, 0.0, flags)
+            best = list(order)
+    except SearchTimeout:
+        timed_out = True
+    if best is not None:
+        result = [chain[i] for i in best]
+    if stats is not None:
+        stats["explored"] = explored
+        stats["cost"] = min_cost
+        stats["lower_bound"] = min(
+            [
+                child[3] + remaining_bound(*child[1:3], child[4])
+                for child in children(0, 1.0, 0.0, flags)
+            ],
+            default=min_cost,
+        )
+        stats["timed_out"] = timed_out
+    return result
+
+
+def anytime_order(
+    chain: List[AbsElement],
+    path: str,
+    opt_level: str,
+    timeout_ms: float,
+    model: Optional[CostModel] = None,
+    response: Optional[List[AbsElement]] = None,
+) -> Tuple[List[AbsElement], Dict[str, Any]]:
+    """Find a cheap equivalent chain within a wall-clock budget (before consolidation).
+
+    The chain of the heuristic optimizer is improved by the search of
+    `cost_order` until the budget runs out.
+
+    Returns:
+        The cheapest chain found, and the statistics of the search (see `cost_order`).
+    """
+    deadline = time.monotonic() + timeout_ms / 1000
+    incumbent = heuristic_order(list(chain), path, opt_level, response)
+    stats: Dict[str, Any] = {}
+    optimized = cost_order(
+        chain, path, opt_level, model, response, incumbent, deadline, stats
+    )
+    return optimized, stats
+
+
+def pareto_orders(
+    chain: List[AbsElement],
+    path: str,
+    opt_level: str,
+    model: Optional[CostModel] = None,
+    response: Optional[List[AbsElement]] = None,
+    deadline: Optional[float] = None,
+    stats: Optional[Dict[str, Any]] = None,
+) -> List[List[AbsElement]]:
+    """Find the chains equivalent to the given one that are Pareto-optimal on METRICS (before consolidation).
 
-def cost_chain_optimize(chain: List[AbsElement], path: str, opt_level: str):
-    min_cost = cost(chain, path)
+    Like `cost_order`, this walks the linear extensions of the precedence DAG,
+    one element at a time. The metrics of the elements that are not placed yet
+    only depend on the set of placed elements and the sidecar/state flags, so
+    only the partial chains that are not dominated by another one with the same
+    (set, flags) are extended.
+
+    Args:
+        deadline: time.monotonic() after which the search raises SearchTimeout.
+        stats: Filled with the number of partial chains "explored".
+
+    Returns:
+        One chain per point of the frontier, by increasing latency.
+    """
+    model = model if model is not None else CostModel()
     init_dependency(chain, path)
-    for new_chain in permutations(chain):
-        if position_valid(new_chain) and equivalent(chain, new_chain, path, opt_level):
-            new_cost = cost(new_chain, path)
-            if new_cost < min_cost:
-                chain = new_chain
-                min_cost = new_cost
-    return split_and_consolidate(chain)
+    size = len(chain)
+    preds = precedence(chain, path, opt_level)
+    costs = [element_cost(element, path, model) for element in chain]
+    drops = [model.drop_rate(element, path) for element in chain]
+    rtts = [remote_round_trips(element, path) for element in chain]
+    syncs = [(sync_state(e, "client"), sync_state(e, "server")) for e in chain]
+    if response is not None:
+        init_dependency(response, "response")
+        for i, p in enumerate(precedence(response, "response", opt_level)):
+            preds[i] |= p
+        res_costs = [element_cost(e, "response", model) for e in response]
+        res_drops = [model.drop_rate(e, "response") for e in response]
+        res_rtts = [remote_round_trips(e, "response") for e in response]
+        syncs = [
+            (a[0] | sync_state(e, "client"), a[1] | sync_state(e, "server"))
+            for a, e in zip(syncs, response)
+        ]
+    else:
+        res_costs, res_drops, res_rtts = [0.0] * size, [0.0] * size, [0.0] * size
+    network = [element.position == "N" for element in chain].index(True)
+    survival = 1.0
+    for d in drops:
+        survival *= 1 - d
+
+    response_workloads: Dict[int, float] = {}
+
+    def response_workload(mask: int) -> float:
+        if mask not in response_workloads:
+            w = survival
+            for i in range(size):
+                if not mask >> i & 1:
+                    w *= 1 - res_drops[i]
+            response_workloads[mask] = w
+        return response_workloads[mask]
+
+    # Partial chains as (latency, cpu, state_ops) so far, and the order of the
+    # placed elements, keyed by (mask, flags) and by the workload of the mask.
+    layer: Dict[Tuple, List] = {(0, (False, 0, False, 0)): [((0.0,) * 3, ())]}
+    workloads = {0: 1.0}
+    explored = 0
+    for _ in range(size):
+        next_layer: Dict[Tuple, List] = {}
+        for (mask, flags), labels in layer.items():
+            if deadline is not None and time.monotonic() > deadline:
+                raise SearchTimeout
+            workload = workloads[mask]
+            for i in range(size):
+                if mask >> i & 1 or preds[i] & ~mask:
+                    continue
+                if i == network:
+                    new_flags = flags
+                elif mask >> network & 1:
+                    new_flags = flags[:2] + (True, flags[3] | syncs[i][1])
+                else:
+                    new_flags = (True, flags[1] | syncs[i][0]) + flags[2:]
+                new_mask = mask | 1 << i
+                workloads[new_mask] = workload * (1 - drops[i])
+                res_workload = response_workload(new_mask)
+                processing = workload * costs[i] + res_workload * res_costs[i]
+                step = (
+                    processing,
+                    0.0 if i == network else processing,
+                    workload * rtts[i] + res_workload * res_rtts[i],
+                )
+                kept = next_layer.setdefault((new_mask, new_flags), [])
+                explored += len(labels)
+                for metrics, order in labels:
+                    metrics = tuple(m + d for m, d in zip(metrics, step))
+                    if any(dominates(other, metrics) for other, _ in kept):
+                        continue
+                    kept[:] = [
+                        label for label in kept if not dominates(metrics, label[0])
+                    ]
+                    kept.append((metrics, order + (i,)))
+        layer = next_layer
+    if stats is not None:
+        stats["explored"] = explored
+
+    frontier: List[Tuple[Tuple, List[AbsElement]]] = []
+    for labels in layer.values():
+        for _, order in labels:
+            ordered = [chain[i] for i in order]
+            if response is None:
+                scores = chain_metrics(ordered, path, model)
+            else:
+                scores = chain_metrics(
+                    ordered, path, model, [response[i] for i in order]
+                )
+            metrics = tuple(scores[m] for m in METRICS)
+            if any(dominates(other, metrics) for other, _ in frontier):
+                continue
+            frontier = [p for p in frontier if not dominates(metrics, p[0])]
+            frontier.append((metrics, ordered))
+    frontier.sort(key=lambda p: p[0])
+    return [ordered for _, ordered in frontier]
+
+
+def cost_chain_optimize(
+    chain: List[AbsElement],
+    path: str,
+    opt_level: str,
+    model: Optional[CostModel] = None,
+):
+    chain = cost_order(chain, path, opt_level, model)
+    return split_and_consolidate(chain, fusion_groups(chain, path, model))
@@ -0,0 +1,147 @@
+"""
+Memoized optimization results.
+
+Edges often carry identical element chains, e.g., the same ingress chain on a
+server reached from several clients. The optimized order of a chain only depends
+on the names, positions, partners, properties and annotated drop rates of its
+elements (and on the optimization level, the algorithm and the cost model), so it
+is cached under a signature of those and replayed on the elements of every other
+edge with the same chain.
+
+The cache lives in memory for the whole run and can be saved to (and loaded from)
+a JSON file to be reused across runs.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import pathlib
+from typing import Any, Dict, List, Optional
+
+from compiler.graph.ir.element import AbsElement, thaw_prop
+from compiler.graph.logger import GRAPH_LOG
+
+# Files whose content determines the result of an optimization.
+_OPTIMIZER_FILES = [
+    pathlib.Path(__file__).parent / "optimization.py",
+    pathlib.Path(__file__).parent / "cost_model.py",
+]
+
+
+def optimizer_version() -> str:
+    h = hashlib.sha256()
+    for path in _OPTIMIZER_FILES:
+        with open(path, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def _canonical(prop: Any) -> Any:
+    # Property lists are sets of fields, and their order may vary between runs.
+    if isinstance(prop, dict):
+        return {k: _canonical(v) for k, v in prop.items()}
+    if isinstance(prop, list):
+        return sorted((_canonical(v) for v in prop), key=json.dumps)
+    return prop
+
+
+def _element_signature(element: AbsElement) -> List[Any]:
+    if element.position == "N":
+        return ["NETWORK"]
+    prop = json.dumps(_canonical(thaw_prop(element.prop)), sort_keys=True)
+    return [
+        element.name,
+        element.position,
+        element.partner,
+        hashlib.sha256(prop.encode()).hexdigest(),
+        element.drop_rates,
+    ]
+
+
+class OptimizationCache:
+    def __init__(self):
+        self.optimizer_version = optimizer_version()
+        # Optimized orders, as positions in the original chain, keyed by signature.
+        # A Pareto frontier is a list of such orders.
+        self.orders: Dict[str, List] = {}
+        # Entries added since the last call to pop_updates
+        self.updates: Dict[str, List] = {}
+
+    def signature(
+        self,
+        chain: List[AbsElement],
+        path: str,
+        opt_level: str,
+        algorithm: str,
+        params: Any = None,
+        response: Optional[List[AbsElement]] = None,
+    ) -> str:
+        """Canonical signature of an optimization problem.
+
+        Args:
+            params: Other inputs of the algorithm, e.g., the cost model (JSON-serializable).
+            response: The response-path elements of the chain, if optimized jointly.
+        """
+        elements = [_element_signature(element) for element in chain]
+        if response is not None:
+            elements.append([_element_signature(element) for element in response])
+        return hashlib.sha256(
+            json.dumps(
+                [self.optimizer_version, path, opt_level, algorithm, params, elements]
+            ).encode()
+        ).hexdigest()
+
+    def get(self, signature: str, size: int) -> Optional[List[int]]:
+        order = self.orders.get(signature)
+        if order is not None and sorted(order) != list(range(size)):
+            # Not a permutation of the chain, e.g., a corrupted cache file
+            return None
+        return order
+
+    def get_frontier(self, signature: str, size: int) -> Optional[List[List[int]]]:
+        """Get the orders of a Pareto frontier (see optimization.pareto_orders)."""
+        frontier = self.orders.get(signature)
+        if not isinstance(frontier, list) or len(frontier) == 0:
+            return None
+        for order in frontier:
+            if not isinstance(order, list) or sorted(order) != list(range(size)):
+                return None
+        return frontier
+
+    def put(self, signature: str, order: List):
+        self.orders[signature] = order
+        self.updates[signature] = order
+
+    def merge(self, orders: Dict[str, List]):
+        """Add the entries found by another process (e.g., a --jobs worker)."""
+        for signature, order in orders.items():
+            self.put(signature, order)
+
+    def pop_updates(self) -> Dict[str, List]:
+        updates, self.updates = self.updates, {}
+        return updates
+
+    def load(self, cache_path: str):
+        if not os.path.exists(cache_path):
+            return
+        try:
+            with open(cache_path, "r") as f:
+                self.orders.update(json.load(f))
+        except (OSError, ValueError) as e:
+            GRAPH_LOG.warning(f"Failed to load optimization cache {cache_path}: {e}")
+
+    def save(self, cache_path: str):
+        try:
+            with open(cache_path, "w") as f:
+                json.dump(self.orders, f, indent=1, sort_keys=True)
+        except OSError as e:
+            GRAPH_LOG.warning(f"Failed to save optimization cache {cache_path}: {e}")
+
+
+_optimization_cache = OptimizationCache()
+
+
+def get_optimization_cache() -> OptimizationCache:
+    """Return the process-wide optimization cache."""
+    return _optimization_cache
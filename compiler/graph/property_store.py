@@ -0,0 +1,152 @@
+"""
+Persistent store of element properties.
+
+Element properties (the output of compile_element_property, or the hand-written
+property files used with --pseudo_property) are kept in an SQLite database under
+the generated dir, so that recompiling an application does not rerun element
+analysis for elements that did not change.
+
+Each row is keyed by (property source, element names, source files, server) and
+records the content hash of those files. A row whose hash
+does not match the current files is stale and is overwritten on the next put.
+For auto-generated properties, the hash also covers the element frontend,
+property analyzer and IR optimizations, so changing the analysis invalidates
+every row.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import pathlib
+import sqlite3
+from typing import Any, Dict, List, Optional
+
+from compiler import cache_base_dir
+from compiler.element.frontend.cache import grammar_version
+from compiler.graph.logger import GRAPH_LOG
+
+# Files whose content determines the output of compile_element_property, on top
+# of the frontend grammar: the driver, the visitor and the whole property analysis
+# and IR optimization packages.
+_ELEMENT_DIR = pathlib.Path(__file__).parent.parent / "element"
+_ANALYZER_FILES = [
+    _ELEMENT_DIR / "__init__.py",
+    _ELEMENT_DIR / "visitor.py",
+    *sorted((_ELEMENT_DIR / "props").glob("*.py")),
+    *sorted((_ELEMENT_DIR / "optimize").glob("*.py")),
+]
+
+
+def analyzer_version() -> str:
+    h = hashlib.sha256(grammar_version().encode())
+    for path in _ANALYZER_FILES:
+        with open(path, "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+class PropertyStore:
+    def __init__(self, db_path: str):
+        """
+        Args:
+            db_path (str): Path of the SQLite database file. It is created on
+                first use.
+        """
+        self.db_path = db_path
+        self.analyzer_version = analyzer_version()
+        self._conn = None
+        self._pid = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        # SQLite connections must not be shared with forked worker processes.
+        if self._conn is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, timeout=30)
+            self._pid = os.getpid()
+            with self._conn:
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS properties ("
+                    "source TEXT, names TEXT, paths TEXT, server TEXT, "
+                    "content_hash TEXT, property TEXT, "
+                    "PRIMARY KEY (source, names, paths, server))"
+                )
+        return self._conn
+
+    def content_hash(self, pseudo_property: bool, paths: List[str]) -> str:
+        """Hash the files the properties are derived from (.adn specs or property files)."""
+        h = hashlib.sha256(
+            b"pseudo" if pseudo_property else self.analyzer_version.encode()
+        )
+        for path in paths:
+            with open(path, "rb") as f:
+                h.update(hashlib.sha256(f.read()).digest())
+        return h.hexdigest()
+
+    def get(
+        self,
+        pseudo_property: bool,
+        names: List[str],
+        paths: List[str],
+        server: str,
+        content_hash: str,
+    ) -> Optional[Dict[str, Any]]:
+        try:
+            row = self.conn.execute(
+                "SELECT content_hash, property FROM properties "
+                "WHERE source = ? AND names = ? AND paths = ? AND server = ?",
+                (
+                    _source(pseudo_property),
+                    json.dumps(names),
+                    json.dumps(paths),
+                    server,
+                ),
+            ).fetchone()
+        except sqlite3.Error as e:
+            GRAPH_LOG.warning(f"Failed to read property store {self.db_path}: {e}")
+            return None
+        if row is None or row[0] != content_hash:
+            return None
+        return json.loads(row[1])
+
+    def put(
+        self,
+        pseudo_property: bool,
+        names: List[str],
+        paths: List[str],
+        server: str,
+        content_hash: str,
+        prop: Dict[str, Any],
+    ):
+        try:
+            with self.conn:
+                # Replaces the stale row of the same elements, if any.
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO properties VALUES (?, ?, ?, ?, ?, ?)",
+                    (
+                        _source(pseudo_property),
+                        json.dumps(names),
+                        json.dumps(paths),
+                        server,
+                        content_hash,
+                        json.dumps(prop),
+                    ),
+                )
+        except sqlite3.Error as e:
+            GRAPH_LOG.warning(f"Failed to write property store {self.db_path}: {e}")
+
+
+def _source(pseudo_property: bool) -> str:
+    return "pseudo" if pseudo_property else "auto"
+
+
+_property_store = None
+
+
+def get_property_store() -> PropertyStore:
+    """Return the process-wide property store under the persistent cache dir."""
+    global _property_store
+    if _property_store is None:
+        _property_store = PropertyStore(os.path.join(cache_base_dir, "properties.db"))
+    return _property_store
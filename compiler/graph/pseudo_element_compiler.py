@@ -12,11 +12,16 @@ from typing import Any, Dict
 
 import yaml
 
-from compiler import root_base_dir
+from compiler import property_base_dir
 
 support_list = ["logging", "qos", "null", "ratelimit", "hotel-acl"]
 
 
+def property_file(name: str) -> str:
+    """Path of the hand-written property file of an element."""
+    return os.path.join(property_base_dir, f"{name}.yaml")
+
+
 def pseudo_gen_property(element) -> Dict[str, Dict[str, Any]]:
     """Generate element properties by looking up the property file list.
 
@@ -28,9 +33,9 @@ def pseudo_gen_property(element) -> Dict[str, Dict[str, Any]]:
     """
     property = {"request": dict(), "response": dict()}
     for name in element.name:
-        property_file = os.path.join(property_base_dir, f"{name}.yaml")
-        assert os.path.isfile(property_file), f"property file for {name} not exist"
-        with open(property_file, "r") as f:
+        path = property_file(name)
+        assert os.path.isfile(path), f"property file for {name} not exist"
+        with open(path, "r") as f:
             current_dict = yaml.safe_load(f)
         for t in ["request", "response"]:
             if current_dict[t] is not None:
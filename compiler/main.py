@@ -1,8 +1,10 @@
 import argparse
 import os
 import sys
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 
 import yaml
 from rich.columns import Columns
@@ -18,6 +20,9 @@ from compiler.element import gen_code
 from compiler.graph.backend import scriptgen
 from compiler.graph.frontend import GraphParser
 from compiler.graph.ir import GraphIR
+from compiler.graph.ir.cost_model import CostModel, load_cost_model
+from compiler.graph.ir.optimization import OBJECTIVES
+from compiler.graph.ir.optimization_cache import get_optimization_cache
 from compiler.graph.logger import GRAPH_LOG, init_logging
 from compiler.graph.pseudo_element_compiler import pseudo_compile
 
@@ -94,6 +99,40 @@ def parse_args():
         default="1",
     )
     parser.add_argument("--opt_algorithm", type=str, default="cost")
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        help="Number of worker processes for element property analysis and optimization (one edge per task)",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "--cost_model",
+        help="Path to a cost model file (YAML/JSON) with measured parameters for the cost-driven optimizer",
+        type=str,
+        default=None,
+    )
+    parser.add_argument(
+        "--opt_cache",
+        help="If added, optimization results are saved next to gir_summary and reused by later runs",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--objective",
+        help="Metric the pareto optimizer minimizes: cost, latency, cpu, state_ops or sidecars. "
+        "Use client->server=metric to set it for one edge (repeatable)",
+        type=str,
+        action="append",
+        default=[],
+    )
+    parser.add_argument(
+        "--opt_timeout_ms",
+        help="Wall-clock budget of the cost/pareto optimizer per edge. The best chain found "
+        "within the budget is used, starting from the heuristic one. The pareto optimizer "
+        "defaults to 10000",
+        type=float,
+        default=None,
+    )
     parser.add_argument("--debug", help="Print debug info", action="store_true")
 
     return parser.parse_args()
@@ -133,7 +172,11 @@ def compile_impl(
 def generate_element_impl(graphirs: Dict[str, GraphIR], pseudo_impl: bool):
     compiled_name = set()
     gen_dir = os.path.join(graph_base_dir, "generated")
-    os.system(f"rm {gen_dir} -rf")
+    # Clean up previous outputs, but keep the persistent compilation cache.
+    os.makedirs(gen_dir, exist_ok=True)
+    os.system(
+        f"find {gen_dir} -mindepth 1 -maxdepth 1 ! -path {cache_base_dir} -exec rm -rf {{}} +"
+    )
     for gir in graphirs.values():  # For each edge in the application
         elist = [(e, "client") for e in gir.elements["req_client"]] + [
             (e, "server") for e in gir.elements["req_server"]
@@ -158,6 +201,115 @@ def generate_element_impl(graphirs: Dict[str, GraphIR], pseudo_impl: bool):
                 compiled_name.add(identifier)
 
 
+def optimize_graphir(
+    gir: GraphIR,
+    pseudo_property: bool,
+    opt_level: str,
+    opt_algorithm: str,
+    cost_model: Optional[CostModel],
+    objective: str,
+    timeout_ms: Optional[float],
+) -> GraphIR:
+    # Each gir represests an edge in the application (a pair of communicating services)
+    # pseudo_property is set to True when we want to use hand-coded properties instead of auto-generated ones
+    for elements in gir.elements.values():
+        for element in elements:
+            element.set_property_source(pseudo_property)
+    if opt_level != "no":
+        gir.optimize(opt_level, opt_algorithm, cost_model, objective, timeout_ms)
+    return gir
+
+
+def optimize_graphir_task(
+    gir: GraphIR,
+    pseudo_property: bool,
+    opt_level: str,
+    opt_algorithm: str,
+    cost_model: Optional[CostModel],
+    objective: str,
+    timeout_ms: Optional[float],
+) -> Tuple[GraphIR, Dict[str, List]]:
+    # Runs in a worker process: also return the new optimization cache entries.
+    gir = optimize_graphir(
+        gir,
+        pseudo_property,
+        opt_level,
+        opt_algorithm,
+        cost_model,
+        objective,
+        timeout_ms,
+    )
+    return gir, get_optimization_cache().pop_updates()
+
+
+def optimize_graphirs(
+    graphirs: Dict[str, GraphIR],
+    pseudo_property: bool,
+    opt_level: str,
+    opt_algorithm: str,
+    cost_model: Optional[CostModel],
+    objectives: Dict[str, str],
+    timeout_ms: Optional[float],
+    jobs: int,
+) -> Dict[str, GraphIR]:
+    """Analyze element properties and optimize every edge, on a process pool if jobs > 1.
+
+    objectives maps every edge name to the objective of the "pareto" algorithm.
+    timeout_ms is the optimization budget of each edge.
+
+    Edges are independent, so the result is the same as optimizing them one by one.
+    Workers share the optimization cache as of the start of the pool, and their
+    new entries are merged back afterwards.
+    """
+    if jobs <= 1 or len(graphirs) <= 1:
+        for gir in graphirs.values():
+            optimize_graphir(
+                gir,
+                pseudo_property,
+                opt_level,
+                opt_algorithm,
+                cost_model,
+                objectives[gir.name],
+                timeout_ms,
+            )
+        return graphirs
+    with ProcessPoolExecutor(max_workers=min(jobs, len(graphirs))) as executor:
+        results = executor.map(
+            optimize_graphir_task,
+            graphirs.values(),
+            repeat(pseudo_property),
+            repeat(opt_level),
+            repeat(opt_algorithm),
+            repeat(cost_model),
+            [objectives[gir.name] for gir in graphirs.values()],
+            repeat(timeout_ms),
+        )
+        # map() returns the results in the order of the edges.
+        optimized = {}
+        for name, (gir, cache_updates) in zip(graphirs.keys(), results):
+            optimized[name] = gir
+            get_optimization_cache().merge(cache_updates)
+        return optimized
+
+
+def parse_objectives(values: List[str], edges: List[str]) -> Dict[str, str]:
+    """Map every edge to its --objective, i.e., its own one or else the default one."""
+    default, per_edge = "cost", {}
+    for value in values:
+        edge, _, objective = value.rpartition("=")
+        if objective not in OBJECTIVES:
+            raise ValueError(
+                f"Unknown objective {objective}, expected one of {OBJECTIVES}"
+            )
+        if edge == "":
+            default = objective
+        elif edge in edges:
+            per_edge[edge] = objective
+        else:
+            raise ValueError(f"Unknown edge {edge} in --objective {value}")
+    return {edge: per_edge.get(edge, default) for edge in edges}
+
+
 def print_gir_summary(graphirs: Dict[str, GraphIR]):
     GRAPH_LOG.info("Graph IR summary:")
     for gir in graphirs.values():
@@ -184,13 +336,24 @@ def main(args):
 
     # Step 2: Generate element properties via element compiler and optimize the graph IR.
     GRAPH_LOG.info("Generating element properties and optimizing the graph IR...")
-    for gir in graphirs.values():
-        # Each gir represests an edge in the application (a pair of communicating services)
-        # pseudo_property is set to True when we want to use hand-coded properties instead of auto-generated ones
-        for element in gir.elements["req_client"] + gir.elements["req_server"]:
-            element.set_property_source(args.pseudo_property)
-        if args.opt_level != "no":
-            gir.optimize(args.opt_level, args.opt_algorithm)
+    opt_cache_path = os.path.join(graph_base_dir, "generated", "opt_cache.json")
+    if args.opt_cache:
+        get_optimization_cache().load(opt_cache_path)
+    cost_model = (
+        load_cost_model(args.cost_model, args.backend)
+        if args.cost_model is not None
+        else None
+    )
+    graphirs = optimize_graphirs(
+        graphirs,
+        args.pseudo_property,
+        args.opt_level,
+        args.opt_algorithm,
+        cost_model,
+        parse_objectives(args.objective, [gir.name for gir in graphirs.values()]),
+        args.opt_timeout_ms,
+        args.jobs,
+    )
 
     # Step 3: Generate backend code for the elements and deployment scripts.
     if not args.dry_run:
@@ -208,9 +371,14 @@ def main(args):
     graphir_summary = {"graphir": []}
     for gir in graphirs.values():
         graphir_summary["graphir"].append(str(gir))
+        if len(gir.alternatives) > 0:
+            # The Pareto frontier found by the pareto optimizer
+            graphir_summary.setdefault("alternatives", {})[gir.name] = gir.alternatives
     # We should safe them as yaml file, but it messes up the kubectl apply command.
     with open(os.path.join(gen_dir, "gir_summary"), "w") as f:
         f.write(yaml.dump(graphir_summary, default_flow_style=False, indent=4))
+    if args.opt_cache:
+        get_optimization_cache().save(opt_cache_path)
 
     # graphir rich display in terminal
     if args.verbose:
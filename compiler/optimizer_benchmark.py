@@ -0,0 +1,419 @@
+"""
+Benchmark of the chain optimizers on synthetic element chains.
+
+Every instance is a random chain of AbsElements with hand-set properties (as with
+--pseudo_property, so no element is compiled): drop/block/copy flags, read and
+write field sets, state access, position constraints and state consistency. Each
+algorithm of ALGORITHMS reorders the chain jointly with its response path, as
+GraphIR.optimize does, at every optimization level. Consolidation is the same for
+all algorithms and is not timed.
+
+For every run, the benchmark reports the wall time, the number of partial chains
+the search explored, and the cost of the chain versus the best known one, i.e.,
+the cheapest chain found by any algorithm (or by the baseline run) on the same
+instance. The results are saved as JSON; pass an earlier file as --baseline to
+spot regressions across versions.
+
+    python compiler/optimizer_benchmark.py --lengths 5 10 15 20 25 -o bench.json
+"""
+import argparse
+import hashlib
+import json
+import random
+import sys
+import time
+from copy import deepcopy
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from rich.console import Console
+from rich.table import Table
+
+sys.path.append(str(Path(__file__).parent.parent.absolute()))
+sys.path.append(str(Path(__file__).parent.absolute()))
+
+from compiler.graph.ir.cost_model import CostModel
+from compiler.graph.ir.element import AbsElement, freeze_prop, thaw_prop
+from compiler.graph.ir.optimization import (
+    SearchTimeout,
+    anytime_order,
+    chain_metrics,
+    cost,
+    cost_order,
+    heuristic_order,
+    pareto_orders,
+)
+from compiler.graph.ir.optimization_cache import optimizer_version
+from compiler.graph.logger import EVAL_LOG, init_logging
+
+OPT_LEVELS = ["ignore", "weak", "strong"]
+
+# RPC fields the synthetic elements read and write. A small pool makes
+# conflicting accesses (and thus ordering constraints) likely.
+FIELDS = [f"field{i}" for i in range(8)]
+
+
+def synthetic_property(rng: random.Random, name: str) -> Dict[str, Any]:
+    """Random element properties, in the format of compile_element_property."""
+    consistency = rng.choice([None, None, "weak", "strong"])
+    stateful = consistency is not None or rng.random() < 0.3
+    state_dependence = None
+    if stateful and rng.random() < 0.1:
+        state_dependence = rng.choice(["client_replica", "server_replica"])
+    prop = {
+        "state": {
+            "stateful": stateful,
+            "consistency": consistency,
+            "combiner": "LWW",
+            "persistence": False,
+            "state_dependence": state_dependence,
+        }
+    }
+    for path in ["request", "response"]:
+        read = rng.sample(FIELDS, rng.randint(0, 3))
+        write = rng.sample(FIELDS, rng.choice([0, 0, 0, 1, 2]))
+        state_write = [f"{name}.state"] if stateful and rng.random() < 0.5 else []
+        prop[path] = {
+            # Logging-like elements record the fields they read.
+            "record" if rng.random() < 0.1 else "read": read,
+            "write": write,
+            "drop": rng.random() < 0.3,
+            "block": rng.random() < 0.1,
+            "copy": rng.random() < 0.1,
+            "state_read": [f"{name}.state"] if stateful else [],
+            "state_write": state_write,
+            "cost": {
+                "state_ops": rng.randint(0, 3) if stateful else 0,
+                "remote_round_trips": int(consistency == "strong"),
+                "rpc_decodes": int(len(read) + len(write) > 0),
+                "rpc_encodes": int(len(write) > 0),
+                "string_allocs": len(read),
+                "calls": {},
+            },
+        }
+    return prop
+
+
+def synthetic_chain(
+    length: int, seed: int
+) -> Tuple[List[AbsElement], List[AbsElement]]:
+    """A random chain of elements with the network in the middle, and its response path.
+
+    Returns:
+        The request chain and the response-path elements, in the same order.
+    """
+    rng = random.Random(seed)
+    elements = []
+    for i in range(length):
+        name = f"element{i}"
+        element = AbsElement(
+            {
+                "name": name,
+                "path": "",
+                "proto": "bench.proto",
+                "method": "Bench",
+                "position": rng.choice(["C", "C/S", "C/S", "C/S", "S"]),
+            },
+            server="bench",
+        )
+        element.set_property_source(True)
+        element._prop = freeze_prop(synthetic_property(rng, name))
+        elements.append(element)
+    # As in GraphIR, "C" elements go to the client, "S" ones to the server and
+    # the others are balanced between both sides.
+    rank = {"C": 0, "C/S": 1, "S": 2}
+    elements.sort(key=lambda e: rank[e.position])
+    n_client = len([e for e in elements if e.position == "C"])
+    n_server = len([e for e in elements if e.position == "S"])
+    n_client += (length - n_client - n_server + 1) // 2
+    network = AbsElement("NETWORK")
+    chain = elements[:n_client] + [network] + elements[n_client:]
+    response = deepcopy(elements[:n_client]) + [network]
+    response += deepcopy(elements[n_client:])
+    return chain, response
+
+
+def instance_signature(chain: List[AbsElement]) -> str:
+    """Hash of the positions and properties of a chain, to match runs across versions."""
+    content = [
+        [element.position, thaw_prop(element.prop) if element.position != "N" else {}]
+        for element in chain
+    ]
+    return hashlib.sha256(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
+
+def run_heuristic(
+    chain: List[AbsElement],
+    response: List[AbsElement],
+    opt_level: str,
+    model: CostModel,
+    timeout_ms: Optional[float],
+) -> Tuple[List[AbsElement], Optional[int], bool]:
+    return heuristic_order(chain, "request", opt_level, response), None, True
+
+
+def run_cost(
+    chain: List[AbsElement],
+    response: List[AbsElement],
+    opt_level: str,
+    model: CostModel,
+    timeout_ms: Optional[float],
+) -> Tuple[List[AbsElement], Optional[int], bool]:
+    if timeout_ms is not None:
+        optimized, stats = anytime_order(
+            chain, "request", opt_level, timeout_ms, model, response
+        )
+    else:
+        stats = {}
+        optimized = cost_order(
+            chain, "request", opt_level, model, response, stats=stats
+        )
+    return optimized, stats["explored"], not stats["timed_out"]
+
+
+def run_pareto(
+    chain: List[AbsElement],
+    response: List[AbsElement],
+    opt_level: str,
+    model: CostModel,
+    timeout_ms: Optional[float],
+) -> Tuple[List[AbsElement], Optional[int], bool]:
+    # As in GraphIR.search, the heuristic chain is kept if the budget runs out.
+    deadline = None
+    if timeout_ms is not None:
+        deadline = time.monotonic() + timeout_ms / 1000
+        incumbent = heuristic_order(list(chain), "request", opt_level, response)
+    stats: Dict[str, Any] = {}
+    try:
+        frontier = pareto_orders(
+            chain, "request", opt_level, model, response, deadline, stats
+        )
+    except SearchTimeout:
+        return incumbent, None, False
+    positions = {id(element): i for i, element in enumerate(chain)}
+
+    def score(ordered: List[AbsElement]) -> float:
+        res = [response[positions[id(element)]] for element in ordered]
+        return chain_metrics(ordered, "request", model, res)["cost"]
+
+    return min(frontier, key=score), stats["explored"], True
+
+
+# Benchmarked algorithms, by --opt_algorithm name. Each one returns the optimized
+# chain (before consolidation), the number of partial chains explored (None if
+# it does not search) and whether it completed within the budget.
+ALGORITHMS: Dict[
+    str,
+    Callable[
+        [List[AbsElement], List[AbsElement], str, CostModel, Optional[float]],
+        Tuple[List[AbsElement], Optional[int], bool],
+    ],
+] = {
+    "heuristic": run_heuristic,
+    "cost": run_cost,
+    "pareto": run_pareto,
+}
+
+
+def run_instance(
+    length: int,
+    seed: int,
+    opt_level: str,
+    algorithms: List[str],
+    model: CostModel,
+    timeout_ms: Optional[float],
+) -> Dict[str, Any]:
+    chain, response = synthetic_chain(length, seed)
+    result = {
+        "length": length,
+        "seed": seed,
+        "opt_level": opt_level,
+        "instance": instance_signature(chain),
+        "original_cost": cost(chain, "request", model, response),
+        "runs": {},
+    }
+    for algorithm in algorithms:
+        # Every algorithm gets its own copy, since the optimizers add the trace
+        # fields to the element properties.
+        c, r = deepcopy((chain, response))
+        start = time.perf_counter()
+        optimized, explored, complete = ALGORITHMS[algorithm](
+            c, r, opt_level, model, timeout_ms
+        )
+        elapsed = time.perf_counter() - start
+        positions = {id(element): i for i, element in enumerate(c)}
+        res = [r[positions[id(element)]] for element in optimized]
+        result["runs"][algorithm] = {
+            "time_ms": elapsed * 1000,
+            "explored": explored,
+            "complete": complete,
+            "cost": cost(optimized, "request", model, res),
+        }
+    return result
+
+
+def apply_baseline(results: List[Dict[str, Any]], baseline: Dict[str, Any]):
+    """Record the runs of the baseline on the same instances, and warn about cost regressions."""
+    previous = {(r["instance"], r["opt_level"]): r["runs"] for r in baseline["results"]}
+    for result in results:
+        runs = previous.get((result["instance"], result["opt_level"]), {})
+        for algorithm, run in result["runs"].items():
+            if algorithm not in runs:
+                continue
+            run["baseline_cost"] = runs[algorithm]["cost"]
+            run["baseline_time_ms"] = runs[algorithm]["time_ms"]
+            if run["cost"] > run["baseline_cost"] + 1e-9:
+                EVAL_LOG.warning(
+                    f"{algorithm}: cost regression on length {result['length']}, "
+                    f"seed {result['seed']}, {result['opt_level']}: "
+                    f"{run['baseline_cost']:.4f} -> {run['cost']:.4f}"
+                )
+
+
+def summarize(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Aggregate the runs per (algorithm, length)."""
+    groups: Dict[Tuple[str, int], List[Dict[str, Any]]] = {}
+    for result in results:
+        for algorithm, run in result["runs"].items():
+            groups.setdefault((algorithm, result["length"]), []).append(run)
+    summary = []
+    for (algorithm, length), runs in sorted(groups.items()):
+        times = sorted(run["time_ms"] for run in runs)
+        summary.append(
+            {
+                "algorithm": algorithm,
+                "length": length,
+                "runs": len(runs),
+                "median_time_ms": times[len(times) // 2],
+                "max_time_ms": times[-1],
+                "mean_gap": sum(run["gap"] for run in runs) / len(runs),
+                "best_known": sum(run["gap"] < 1e-9 for run in runs) / len(runs),
+                "complete": sum(run["complete"] for run in runs) / len(runs),
+            }
+        )
+    return summary
+
+
+def print_summary(summary: List[Dict[str, Any]]):
+    table = Table(title="Optimizer benchmark")
+    for column in [
+        "algorithm",
+        "length",
+        "runs",
+        "p50 ms",
+        "max ms",
+        "gap",
+        "best",
+        "done",
+    ]:
+        table.add_column(column)
+    for row in summary:
+        table.add_row(
+            row["algorithm"],
+            str(row["length"]),
+            str(row["runs"]),
+            f"{row['median_time_ms']:.1f}",
+            f"{row['max_time_ms']:.1f}",
+            f"{row['mean_gap']:.2%}",
+            f"{row['best_known']:.0%}",
+            f"{row['complete']:.0%}",
+        )
+    Console().print(table)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--lengths",
+        help="Numbers of elements of the synthetic chains",
+        type=int,
+        nargs="+",
+        default=[5, 10, 15, 20, 25],
+    )
+    parser.add_argument(
+        "--chains", help="Number of chains per length", type=int, default=10
+    )
+    parser.add_argument("--seed", help="Seed of the first chain", type=int, default=0)
+    parser.add_argument(
+        "--opt_level",
+        help="Optimization levels",
+        type=str,
+        nargs="+",
+        choices=OPT_LEVELS,
+        default=OPT_LEVELS,
+    )
+    parser.add_argument(
+        "--algorithms",
+        help="Algorithms to benchmark",
+        type=str,
+        nargs="+",
+        choices=list(ALGORITHMS),
+        default=list(ALGORITHMS),
+    )
+    parser.add_argument(
+        "--timeout_ms",
+        help="Wall-clock budget of the cost/pareto optimizer per chain, 0 for unbounded searches",
+        type=float,
+        default=10000,
+    )
+    parser.add_argument(
+        "--baseline", help="Results of an earlier run to compare with", type=str
+    )
+    parser.add_argument(
+        "-o", "--output", help="Path of the JSON results", type=str, required=True
+    )
+    parser.add_argument("--debug", help="Print debug info", action="store_true")
+    args = parser.parse_args()
+    init_logging(args.debug)
+
+    model = CostModel()
+    timeout_ms = args.timeout_ms if args.timeout_ms > 0 else None
+    results = []
+    for length in args.lengths:
+        for seed in range(args.seed, args.seed + args.chains):
+            for opt_level in args.opt_level:
+                results.append(
+                    run_instance(
+                        length,
+                        seed,
+                        opt_level,
+                        args.algorithms,
+                        model,
+                        timeout_ms,
+                    )
+                )
+        EVAL_LOG.info(f"Benchmarked {args.chains} chains of length {length}")
+
+    if args.baseline is not None:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)
+        apply_baseline(results, baseline)
+    for result in results:
+        best = min(run["cost"] for run in result["runs"].values())
+        best = min(
+            [best]
+            + [
+                run["baseline_cost"]
+                for run in result["runs"].values()
+                if "baseline_cost" in run
+            ]
+        )
+        result["best_cost"] = best
+        for run in result["runs"].values():
+            run["gap"] = run["cost"] / best - 1 if best > 0 else 0.0
+
+    summary = summarize(results)
+    with open(args.output, "w") as f:
+        json.dump(
+            {
+                "optimizer_version": optimizer_version(),
+                "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "timeout_ms": timeout_ms,
+                "cost_model": model.to_dict(),
+                "summary": summary,
+                "results": results,
+            },
+            f,
+            indent=1,
+        )
+    print_summary(summary)
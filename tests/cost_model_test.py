@@ -0,0 +1,216 @@
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.append(str(Path(__file__).parent.parent.absolute()))
+
+from compiler.graph.frontend import GraphParser
+from compiler.graph.ir.cost_model import (
+    STRONG_SYNC,
+    WEAK_SYNC,
+    CostModel,
+    load_cost_model,
+)
+from compiler.graph.ir.element import AbsElement, freeze_prop
+from compiler.graph.ir.optimization import cost
+
+ROOT_DIR = Path(__file__).parent.parent
+
+COST_MODEL = """
+sidecar: 4.0
+hop: 0.2
+backends:
+  envoy:
+    sidecar: 8.0
+    elements:
+      acl:
+        latency: 3.0
+  mrpc:
+    hop: 0.1
+elements:
+  acl:
+    latency: 2.0
+    drop: 0.3
+edges:
+  frontend->search:
+    network: 2.5
+"""
+
+
+class LoadCostModelTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def write(self, spec: str, name: str = "cost_model.yml") -> str:
+        path = os.path.join(self.dir.name, name)
+        with open(path, "w") as f:
+            f.write(spec)
+        return path
+
+    def test_backend_overrides_global(self):
+        path = self.write(COST_MODEL)
+        envoy = load_cost_model(path, "envoy")
+        self.assertEqual(envoy.sidecar, 8.0)
+        self.assertEqual(envoy.hop, 0.2)
+        self.assertEqual(envoy.elements["acl"], {"latency": 3.0, "drop": 0.3})
+        mrpc = load_cost_model(path, "mrpc")
+        self.assertEqual(mrpc.sidecar, 4.0)
+        self.assertEqual(mrpc.hop, 0.1)
+        self.assertEqual(mrpc.elements["acl"], {"latency": 2.0, "drop": 0.3})
+        self.assertEqual(mrpc.edges["frontend->search"], {"network": 2.5})
+        # Parameters that are not in the file keep their defaults
+        self.assertEqual(mrpc.state_sync, CostModel().state_sync)
+
+    def test_unknown_keys(self):
+        for spec in [
+            "sidcar: 4.0\n",
+            "backends:\n  envoy:\n    sidcar: 4.0\n",
+            "elements:\n  acl:\n    network: 1.0\n",
+            "edges:\n  a->b:\n    latency: 1.0\n",
+        ]:
+            with self.subTest(spec=spec):
+                with self.assertRaises(ValueError):
+                    load_cost_model(self.write(spec), "envoy")
+
+    def test_json_and_empty(self):
+        path = self.write('{"hop": 0.7}', "cost_model.json")
+        self.assertEqual(load_cost_model(path, "envoy").hop, 0.7)
+        model = load_cost_model(self.write(""), "envoy")
+        self.assertEqual(model.to_dict(), CostModel().to_dict())
+
+    def test_example(self):
+        path = str(ROOT_DIR / "examples" / "graph" / "cost_model.yml")
+        for backend in ["envoy", "mrpc"]:
+            model = load_cost_model(path, backend)
+            self.assertEqual(model.to_dict(), CostModel().to_dict())
+
+
+class DropRateTestCase(unittest.TestCase):
+    def element(self, name: str, drop_rate=None) -> AbsElement:
+        info = {"name": name, "path": "", "proto": "test.proto", "method": "Test"}
+        if drop_rate is not None:
+            info["drop_rate"] = drop_rate
+        e = AbsElement(info, server="test")
+        e.set_property_source(True)
+        return e
+
+    def test_property_files(self):
+        model = CostModel()
+        for name, drop_rate in [("acl", 0.4), ("ratelimit", 0.02), ("fault", 0.05)]:
+            with self.subTest(name=name):
+                e = self.element(name)
+                self.assertEqual(model.drop_rate(e, "request"), drop_rate)
+                self.assertEqual(model.drop_rate(e, "response"), 0.0)
+
+    def test_precedence(self):
+        # The graph spec, then the cost model file, then the properties
+        measured = CostModel(elements={"ratelimit": {"drop": 0.1}})
+        self.assertEqual(measured.drop_rate(self.element("ratelimit"), "request"), 0.1)
+        annotated = self.element("ratelimit", drop_rate=0.3)
+        self.assertEqual(measured.drop_rate(annotated, "request"), 0.3)
+
+
+GRAPH_SPEC = """
+app_name: test
+app_manifest: {manifest}
+app_structure:
+- frontend->search
+- search->geo
+replicas:
+  frontend: 3
+  geo: 5
+edge:
+  frontend->search:
+  - method: Nearby
+    name: logging
+    path: {elements}/logging.adn
+    proto: {proto}
+  search->geo:
+  - method: Nearby
+    name: logging
+    path: {elements}/logging.adn
+    proto: {proto}
+"""
+
+
+def stateful_element(name: str, position: str, consistency: str) -> AbsElement:
+    e = AbsElement(
+        {
+            "name": name,
+            "path": "",
+            "proto": "test.proto",
+            "method": "Test",
+            "position": position,
+        },
+        server="test",
+    )
+    prop = {
+        "state": {
+            "stateful": True,
+            "consistency": consistency,
+            "combiner": "LWW",
+            "persistence": False,
+            "state_dependence": None,
+        }
+    }
+    for path in ["request", "response"]:
+        prop[path] = {"read": [], "write": [], "drop": False, "block": False}
+    e._prop = freeze_prop(prop)
+    return e
+
+
+class SyncCostTestCase(unittest.TestCase):
+    def test_scales_with_replicas(self):
+        model = CostModel(state_sync=2.0, weak_sync=0.5).for_edge("a->b", (3, 5))
+        self.assertEqual(model.sync_cost("client", STRONG_SYNC), 6.0)
+        self.assertEqual(model.sync_cost("server", STRONG_SYNC), 10.0)
+        self.assertEqual(model.sync_cost("server", WEAK_SYNC), 2.5)
+        self.assertEqual(model.sync_cost("client", STRONG_SYNC | WEAK_SYNC), 7.5)
+        self.assertEqual(model.sync_cost("server", 0), 0.0)
+
+    def test_chain_cost_of_side(self):
+        # The state of the element is synchronized by every replica of its side.
+        for replicas in [(1, 1), (2, 6), (6, 2)]:
+            model = CostModel().for_edge("a->b", replicas)
+            costs = {}
+            for side, position in [("client", "C"), ("server", "S")]:
+                chain = [stateful_element("cache", position, "strong")]
+                if side == "client":
+                    chain.append(AbsElement("NETWORK"))
+                else:
+                    chain.insert(0, AbsElement("NETWORK"))
+                costs[side] = cost(chain, "request", model)
+            with self.subTest(replicas=replicas):
+                self.assertAlmostEqual(
+                    costs["server"] - costs["client"],
+                    model.state_sync * (replicas[1] - replicas[0]),
+                )
+
+    def test_replicas_from_graph_spec(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            manifest = os.path.join(tmp, "manifest.yaml")
+            open(manifest, "w").close()
+            spec_path = os.path.join(tmp, "spec.yml")
+            with open(spec_path, "w") as f:
+                f.write(
+                    GRAPH_SPEC.format(
+                        manifest=manifest,
+                        elements=ROOT_DIR / "examples" / "elements" / "ping_elements",
+                        proto=ROOT_DIR / "examples" / "proto" / "ping.proto",
+                    )
+                )
+            # Services that are not in the spec get --replica
+            with mock.patch.dict(os.environ, {"SERVICE_REPLICA": "4"}):
+                graphirs, *_ = GraphParser().parse(spec_path)
+        self.assertEqual(graphirs["frontend->search"].replicas, (3, 4))
+        self.assertEqual(graphirs["search->geo"].replicas, (4, 5))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent.absolute()))
+
+from compiler.element.frontend import get_element_compiler
+from compiler.element.props.analyzer import StateAccessAnalyzer
+from compiler.element.props.drop_rate import DropRateEstimator, constant_states
+
+ELEMENT_DIR = Path(__file__).parent.parent / "examples" / "elements" / "ping_elements"
+
+# Reads and writes the same state in several statements and branches
+CACHE_TWICE = """
+internal
+{
+    @consistency(strong) @combiner(sum) @persistence(true)
+    cache: Map<string, string>
+}
+
+fn init() {
+}
+
+fn req(rpc_req) {
+    res := cache.get(rpc_req.get('user'));
+    match (res) {
+        Some(name) => {
+            cache.set(rpc_req.get('user'), name);
+            send(rpc_req, NET);
+        }
+        None => {
+            other := cache.get('default');
+            cache.set(rpc_req.get('user'), other);
+            send(rpc_req, NET);
+        }
+    };
+}
+
+fn resp(rpc_resp) {
+    send(rpc_resp, APP);
+}
+"""
+
+
+class StateAccessTestCase(unittest.TestCase):
+    def test_state_listed_once(self):
+        ir = get_element_compiler().parse_and_transform(CACHE_TWICE)
+        states = [state[0].name for state in ir.definition.internal]
+        for proc, accessed in [(ir.req, ["cache"]), (ir.resp, [])]:
+            sa = StateAccessAnalyzer(states)
+            proc.accept(sa, None)
+            self.assertEqual(sa.read, accessed)
+            self.assertEqual(sa.write, accessed)
+
+
+class DropRateTestCase(unittest.TestCase):
+    def forward(self, name: str):
+        with open(ELEMENT_DIR / f"{name}.adn") as f:
+            ir = get_element_compiler().parse_and_transform(f.read())
+        constants = constant_states(ir)
+        return [
+            proc.accept(DropRateEstimator(constants), None)
+            for proc in [ir.req, ir.resp]
+        ]
+
+    def test_random_guard(self):
+        # fault forwards the request if randomf(0,1) < 0.95
+        for name, drop_rate in [
+            ("fault", 0.05),
+            ("faulthigh", 0.08),
+            ("faultlow", 0.02),
+        ]:
+            with self.subTest(name=name):
+                req, resp = self.forward(name)
+                self.assertAlmostEqual(1.0 - req, drop_rate)
+                self.assertEqual(resp, 1.0)
+
+    def test_unknown_guard(self):
+        # The token bucket condition of ratelimit has no known probability.
+        req, resp = self.forward("ratelimit")
+        self.assertIsNone(req)
+        self.assertEqual(resp, 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import glob
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent.absolute()))
+
+from compiler.element.frontend import ElementCompiler
+from compiler.element.frontend.printer import Printer
+
+ELEMENT_DIR = Path(__file__).parent.parent / "examples" / "elements"
+
+
+def printed(ir) -> str:
+    return ir.accept(Printer(), None)
+
+
+class BatchParseTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.specs = sorted(
+            glob.glob(str(ELEMENT_DIR / "reservation_elements" / "*.adn"))
+        )
+        assert len(self.specs) > 0, "no example element specs"
+        for path in self.specs:
+            shutil.copy(path, self.dir.name)
+        self.bad = os.path.join(self.dir.name, "bad.adn")
+        with open(self.bad, "w") as f:
+            f.write("internal { fn req(rpc_req) {")
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_error_reported_against_its_spec(self):
+        compiler = ElementCompiler(cache_dir=None)
+        irs, errors = compiler.parse_and_transform_batch(self.dir.name, max_workers=2)
+        self.assertEqual(list(errors), [self.bad])
+        self.assertNotIn(self.bad, irs)
+        self.assertEqual(len(irs), len(self.specs))
+
+    def test_pattern_without_specs(self):
+        compiler = ElementCompiler(cache_dir=None)
+        pattern = os.path.join(self.dir.name, "*.proto")
+        irs, errors = compiler.parse_and_transform_batch(
+            [pattern, self.bad], max_workers=2
+        )
+        self.assertEqual(irs, {})
+        self.assertEqual(sorted(errors), sorted([pattern, self.bad]))
+
+    def test_pool_matches_serial(self):
+        serial = ElementCompiler(cache_dir=None)
+        paths = [os.path.join(self.dir.name, os.path.basename(p)) for p in self.specs]
+        expected = {}
+        for path in paths:
+            with open(path) as f:
+                expected[path] = printed(serial.parse_and_transform(f.read()))
+        # Without a cache every spec goes to the pool, and with a warm one none do.
+        with tempfile.TemporaryDirectory() as cache_dir:
+            for compiler in [
+                ElementCompiler(cache_dir=None),
+                ElementCompiler(cache_dir),
+                ElementCompiler(cache_dir),
+            ]:
+                irs, errors = compiler.parse_and_transform_batch(paths, max_workers=2)
+                self.assertEqual(errors, {})
+                self.assertEqual(
+                    {path: printed(ir) for path, ir in irs.items()}, expected
+                )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import pickle
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.append(str(Path(__file__).parent.parent.absolute()))
+
+from compiler.element.frontend import cache
+from compiler.element.frontend.cache import IRCache
+
+
+class IRCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.cache_dir = self.dir.name
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def entry(self, ir_cache: IRCache, spec: str) -> str:
+        return ir_cache._path(ir_cache.key(spec))
+
+    def test_round_trip(self):
+        ir_cache = IRCache(self.cache_dir)
+        self.assertIsNone(ir_cache.get("spec"))
+        ir_cache.put("spec", {"ir": [1, 2]})
+        self.assertEqual(ir_cache.get("spec"), {"ir": [1, 2]})
+
+    def test_evicts_least_recently_used(self):
+        ir_cache = IRCache(self.cache_dir)
+        # Entries of the same size, two of which fit in the cache
+        ir_cache.put("a", "x" * 100)
+        size = os.path.getsize(self.entry(ir_cache, "a"))
+        ir_cache.max_bytes = 2 * size
+        ir_cache.put("b", "y" * 100)
+        os.utime(self.entry(ir_cache, "a"), (1000, 1000))
+        os.utime(self.entry(ir_cache, "b"), (2000, 2000))
+        # Reading "a" makes "b" the least recently used entry.
+        self.assertEqual(ir_cache.get("a"), "x" * 100)
+        ir_cache.put("c", "z" * 100)
+        self.assertIsNone(ir_cache.get("b"))
+        self.assertEqual(ir_cache.get("a"), "x" * 100)
+        self.assertEqual(ir_cache.get("c"), "z" * 100)
+        self.assertLessEqual(
+            sum(f.stat().st_size for f in Path(self.cache_dir).iterdir()),
+            ir_cache.max_bytes,
+        )
+
+    def test_corrupted_entry_is_a_miss(self):
+        ir_cache = IRCache(self.cache_dir)
+        for spec, content in [
+            ("truncated", pickle.dumps(list(range(100)))[:20]),
+            ("garbage", b"not a pickle"),
+            ("empty", b""),
+        ]:
+            with self.subTest(spec=spec):
+                ir_cache.put(spec, "ir")
+                with open(self.entry(ir_cache, spec), "wb") as f:
+                    f.write(content)
+                self.assertIsNone(ir_cache.get(spec))
+                # The entry is dropped, so that it is parsed and written again.
+                self.assertFalse(os.path.exists(self.entry(ir_cache, spec)))
+                ir_cache.put(spec, "ir")
+                self.assertEqual(ir_cache.get(spec), "ir")
+
+    def test_grammar_change_invalidates_entries(self):
+        grammar = Path(self.cache_dir) / "element.lark"
+        grammar.write_text("start: rule")
+        with mock.patch.object(cache, "_VERSIONED_FILES", [grammar]):
+            ir_cache = IRCache(os.path.join(self.cache_dir, "ir"))
+            ir_cache.put("spec", "old ir")
+            self.assertEqual(IRCache(ir_cache.cache_dir).get("spec"), "old ir")
+            grammar.write_text("start: other_rule")
+            self.assertIsNone(IRCache(ir_cache.cache_dir).get("spec"))
+
+    def test_versioned_files_exist(self):
+        # A missing file would make every compiler run fail to build the cache.
+        for path in cache._VERSIONED_FILES:
+            self.assertTrue(path.exists(), path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,168 @@
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import unittest
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent.absolute()))
+
+from compiler.graph.ir.cost_model import CostModel
+from compiler.graph.ir.element import AbsElement, freeze_prop
+from compiler.graph.ir.optimization_cache import (
+    OptimizationCache,
+    get_optimization_cache,
+)
+
+
+def element(name: str, drop: bool = False, read=(), drop_rate=None):
+    """An element with hand-set properties."""
+    info = {
+        "name": name,
+        "path": "",
+        "proto": "test.proto",
+        "method": "Test",
+        "position": "C/S",
+    }
+    if drop_rate is not None:
+        info["drop_rate"] = drop_rate
+    e = AbsElement(info, server="test")
+    e.set_property_source(True)
+    prop = {"state": {"stateful": False}}
+    for path in ["request", "response"]:
+        prop[path] = {"read": list(read), "write": [], "drop": drop}
+    e._prop = freeze_prop(prop)
+    return e
+
+
+def chain():
+    return [element("acl", drop=True), element("logging", read=["a", "b"])]
+
+
+def signature(cache, chain, params=None, response=None):
+    return cache.signature(chain, "request", "weak", "cost", params, response)
+
+
+class SignatureTestCase(unittest.TestCase):
+    def setUp(self):
+        self.cache = OptimizationCache()
+
+    def test_same_chain(self):
+        self.assertEqual(signature(self.cache, chain()), signature(self.cache, chain()))
+        # Property lists are sets
+        reordered = chain()
+        reordered[1] = element("logging", read=["b", "a"])
+        self.assertEqual(
+            signature(self.cache, chain()), signature(self.cache, reordered)
+        )
+
+    def test_props_change_signature(self):
+        changed = chain()
+        changed[1] = element("logging", read=["a", "c"])
+        self.assertNotEqual(
+            signature(self.cache, chain()), signature(self.cache, changed)
+        )
+        changed = chain()
+        changed[0] = element("acl", drop=False)
+        self.assertNotEqual(
+            signature(self.cache, chain()), signature(self.cache, changed)
+        )
+
+    def test_drop_rates_change_signature(self):
+        annotated = chain()
+        annotated[0] = element("acl", drop=True, drop_rate=0.4)
+        other = chain()
+        other[0] = element("acl", drop=True, drop_rate={"response": 0.4})
+        signatures = {
+            signature(self.cache, chain()),
+            signature(self.cache, annotated),
+            signature(self.cache, other),
+        }
+        self.assertEqual(len(signatures), 3)
+
+    def test_cost_model_changes_signature(self):
+        default = CostModel().to_dict()
+        self.assertEqual(
+            signature(self.cache, chain(), default),
+            signature(self.cache, chain(), CostModel().to_dict()),
+        )
+        for params in [
+            CostModel(hop=2.0).to_dict(),
+            CostModel(elements={"acl": {"drop": 0.5}}).to_dict(),
+            CostModel().for_edge("a->b", (3, 1)).to_dict(),
+        ]:
+            self.assertNotEqual(
+                signature(self.cache, chain(), default),
+                signature(self.cache, chain(), params),
+            )
+
+    def test_response_chain_changes_signature(self):
+        response = chain()
+        changed = chain()
+        changed[1] = element("logging", drop=True, read=["a", "b"])
+        signatures = {
+            signature(self.cache, chain()),
+            signature(self.cache, chain(), response=response),
+            signature(self.cache, chain(), response=changed),
+        }
+        self.assertEqual(len(signatures), 3)
+
+
+def worker_task(signature: str, order):
+    # Runs in a worker process, on its copy of the process-wide cache.
+    cache = get_optimization_cache()
+    cache.put(signature, order)
+    return cache.pop_updates()
+
+
+class MergeTestCase(unittest.TestCase):
+    def test_pop_updates(self):
+        cache = OptimizationCache()
+        cache.orders["loaded"] = [0]
+        cache.put("a", [1, 0])
+        self.assertEqual(cache.pop_updates(), {"a": [1, 0]})
+        self.assertEqual(cache.pop_updates(), {})
+        # Popping the updates keeps the entries
+        self.assertEqual(cache.get("a", 2), [1, 0])
+        self.assertEqual(cache.get("loaded", 1), [0])
+
+    def test_merge_worker_entries(self):
+        cache = get_optimization_cache()
+        orders, updates = dict(cache.orders), dict(cache.updates)
+        self.addCleanup(setattr, cache, "orders", orders)
+        self.addCleanup(setattr, cache, "updates", updates)
+        # Entries loaded from the cache file before the pool starts
+        cache.orders["parent"] = [0]
+        ctx = multiprocessing.get_context("fork")
+        signatures = ["worker1", "worker2", "worker3"]
+        # Fewer workers than tasks, so a worker pops the updates of several tasks
+        with ProcessPoolExecutor(max_workers=2, mp_context=ctx) as executor:
+            results = executor.map(
+                worker_task, signatures, [[1, 0], [0, 2, 1], [2, 1, 0]]
+            )
+            for signature, worker_updates in zip(signatures, results):
+                # Only the entry of the task, not the inherited or earlier ones
+                self.assertEqual(list(worker_updates), [signature])
+                cache.merge(worker_updates)
+        self.assertEqual(cache.get("parent", 1), [0])
+        self.assertEqual(cache.get("worker1", 2), [1, 0])
+        self.assertEqual(cache.get("worker2", 3), [0, 2, 1])
+        self.assertEqual(cache.get("worker3", 3), [2, 1, 0])
+
+        # The merged entries are saved with the others
+        with tempfile.TemporaryDirectory() as tmp:
+            cache_path = os.path.join(tmp, "cache.json")
+            cache.save(cache_path)
+            with open(cache_path) as f:
+                saved = json.load(f)
+            loaded = OptimizationCache()
+            loaded.load(cache_path)
+        for name in ["parent"] + signatures:
+            self.assertIn(name, saved)
+            self.assertEqual(loaded.orders[name], cache.orders[name])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,185 @@
+import multiprocessing
+import sys
+import unittest
+from itertools import permutations
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent.absolute()))
+
+from compiler.graph.ir.cost_model import CostModel
+from compiler.graph.ir.element import AbsElement, freeze_prop
+from compiler.graph.ir.optimization import (
+    cost,
+    cost_order,
+    equivalent,
+    fusion_groups,
+    init_dependency,
+    reorder,
+    same_dependency,
+)
+from compiler.optimizer_benchmark import OPT_LEVELS, synthetic_chain
+
+# Seconds a single optimization may take before it is considered hung
+TIMEOUT = 10
+
+
+def element(
+    name: str,
+    drop: bool = False,
+    block: bool = False,
+    copy: bool = False,
+    rtt: float = 0.0,
+):
+    """An element that touches no field, with hand-set properties.
+
+    rtt is the number of round trips to the remote storage per RPC, on both paths.
+    """
+    e = AbsElement(
+        {
+            "name": name,
+            "path": "",
+            "proto": "test.proto",
+            "method": "Test",
+            "position": "C/S",
+        },
+        server="test",
+    )
+    e.set_property_source(True)
+    prop = {
+        "state": {
+            "stateful": False,
+            "consistency": None,
+            "combiner": "LWW",
+            "persistence": False,
+            "state_dependence": None,
+        }
+    }
+    for path in ["request", "response"]:
+        prop[path] = {
+            "read": [],
+            "write": [],
+            "drop": drop,
+            "block": block,
+            "copy": copy,
+            "state_read": [],
+            "state_write": [],
+            "cost": {"remote_round_trips": rtt},
+        }
+    e._prop = freeze_prop(prop)
+    return e
+
+
+def run_with_timeout(target, *args):
+    """Run target(*args) in a forked process and return its result, or None if it hangs."""
+    ctx = multiprocessing.get_context("fork")
+    queue = ctx.Queue()
+    process = ctx.Process(target=lambda: queue.put(target(*args)))
+    process.start()
+    process.join(TIMEOUT)
+    if process.is_alive():
+        process.terminate()
+        process.join()
+        return None
+    return queue.get(timeout=1)
+
+
+def reorder_names(chain, path, opt_level, response=None):
+    return [e.name for e in reorder(chain, path, opt_level, response)]
+
+
+class ReorderTestCase(unittest.TestCase):
+    def test_drop_copy_element_terminates(self):
+        # The drop strategy moves the element to the front and the copy strategy
+        # moves it back behind the plain element.
+        chain = [element("plain"), element("dropcopy", drop=True, copy=True)]
+        for opt_level in OPT_LEVELS:
+            names = run_with_timeout(reorder_names, chain, "request", opt_level)
+            self.assertEqual(names, [["dropcopy"], ["plain"]])
+
+    def test_synthetic_chains_terminate(self):
+        for length in [5, 10]:
+            for seed in range(20):
+                chain, response = synthetic_chain(length, seed)
+                for opt_level in OPT_LEVELS:
+                    with self.subTest(length=length, seed=seed, opt_level=opt_level):
+                        names = run_with_timeout(
+                            reorder_names, chain, "request", opt_level, response
+                        )
+                        self.assertIsNotNone(names)
+                        self.assertCountEqual(names, [e.name for e in chain])
+
+
+def brute_force_cost(chain, opt_level, model, response=None):
+    """Cost of the cheapest equivalent permutation of a chain."""
+    init_dependency(chain, "request")
+    if response is not None:
+        init_dependency(response, "response")
+    min_cost = cost(chain, "request", model, response)
+    for order in permutations(range(len(chain))):
+        new_chain = [chain[i] for i in order]
+        if not equivalent(chain, new_chain, "request", opt_level):
+            continue
+        if response is None:
+            min_cost = min(min_cost, cost(new_chain, "request", model))
+            continue
+        # Responses go back through the chain in reverse.
+        new_response = [response[i] for i in order]
+        if same_dependency(response[::-1], new_response[::-1], "response", opt_level):
+            min_cost = min(min_cost, cost(new_chain, "request", model, new_response))
+    return min_cost
+
+
+class CostOrderTestCase(unittest.TestCase):
+    def test_optimal_on_small_chains(self):
+        model = CostModel()
+        for length in [3, 5, 6]:
+            for seed in range(5):
+                for opt_level in OPT_LEVELS:
+                    for with_response in [False, True]:
+                        with self.subTest(
+                            length=length,
+                            seed=seed,
+                            opt_level=opt_level,
+                            with_response=with_response,
+                        ):
+                            chain, response = synthetic_chain(length, seed)
+                            if not with_response:
+                                response = None
+                            expected = brute_force_cost(
+                                chain, opt_level, model, response
+                            )
+                            optimized = cost_order(
+                                chain, "request", opt_level, model, response
+                            )
+                            if response is not None:
+                                order = [chain.index(e) for e in optimized]
+                                response = [response[i] for i in order]
+                            self.assertAlmostEqual(
+                                cost(optimized, "request", model, response), expected
+                            )
+
+
+class FusionGroupsTestCase(unittest.TestCase):
+    def test_stateless_member_ahead_of_strong_state(self):
+        # Fused, "before" waits on the fetch of "strong": hop 0.5 + wait 2 * 1.
+        # Split after "before": 2 hops of 0.5, and "after" does not wait.
+        chain = [element("before"), element("strong", rtt=1), element("after")]
+        chain.append(AbsElement("NETWORK"))
+        model = CostModel(hop=0.5, state_rtt=2.0)
+        self.assertEqual(fusion_groups(chain, "request", model), [(0, 1), (1, 3)])
+
+    def test_response_waits_on_state(self):
+        # On the request path "after" follows "strong" and the side is fused, but
+        # its responses reach "after" first: fused, they wait 2 * 1 on top of the
+        # 2 hops of 0.5, where splitting costs 2 more hops.
+        chain = [element("strong", rtt=1), element("after"), AbsElement("NETWORK")]
+        response = [element("strong", rtt=1), element("after"), chain[-1]]
+        model = CostModel(hop=0.5, state_rtt=2.0)
+        self.assertEqual(fusion_groups(chain, "request", model), [(0, 2)])
+        self.assertEqual(
+            fusion_groups(chain, "request", model, response), [(0, 1), (1, 2)]
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+sys.path.append(str(Path(__file__).parent.parent.absolute()))
+
+from compiler.graph import property_store
+from compiler.graph.property_store import PropertyStore
+
+ELEMENT_DIR = Path(__file__).parent.parent / "examples" / "elements" / "ping_elements"
+
+
+class PropertyStoreTestCase(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.dir.name, "properties.db")
+        self.spec = os.path.join(self.dir.name, "fault.adn")
+        shutil.copy(ELEMENT_DIR / "fault.adn", self.spec)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def put(self, store: PropertyStore, prop: dict) -> str:
+        content_hash = store.content_hash(False, [self.spec])
+        store.put(False, ["fault"], [self.spec], "", content_hash, prop)
+        return content_hash
+
+    def get(self, store: PropertyStore):
+        content_hash = store.content_hash(False, [self.spec])
+        return store.get(False, ["fault"], [self.spec], "", content_hash)
+
+    def test_round_trip(self):
+        store = PropertyStore(self.db_path)
+        self.assertIsNone(self.get(store))
+        self.put(store, {"stateful": False})
+        self.assertEqual(self.get(store), {"stateful": False})
+        # The rows persist across processes
+        self.assertEqual(self.get(PropertyStore(self.db_path)), {"stateful": False})
+
+    def test_spec_edit_invalidates_row(self):
+        store = PropertyStore(self.db_path)
+        self.put(store, {"stateful": False})
+        with open(self.spec, "a") as f:
+            f.write("\n// edited\n")
+        self.assertIsNone(self.get(store))
+        # The stale row is overwritten by the next put
+        self.put(store, {"stateful": True})
+        self.assertEqual(self.get(store), {"stateful": True})
+
+    def test_analyzer_edit_invalidates_row(self):
+        analyzer = os.path.join(self.dir.name, "analyzer.py")
+        with open(analyzer, "w") as f:
+            f.write("# v1\n")
+        with mock.patch.object(property_store, "_ANALYZER_FILES", [analyzer]):
+            self.put(PropertyStore(self.db_path), {"stateful": False})
+            self.assertEqual(self.get(PropertyStore(self.db_path)), {"stateful": False})
+            with open(analyzer, "w") as f:
+                f.write("# v2\n")
+            self.assertIsNone(self.get(PropertyStore(self.db_path)))
+
+    def test_analyzer_files_cover_pipeline(self):
+        element_dir = Path(property_store.__file__).parent.parent / "element"
+        files = set(property_store._ANALYZER_FILES)
+        for path in [
+            element_dir / "visitor.py",
+            element_dir / "optimize" / "consolidate.py",
+            element_dir / "props" / "analyzer.py",
+            element_dir / "props" / "flow.py",
+        ]:
+            self.assertIn(path, files)
+
+    def test_pseudo_property_ignores_analyzer(self):
+        analyzer = os.path.join(self.dir.name, "analyzer.py")
+        with open(analyzer, "w") as f:
+            f.write("# v1\n")
+        with mock.patch.object(property_store, "_ANALYZER_FILES", [analyzer]):
+            before = PropertyStore(self.db_path).content_hash(True, [self.spec])
+            with open(analyzer, "w") as f:
+                f.write("# v2\n")
+            after = PropertyStore(self.db_path).content_hash(True, [self.spec])
+        self.assertEqual(before, after)
+
+
+if __name__ == "__main__":
+    unittest.main()
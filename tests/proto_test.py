@@ -0,0 +1,111 @@
+import sys
+import unittest
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).parent.parent.absolute()))
+
+from compiler.element.frontend.proto import ProtoIndex, ProtoSyntaxError
+
+SCHEMA = """
+syntax = "proto3";
+
+package shop;
+
+// Two services share the messages.
+service Catalog {
+  rpc Lookup (LookupRequest) returns (Item);
+  rpc Watch (LookupRequest) returns (stream Item) {
+    option deprecated = true;
+  }
+}
+
+service Orders {
+  rpc Place (stream Order) returns (Order.Receipt);
+}
+
+message LookupRequest {
+  string id = 01;
+  map<string, int32> filters = 2;
+}
+
+message Item {
+  string id = 1;
+  repeated string tags = 2 [packed = true];
+  Price price = 3;
+  oneof stock {
+    int32 count = 4;
+    bool unlimited = 5;
+  }
+}
+
+message Price {
+  int64 cents = 1;
+}
+
+message Order {
+  message Receipt {
+    message Line {
+      Item item = 1;
+      int32 quantity = 2;
+    }
+    repeated Line lines = 1;
+  }
+  map<string, Receipt.Line> lines = 1;
+  enum State {
+    OPEN = 0;
+  }
+  State state = 2;
+}
+"""
+
+
+class ProtoIndexTestCase(unittest.TestCase):
+    def setUp(self):
+        self.index = ProtoIndex(SCHEMA, "shop.proto")
+
+    def test_services(self):
+        self.assertEqual(self.index.package, "shop")
+        self.assertEqual(list(self.index.services), ["Catalog", "Orders"])
+        self.assertEqual(list(self.index.methods), ["Lookup", "Watch", "Place"])
+        watch = self.index.find_method("Watch")
+        self.assertEqual((watch.service, watch.request), ("Catalog", "LookupRequest"))
+        self.assertTrue(watch.server_streaming)
+        self.assertFalse(watch.client_streaming)
+        place = self.index.find_method("Place", "Orders")
+        self.assertTrue(place.client_streaming)
+        self.assertEqual(place.response, "Order.Receipt")
+        self.assertIsNone(self.index.find_method("Place", "Catalog"))
+
+    def test_fields(self):
+        request = self.index.messages["LookupRequest"]
+        self.assertEqual(request.fields["id"].number, 1)
+        self.assertEqual(request.fields["filters"].type, "map<string, int32>")
+        item = self.index.messages["Item"]
+        self.assertTrue(item.fields["tags"].repeated)
+        self.assertEqual(item.field_by_number(5).name, "unlimited")
+        self.assertEqual(item.field_by_number(3).type, "Price")
+
+    def test_nested_messages(self):
+        order = self.index.messages["Order"]
+        self.assertEqual(list(order.nested), ["Receipt"])
+        self.assertEqual(order.fields["lines"].type, "map<string, Receipt.Line>")
+        line = self.index.find_message("Receipt.Line", "Order")
+        self.assertIs(line, self.index.messages["Order.Receipt.Line"])
+        self.assertEqual(line.fields["quantity"].number, 2)
+        # Names resolve from the innermost scope outward.
+        self.assertIs(
+            self.index.find_message("Item", "Order.Receipt.Line"),
+            self.index.messages["Item"],
+        )
+        self.assertIs(
+            self.index.find_message(".shop.Price"), self.index.messages["Price"]
+        )
+        self.assertIsNone(self.index.find_message("Line"))
+
+    def test_bad_field_number(self):
+        with self.assertRaises(ProtoSyntaxError):
+            ProtoIndex("message M { string id = x; }")
+
+
+if __name__ == "__main__":
+    unittest.main()